@@ -0,0 +1,235 @@
+import argparse
+import io
+import json
+import time
+
+import numpy as np
+
+from lib.audio_capture import CHUNK, RATE
+from lib.audio_codecs import (
+    DECODERS,
+    MP3,
+    OGG_VORBIS,
+    PCM,
+    POLLY_FORMATS,
+    TRANSCRIBE_ENCODINGS,
+    CodecStats,
+    StreamEncoder,
+    decode_to_pcm,
+    import_av,
+)
+
+# Length of the generated test signal (seconds)
+SIGNAL_SECONDS = 20.0
+
+# Bitrates used to stand in for Polly's compressed output
+POLLY_BITRATES = {MP3: 32000, OGG_VORBIS: 32000}
+
+# Codecs that produce each Polly format
+POLLY_CODECS = {MP3: "libmp3lame", OGG_VORBIS: "vorbis"}
+
+
+def speech_like_signal(seconds=SIGNAL_SECONDS, rate=RATE):
+    """
+    Voiced harmonics with a gliding pitch, syllable-rate envelope and pauses.
+
+    Args:
+        seconds (float): Length of the signal
+        rate (int): Sample rate in Hz
+
+    Returns:
+        bytes: 16-bit mono PCM
+    """
+    rng = np.random.default_rng(1)
+    t = np.arange(int(seconds * rate)) / rate
+    pitch = 140 + 40 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+    syllables = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+    # A pause of about a second every five seconds, as between sentences
+    pauses = (t % 5.0) < 4.0
+    noise = rng.normal(0, 0.01, len(t))
+    signal = 0.25 * voiced * syllables * pauses + noise
+    return (np.clip(signal, -1, 1) * 32767).astype(np.int16).tobytes()
+
+
+def encode_polly_audio(pcm, audio_format, rate=RATE):
+    """
+    Encode PCM the way Polly would deliver it in a compressed OutputFormat.
+
+    Args:
+        pcm (bytes): 16-bit mono PCM
+        audio_format (str): MP3 or OGG_VORBIS
+        rate (int): Sample rate of the PCM
+
+    Returns:
+        bytes: Encoded audio file
+    """
+    if audio_format == PCM:
+        return pcm
+    av = import_av()
+    output = io.BytesIO()
+    container = av.open(output, mode="w", format=DECODERS[audio_format])
+    stream = container.add_stream(POLLY_CODECS[audio_format], rate=rate)
+    # FFmpeg's own Vorbis encoder is experimental and only writes stereo; the
+    # decoder downmixes it like Polly's mono output
+    layout = "stereo" if audio_format == OGG_VORBIS else "mono"
+    stream.codec_context.layout = layout
+    stream.codec_context.bit_rate = POLLY_BITRATES[audio_format]
+    stream.codec_context.options = {"strict": "experimental"}
+    resampler = av.AudioResampler(
+        format=stream.codec_context.format.name, layout=layout, rate=rate
+    )
+    frame = av.AudioFrame.from_ndarray(
+        np.frombuffer(pcm, dtype=np.int16).reshape(1, -1), format="s16", layout="mono"
+    )
+    frame.sample_rate = rate
+    for resampled in resampler.resample(frame) + resampler.resample(None):
+        for packet in stream.encode(resampled):
+            container.mux(packet)
+    for packet in stream.encode(None):
+        container.mux(packet)
+    container.close()
+    return output.getvalue()
+
+
+def bench_encoder(encoding, pcm, rate=RATE, chunk=CHUNK):
+    """
+    Feed PCM to a Transcribe encoder in capture-sized chunks.
+
+    Returns:
+        dict: Bytes on the wire, bitrate and per-chunk encode time
+    """
+    chunk_bytes = chunk * 2
+    chunk_ms = chunk / rate * 1000
+    encoder = StreamEncoder(encoding, rate)
+    timings = []
+    held_chunks = 0
+    max_held_chunks = 0
+    header_bytes = None
+    for offset in range(0, len(pcm), chunk_bytes):
+        started = time.perf_counter()
+        data = encoder.encode(pcm[offset : offset + chunk_bytes])
+        timings.append(time.perf_counter() - started)
+        if header_bytes is None:
+            header_bytes = len(data)
+        # Audio that went in without anything coming out waits in the encoder
+        held_chunks = 0 if data else held_chunks + 1
+        max_held_chunks = max(max_held_chunks, held_chunks)
+    encoder.close()
+
+    seconds = len(pcm) / 2 / rate
+    timings.sort()
+    summary = encoder.stats.summary()
+    return {
+        "encoding": encoding,
+        "wire_bytes": summary["wire_bytes"],
+        "ratio": summary["ratio"],
+        "kbps": summary["wire_bytes"] * 8 / seconds / 1000,
+        "first_chunk_bytes": header_bytes or 0,
+        "encode_ms_p50": timings[len(timings) // 2] * 1000,
+        "encode_ms_p95": timings[int(len(timings) * 0.95)] * 1000,
+        "max_held_ms": max_held_chunks * chunk_ms,
+    }
+
+
+def bench_decoder(audio_format, pcm, rate=RATE, sentence_seconds=3.0):
+    """
+    Decode sentence-sized Polly clips the way synthesize_speech does.
+
+    Returns:
+        dict: Bytes on the wire and decode time per clip
+    """
+    sentence_bytes = int(sentence_seconds * rate) * 2
+    clips = [
+        encode_polly_audio(pcm[offset : offset + sentence_bytes], audio_format, rate)
+        for offset in range(0, len(pcm), sentence_bytes)
+    ]
+    stats = CodecStats()
+    timings = []
+    for clip in clips:
+        started = time.perf_counter()
+        decode_to_pcm(io.BytesIO(clip), audio_format, rate, stats)
+        timings.append(time.perf_counter() - started)
+
+    seconds = len(pcm) / 2 / rate
+    timings.sort()
+    summary = stats.summary()
+    return {
+        "format": audio_format,
+        "wire_bytes": summary["wire_bytes"],
+        "ratio": summary["wire_bytes"] / len(pcm),
+        "kbps": summary["wire_bytes"] * 8 / seconds / 1000,
+        "decode_ms_p50": timings[len(timings) // 2] * 1000,
+        "decode_ms_max": timings[-1] * 1000,
+    }
+
+
+def print_report(report):
+    print(f"Transcribe input ({report['seconds']:.0f}s of audio, {CHUNK}-frame chunks)")
+    print(
+        f"{'encoding':<12}{'bytes':>10}{'ratio':>8}{'kbps':>8}"
+        f"{'p50 ms':>9}{'p95 ms':>9}{'held ms':>9}"
+    )
+    for row in report["transcribe"]:
+        print(
+            f"{row['encoding']:<12}{row['wire_bytes']:>10}{row['ratio']:>8.3f}"
+            f"{row['kbps']:>8.1f}{row['encode_ms_p50']:>9.3f}"
+            f"{row['encode_ms_p95']:>9.3f}{row['max_held_ms']:>9.0f}"
+        )
+    print(f"\nPolly output (clips of {report['sentence_seconds']:.0f}s)")
+    print(
+        f"{'format':<12}{'bytes':>10}{'ratio':>8}{'kbps':>8}{'p50 ms':>9}{'max ms':>9}"
+    )
+    for row in report["polly"]:
+        print(
+            f"{row['format']:<12}{row['wire_bytes']:>10}{row['ratio']:>8.3f}"
+            f"{row['kbps']:>8.1f}{row['decode_ms_p50']:>9.3f}"
+            f"{row['decode_ms_max']:>9.3f}"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Bytes on the wire and codec time of each audio encoding"
+    )
+    parser.add_argument(
+        "--input",
+        help="16 kHz 16-bit mono raw PCM file to use instead of a generated signal",
+    )
+    parser.add_argument(
+        "--sentence-seconds",
+        type=float,
+        default=3.0,
+        help="length of each simulated Polly clip (default: %(default)s)",
+    )
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.input:
+        with open(args.input, "rb") as f:
+            pcm = f.read()
+    else:
+        pcm = speech_like_signal()
+    report = {
+        "seconds": len(pcm) / 2 / RATE,
+        "sentence_seconds": args.sentence_seconds,
+        "transcribe": [
+            bench_encoder(encoding, pcm) for encoding in TRANSCRIBE_ENCODINGS
+        ],
+        "polly": [
+            bench_decoder(audio_format, pcm, sentence_seconds=args.sentence_seconds)
+            for audio_format in POLLY_FORMATS
+        ],
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
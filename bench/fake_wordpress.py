@@ -0,0 +1,145 @@
+import argparse
+import threading
+import time
+import xmlrpc.client
+from xmlrpc.server import SimpleXMLRPCRequestHandler, SimpleXMLRPCServer
+
+# Seconds each wp.newPost takes, like a slow shared host
+NEW_POST_LATENCY = 2.0
+
+
+class _RequestHandler(SimpleXMLRPCRequestHandler):
+    rpc_paths = ("/xmlrpc.php",)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeWordPress:
+    """
+    Local stand-in for a WordPress XML-RPC endpoint.
+
+    Serves just enough of the API for wordpress_xmlrpc's Client and NewPost:
+    mt.supportedMethods and wp.newPost. Posts are kept in memory. Every
+    fail_every-th wp.newPost call fails with a server fault, and
+    unavailable() makes every call fail, to exercise retries.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        latency=NEW_POST_LATENCY,
+        fail_every=0,
+        username="bench",
+        password="bench",
+    ):
+        """
+        Args:
+            host (str): Address to listen on
+            port (int): Port to listen on; 0 picks a free one
+            latency (float): Seconds each wp.newPost takes
+            fail_every (int): Fail every n-th wp.newPost; 0 never fails
+            username (str): Accepted user name
+            password (str): Accepted password
+        """
+        self.latency = latency
+        self.fail_every = fail_every
+        self.username = username
+        self.password = password
+        self.posts = {}
+        self.calls = 0
+        self.failures = 0
+        self.down = False
+        self._lock = threading.Lock()
+        self.server = SimpleXMLRPCServer(
+            (host, port),
+            requestHandler=_RequestHandler,
+            allow_none=True,
+            logRequests=False,
+        )
+        self.server.register_function(self.supported_methods, "mt.supportedMethods")
+        self.server.register_function(self.new_post, "wp.newPost")
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}/xmlrpc.php"
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, name="fake wordpress", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def unavailable(self, down=True):
+        """
+        Make every call fail (or succeed again), like a site that is down.
+        """
+        self.down = down
+
+    def supported_methods(self):
+        self._check_up()
+        return ["mt.supportedMethods", "wp.newPost"]
+
+    def new_post(self, blog_id, username, password, content):
+        self._check_up()
+        if (username, password) != (self.username, self.password):
+            raise xmlrpc.client.Fault(403, "Incorrect username or password.")
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            if self.fail_every and self.calls % self.fail_every == 0:
+                self.failures += 1
+                raise xmlrpc.client.Fault(
+                    500, "Could not insert post into the database."
+                )
+            post_id = str(len(self.posts) + 1)
+            self.posts[post_id] = content
+        return post_id
+
+    def _check_up(self):
+        if self.down:
+            with self._lock:
+                self.failures += 1
+            raise xmlrpc.client.Fault(503, "Service unavailable.")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local stand-in for a WordPress XML-RPC endpoint"
+    )
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=NEW_POST_LATENCY,
+        help="seconds each new post takes (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--fail-every",
+        type=int,
+        default=0,
+        help="fail every n-th new post with a server fault (default: never)",
+    )
+    args = parser.parse_args()
+    wordpress = FakeWordPress(
+        port=args.port, latency=args.latency, fail_every=args.fail_every
+    )
+    print(f"Serving {wordpress.url} (user 'bench', password 'bench')")
+    try:
+        wordpress.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        wordpress.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,474 @@
+import asyncio
+import io
+import json
+import threading
+import time
+
+import numpy as np
+from amazon_transcribe.model import (
+    Alternative,
+    Item,
+    Result,
+    Transcript,
+    TranscriptEvent,
+)
+from botocore.exceptions import ClientError
+
+from lib.audio_codecs import PCM
+from lib.audio_player import RATE, SAMPLE_WIDTH
+
+# Default pacing of the stand-ins
+WORDS_PER_SECOND = 3.0
+TOKENS_PER_SECOND = 60.0
+TIME_TO_FIRST_TOKEN = 0.4
+POLLY_LATENCY = 0.15
+SPEECH_SECONDS_PER_CHAR = 0.06
+
+# Transcribe's own endpointing: pause before a partial becomes final
+ENDPOINT_DELAY = 0.6
+
+# RMS level (16-bit samples) above which AudioTranscribeClient hears speech
+SPEECH_RMS = 500
+
+
+class NullAudioDevice:
+    """
+    PyAudio stand-in with no hardware behind it.
+
+    Output streams consume writes at the sample rate (divided by speed), so
+    playback timing is realistic without a sound card. Input streams call the
+    stream callback with silence once per buffer, like PortAudio would.
+    """
+
+    def __init__(self, speed=1.0):
+        """
+        Args:
+            speed (float): How many times faster than real time output plays
+        """
+        self.speed = speed
+        self.bytes_played = 0
+        self.bytes_captured = 0
+
+    def get_format_from_width(self, width):
+        return width
+
+    def open(
+        self,
+        rate,
+        channels,
+        frames_per_buffer,
+        input=False,
+        output=False,
+        stream_callback=None,
+        **kwargs,
+    ):
+        return _NullStream(self, rate, channels, frames_per_buffer, stream_callback)
+
+    def terminate(self):
+        pass
+
+
+class _NullStream:
+    def __init__(self, device, rate, channels, frames_per_buffer, callback):
+        self.device = device
+        self.bytes_per_second = rate * channels * SAMPLE_WIDTH
+        self.frames_per_buffer = frames_per_buffer
+        self.buffer_bytes = frames_per_buffer * channels * SAMPLE_WIDTH
+        self.callback = callback
+        self._running = threading.Event()
+        self._thread = None
+
+    def write(self, data):
+        self.device.bytes_played += len(data)
+        time.sleep(len(data) / self.bytes_per_second / self.device.speed)
+
+    def start_stream(self):
+        self._running.set()
+        if self.callback and self._thread is None:
+            self._thread = threading.Thread(target=self._capture, daemon=True)
+            self._thread.start()
+
+    def stop_stream(self):
+        self._running.clear()
+
+    def close(self):
+        self._running.clear()
+        self.callback = None
+
+    def _capture(self):
+        silence = bytes(self.buffer_bytes)
+        period = self.buffer_bytes / self.bytes_per_second
+        next_buffer = time.monotonic()
+        while self.callback:
+            next_buffer += period
+            time.sleep(max(0.0, next_buffer - time.monotonic()))
+            callback = self.callback
+            if callback and self._running.is_set():
+                self.device.bytes_captured += len(silence)
+                callback(silence, self.frames_per_buffer, None, 0)
+
+
+def transcript_event(result_id, text, is_partial, stable=True):
+    """
+    Build a TranscriptEvent the way Transcribe delivers it.
+
+    Args:
+        result_id (str): Result ID shared by a partial and its final
+        text (str): Transcript so far
+        is_partial (bool): Whether more results follow for this ID
+        stable (bool): Whether every item is marked stable
+
+    Returns:
+        TranscriptEvent: Event with one result and one alternative
+    """
+    items = [
+        Item(item_type="pronunciation", content=word, stable=stable)
+        for word in text.split()
+    ]
+    result = Result(
+        result_id=result_id,
+        is_partial=is_partial,
+        alternatives=[Alternative(text, items, None)],
+    )
+    return TranscriptEvent(Transcript([result]))
+
+
+class FakeTranscribeClient:
+    """
+    TranscribeStreamingClient stand-in that replays scripted utterances.
+
+    Each utterance is delivered word by word as partial results followed by
+    a final one. The next utterance starts once is_ready() returns True,
+    i.e. when the handler is listening again, or after a fixed delay for an
+    utterance that talks over the answer. The script and that delay are
+    shared across streams, so a rollover picks up where the old stream
+    stopped.
+    """
+
+    def __init__(
+        self,
+        utterances,
+        is_ready,
+        words_per_second=WORDS_PER_SECOND,
+        endpoint_delay=ENDPOINT_DELAY,
+        barge_in_delays=None,
+    ):
+        """
+        Args:
+            utterances (list): User utterances in order
+            is_ready (callable): Returns True when the next utterance may start
+            words_per_second (float): Speaking rate of the scripted user
+            endpoint_delay (float): Delay between the last partial and the final
+            barge_in_delays (list, optional): Per utterance, seconds into the
+                previous turn to start speaking, or None to wait for it
+        """
+        self.utterances = list(utterances)
+        self.barge_in_delays = list(barge_in_delays or [None] * len(utterances))
+        self.is_ready = is_ready
+        self.words_per_second = words_per_second
+        self.endpoint_delay = endpoint_delay
+        self.streams_opened = 0
+        self.audio_bytes = 0
+        self.finished = asyncio.Event()
+        self._next = 0
+        self._speak_at = None
+
+    async def start_stream_transcription(self, **stream_config):
+        self.streams_opened += 1
+        return _FakeTranscribeStream(self)
+
+    async def _results(self, stream):
+        while self._next < len(self.utterances):
+            barge_in_delay = self.barge_in_delays[self._next]
+            if barge_in_delay is not None:
+                # Timed on the client, so a rollover does not restart the wait
+                if self._speak_at is None:
+                    self._speak_at = time.monotonic() + barge_in_delay
+                await asyncio.sleep(self._speak_at - time.monotonic())
+            while barge_in_delay is None and not self.is_ready():
+                if stream.ended:
+                    return
+                await asyncio.sleep(0.01)
+            if stream.ended:
+                return
+            text = self.utterances[self._next]
+            result_id = f"result-{self._next}"
+            self._next += 1
+            self._speak_at = None
+
+            words = text.split()
+            for count in range(1, len(words)):
+                await asyncio.sleep(1 / self.words_per_second)
+                yield transcript_event(result_id, " ".join(words[:count]), True)
+            await asyncio.sleep(1 / self.words_per_second)
+            yield transcript_event(result_id, text, True)
+            await asyncio.sleep(self.endpoint_delay)
+            yield transcript_event(result_id, text, False)
+
+            # Wait for the turn to start before replaying the next utterance
+            while self.is_ready():
+                await asyncio.sleep(0.01)
+
+        while not self.is_ready():
+            if stream.ended:
+                return
+            await asyncio.sleep(0.01)
+        self.finished.set()
+        await stream.ended_event.wait()
+
+
+class _FakeTranscribeStream:
+    def __init__(self, client):
+        self.client = client
+        self.ended = False
+        self.ended_event = asyncio.Event()
+        self.input_stream = self
+        self.output_stream = client._results(self)
+
+    async def send_audio_event(self, audio_chunk):
+        self.client.audio_bytes += len(audio_chunk)
+
+    async def end_stream(self):
+        self.ended = True
+        self.ended_event.set()
+
+
+class AudioTranscribeClient:
+    """
+    TranscribeStreamingClient stand-in that hears speech in the audio it is sent.
+
+    Every burst of sound is taken to be the next scripted utterance: its
+    words appear as partials at the speaking rate while the sound lasts, and
+    the final result follows once it has been quiet for endpoint_delay. Each
+    stream starts from the top of the script, so one client can serve many
+    independent sessions.
+    """
+
+    def __init__(
+        self,
+        utterances,
+        words_per_second=WORDS_PER_SECOND,
+        endpoint_delay=ENDPOINT_DELAY,
+        speech_rms=SPEECH_RMS,
+    ):
+        """
+        Args:
+            utterances (list): User utterances in order
+            words_per_second (float): Speaking rate of the simulated users
+            endpoint_delay (float): Quiet time before a result becomes final
+            speech_rms (float): Level above which a chunk counts as speech
+        """
+        self.utterances = list(utterances)
+        self.words_per_second = words_per_second
+        self.endpoint_delay = endpoint_delay
+        self.speech_rms = speech_rms
+        self.streams_opened = 0
+        self.audio_bytes = 0
+
+    async def start_stream_transcription(self, **stream_config):
+        self.streams_opened += 1
+        return _AudioTranscribeStream(self)
+
+
+class _AudioTranscribeStream:
+    def __init__(self, client):
+        self.client = client
+        self.ended = False
+        self.input_stream = self
+        self.output_stream = self._results()
+        self._speech_started = None
+        self._last_speech = None
+        self._heard = asyncio.Event()
+
+    async def send_audio_event(self, audio_chunk):
+        self.client.audio_bytes += len(audio_chunk)
+        samples = np.frombuffer(audio_chunk, dtype=np.int16).astype(np.float32)
+        if samples.size and np.sqrt(np.mean(samples**2)) >= self.client.speech_rms:
+            now = time.monotonic()
+            if self._speech_started is None:
+                self._speech_started = now
+            self._last_speech = now
+            self._heard.set()
+
+    async def end_stream(self):
+        self.ended = True
+        self._heard.set()
+
+    async def _results(self):
+        client = self.client
+        index = 0
+        words_sent = 0
+        while not self.ended:
+            if self._speech_started is None:
+                self._heard.clear()
+                await self._heard.wait()
+                continue
+            if index >= len(client.utterances):
+                # Past the end of the script: nothing more is recognized
+                self._speech_started = None
+                continue
+
+            text = client.utterances[index]
+            result_id = f"result-{index}"
+            if time.monotonic() - self._last_speech >= client.endpoint_delay:
+                yield transcript_event(result_id, text, False)
+                index += 1
+                words_sent = 0
+                self._speech_started = None
+                continue
+
+            words = text.split()
+            spoken = self._last_speech - self._speech_started
+            heard = min(len(words), 1 + int(spoken * client.words_per_second))
+            if heard > words_sent:
+                words_sent = heard
+                yield transcript_event(result_id, " ".join(words[:heard]), True)
+            await asyncio.sleep(0.05)
+
+
+class FakeBedrockRuntime:
+    """
+    bedrock-runtime stand-in answering converse_stream from a script.
+
+    Replies are streamed as text deltas at a fixed token rate after a
+    time-to-first-token delay. Scripted tool calls are emitted as toolUse
+    blocks in one message; the reply after the toolResults come back is the
+    turn's answer.
+    """
+
+    def __init__(
+        self,
+        turns,
+        tokens_per_second=TOKENS_PER_SECOND,
+        time_to_first_token=TIME_TO_FIRST_TOKEN,
+        throttle_every=0,
+    ):
+        """
+        Args:
+            turns (list): ScriptedTurn objects
+            tokens_per_second (float): Streaming rate of text deltas
+            time_to_first_token (float): Delay before the first event (seconds)
+            throttle_every (int): Throttle every Nth streaming request; 0 never does
+        """
+        self.turns = {turn.user: turn for turn in turns}
+        self.tokens_per_second = tokens_per_second
+        self.time_to_first_token = time_to_first_token
+        self.throttle_every = throttle_every
+        self.requests = 0
+        self.throttled = 0
+        self.output_tokens = 0
+
+    def converse_stream(self, modelId, messages, **kwargs):
+        self.requests += 1
+        if self.throttle_every and self.requests % self.throttle_every == 0:
+            self.throttled += 1
+            raise ClientError(
+                {"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}},
+                "ConverseStream",
+            )
+        time.sleep(self.time_to_first_token)
+        return {"stream": self._events(self._reply_for(messages))}
+
+    def converse(self, modelId, messages, **kwargs):
+        self.requests += 1
+        time.sleep(self.time_to_first_token)
+        return {
+            "output": {
+                "message": {
+                    "role": "assistant",
+                    "content": [{"text": "The user asked a few questions."}],
+                }
+            }
+        }
+
+    def _reply_for(self, messages):
+        last = messages[-1]["content"]
+        user_text = None
+        for message in reversed(messages):
+            texts = [block["text"] for block in message["content"] if "text" in block]
+            if message["role"] == "user" and texts:
+                user_text = texts[-1]
+                break
+        turn = self.turns.get(user_text)
+        if turn is None:
+            return ("I did not catch that.", None)
+        if turn.tools and not any("toolResult" in block for block in last):
+            return (turn.preamble, turn.tools)
+        return (turn.reply, [])
+
+    def _events(self, reply):
+        text, tools = reply
+        delay = 1 / self.tokens_per_second
+        yield {"messageStart": {"role": "assistant"}}
+        tokens = 0
+        if text:
+            # Roughly one token per word, as the model would stream it
+            for index, word in enumerate(text.split(" ")):
+                yield {
+                    "contentBlockDelta": {
+                        "delta": {"text": word if index == 0 else " " + word},
+                        "contentBlockIndex": 0,
+                    }
+                }
+                tokens += 1
+                time.sleep(delay)
+            yield {"contentBlockStop": {"contentBlockIndex": 0}}
+        for index, tool in enumerate(tools, start=1):
+            yield {
+                "contentBlockStart": {
+                    "start": {
+                        "toolUse": {
+                            "toolUseId": f"tool-{self.requests}-{index}",
+                            "name": tool["name"],
+                        }
+                    },
+                    "contentBlockIndex": index,
+                }
+            }
+            tool_input = json.dumps(tool["input"])
+            for offset in range(0, len(tool_input), 8):
+                yield {
+                    "contentBlockDelta": {
+                        "delta": {
+                            "toolUse": {"input": tool_input[offset : offset + 8]}
+                        },
+                        "contentBlockIndex": index,
+                    }
+                }
+                tokens += 1
+                time.sleep(delay)
+            yield {"contentBlockStop": {"contentBlockIndex": index}}
+        self.output_tokens += tokens
+        yield {"messageStop": {"stopReason": "tool_use" if tools else "end_turn"}}
+        yield {
+            "metadata": {
+                "usage": {"inputTokens": 100, "outputTokens": tokens},
+                "metrics": {"latencyMs": int(self.time_to_first_token * 1000)},
+            }
+        }
+
+
+class FakePolly:
+    """
+    Polly stand-in returning silence sized to the text, in the requested format.
+    """
+
+    def __init__(self, latency=POLLY_LATENCY):
+        """
+        Args:
+            latency (float): Delay before each response (seconds)
+        """
+        self.latency = latency
+        self.requests = 0
+
+    def synthesize_speech(self, Text, SampleRate=str(RATE), OutputFormat=PCM, **kwargs):
+        self.requests += 1
+        time.sleep(self.latency)
+        samples = int(len(Text) * SPEECH_SECONDS_PER_CHAR * int(SampleRate))
+        audio = bytes(samples * SAMPLE_WIDTH)
+        if OutputFormat != PCM:
+            # Imported here so PCM runs do not need PyAV
+            from bench.codecs import encode_polly_audio
+
+            audio = encode_polly_audio(audio, OutputFormat, int(SampleRate))
+        return {"AudioStream": io.BytesIO(audio)}
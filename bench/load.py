@@ -0,0 +1,360 @@
+import argparse
+import asyncio
+import contextlib
+import functools
+import io
+import json
+import time
+
+import numpy as np
+
+from lib.audio_capture import CHUNK, RATE, SAMPLE_WIDTH
+from lib.gateway import (
+    ADMISSION_TIMEOUT,
+    AUDIO,
+    EVENT,
+    MAX_ACTIVE_TURNS,
+    MAX_SESSIONS,
+    GatewayHandler,
+    VoiceGateway,
+    decode_event,
+    encode_event,
+    encode_frame,
+    read_frame,
+)
+from lib.metrics import Histogram, MetricsRegistry
+from lib.model_router import ModelRouter
+from lib.transcript_handler import MODELS
+from lib.tts_cache import SynthesisCache
+
+from bench.fakes import (
+    POLLY_LATENCY,
+    TIME_TO_FIRST_TOKEN,
+    TOKENS_PER_SECOND,
+    WORDS_PER_SECOND,
+    AudioTranscribeClient,
+    FakeBedrockRuntime,
+    FakePolly,
+)
+from bench.run import BenchHandler
+from bench.scenarios import SCENARIOS
+
+# Longest wait for an answer to finish before the turn counts as failed (seconds)
+TURN_TIMEOUT = 60.0
+
+# Pause between hearing the end of an answer and speaking again (seconds)
+THINK_SECONDS = 0.3
+
+# Level of the tone standing in for the user's voice (full scale = 1)
+VOICE_LEVEL = 0.3
+
+
+class LoadHandler(BenchHandler, GatewayHandler):
+    """
+    GatewayHandler with the benchmark's scripted tools.
+    """
+
+
+class SimulatedUser:
+    """
+    One client connection talking to the gateway like a microphone would.
+
+    Audio is streamed in real time the whole session: a tone while the user
+    speaks an utterance, silence otherwise. The next utterance is spoken once
+    the gateway reports the answer has finished.
+    """
+
+    def __init__(self, host, port, utterances, words_per_second, language="en-US"):
+        self.host = host
+        self.port = port
+        self.utterances = utterances
+        self.words_per_second = words_per_second
+        self.language = language
+        self.rejected = False
+        self.error = None
+        self.turns = 0
+        self.latencies = []
+        self.audio_bytes_received = 0
+        self._speech_frames = 0
+        self._speech_ended = asyncio.Event()
+        self._speech_ended_at = None
+        self._first_audio_at = None
+        self._turn_ended = asyncio.Event()
+
+    async def run(self):
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        except OSError as e:
+            self.error = str(e)
+            return
+        try:
+            writer.write(encode_event("hello", language=self.language))
+            kind, payload = await read_frame(reader)
+            reply = decode_event(payload) if kind == EVENT else {}
+            if reply.get("event") == "busy":
+                self.rejected = True
+                return
+            if reply.get("event") != "ready":
+                self.error = reply.get("message", "no ready event")
+                return
+            sender = asyncio.create_task(self.send_audio(writer))
+            receiver = asyncio.create_task(self.receive(reader))
+            try:
+                await self.converse()
+                writer.write(encode_event("bye"))
+            finally:
+                sender.cancel()
+                receiver.cancel()
+                await asyncio.gather(sender, receiver, return_exceptions=True)
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            self.error = str(e) or type(e).__name__
+        finally:
+            writer.close()
+
+    async def converse(self):
+        for text in self.utterances:
+            self._turn_ended.clear()
+            self._speech_ended.clear()
+            self._first_audio_at = None
+            seconds = len(text.split()) / self.words_per_second
+            self._speech_frames = max(1, int(seconds * RATE / CHUNK))
+            await self._speech_ended.wait()
+            try:
+                await asyncio.wait_for(self._turn_ended.wait(), TURN_TIMEOUT)
+            except asyncio.TimeoutError:
+                self.error = f"no answer within {TURN_TIMEOUT}s"
+                return
+            self.turns += 1
+            if self._first_audio_at is not None:
+                self.latencies.append(self._first_audio_at - self._speech_ended_at)
+            await asyncio.sleep(THINK_SECONDS)
+
+    async def send_audio(self, writer):
+        t = np.arange(CHUNK) / RATE
+        tone = (VOICE_LEVEL * 32767 * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+        voice = encode_frame(AUDIO, tone.tobytes())
+        silence = encode_frame(AUDIO, bytes(CHUNK * SAMPLE_WIDTH))
+        period = CHUNK / RATE
+        next_chunk = time.monotonic()
+        while True:
+            if self._speech_frames:
+                self._speech_frames -= 1
+                writer.write(voice)
+                if not self._speech_frames:
+                    self._speech_ended_at = time.monotonic()
+                    self._speech_ended.set()
+            else:
+                writer.write(silence)
+            await writer.drain()
+            next_chunk += period
+            await asyncio.sleep(max(0.0, next_chunk - time.monotonic()))
+
+    async def receive(self, reader):
+        while True:
+            kind, payload = await read_frame(reader)
+            if kind == AUDIO:
+                self.audio_bytes_received += len(payload)
+                if self._first_audio_at is None and self._speech_ended.is_set():
+                    self._first_audio_at = time.monotonic()
+            elif kind == EVENT:
+                event = decode_event(payload)
+                if event.get("event") == "turn_end":
+                    self._turn_ended.set()
+                elif event.get("event") == "error":
+                    self.error = event.get("message")
+
+
+async def run_load_test(args):
+    """
+    Run simulated users against an in-process gateway with stand-in backends.
+
+    Args:
+        args: Parsed command line options
+
+    Returns:
+        dict: Admission, turn latency and gateway figures
+    """
+    turns = SCENARIOS[args.scenario]
+    utterances = [turn.user for turn in turns]
+    bedrock = FakeBedrockRuntime(turns, args.token_rate, args.ttft)
+    polly = FakePolly(args.polly_latency)
+    transcribe = AudioTranscribeClient(utterances, args.words_per_second)
+    metrics = MetricsRegistry()
+    gateway = VoiceGateway(
+        transcribe,
+        bedrock,
+        polly,
+        SynthesisCache(cache_dir=None),
+        metrics,
+        ModelRouter(MODELS),
+        max_sessions=args.max_sessions,
+        max_active_turns=args.max_active_turns,
+        admission_timeout=args.admission_timeout,
+        handler_class=functools.partial(LoadHandler, turns),
+        playback_speed=args.playback_speed,
+    )
+    await gateway.start("127.0.0.1", 0)
+    host, port = gateway.address
+
+    users = [
+        SimulatedUser(host, port, utterances, args.words_per_second)
+        for _ in range(args.sessions)
+    ]
+
+    async def start_user(index, user):
+        await asyncio.sleep(args.ramp_seconds * index / max(1, len(users)))
+        await user.run()
+
+    started = time.monotonic()
+    try:
+        await asyncio.gather(*(start_user(i, user) for i, user in enumerate(users)))
+    finally:
+        await gateway.close()
+    elapsed = time.monotonic() - started
+
+    latency = Histogram()
+    for user in users:
+        for value in user.latencies:
+            latency.observe(value)
+    served = [user for user in users if not user.rejected]
+    return {
+        "scenario": args.scenario,
+        "sessions": args.sessions,
+        "rejected": sum(user.rejected for user in users),
+        "failed": sum(user.error is not None for user in users),
+        "errors": sorted({user.error for user in users if user.error}),
+        "turns": sum(user.turns for user in users),
+        "turns_expected": len(served) * len(utterances),
+        "elapsed_seconds": elapsed,
+        "response_latency": latency.summary(),
+        "stages": metrics.summary(),
+        "gateway": gateway.stats(),
+        "bedrock_requests": bedrock.requests,
+        "polly_requests": polly.requests,
+        "transcribe_streams": transcribe.streams_opened,
+    }
+
+
+def print_report(report):
+    print(
+        f"{report['sessions']} sessions of '{report['scenario']}' "
+        f"in {report['elapsed_seconds']:.1f}s: {report['rejected']} rejected, "
+        f"{report['failed']} failed, {report['turns']} of "
+        f"{report['turns_expected']} turns answered"
+    )
+    latency = report["response_latency"]
+    print(
+        f"end of speech to first audio: p50 {latency['p50']:.3f}s, "
+        f"p95 {latency['p95']:.3f}s, p99 {latency['p99']:.3f}s"
+    )
+    gateway = report["gateway"]
+    wait = gateway["turn_wait"]
+    print(
+        f"gateway: peak {gateway['peak_sessions']} sessions, "
+        f"peak {gateway['peak_active_turns']} active turns, "
+        f"turn slot wait p50 {wait['p50']:.3f}s p95 {wait['p95']:.3f}s, "
+        f"{gateway['input_overflows']} input overflows"
+    )
+    print(
+        f"audio: {gateway['audio_seconds_in']:.1f}s in, "
+        f"{gateway['audio_seconds_out']:.1f}s out"
+    )
+    for error in report["errors"]:
+        print(f"error: {error}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Load test of the voice gateway with simulated users"
+    )
+    parser.add_argument(
+        "--sessions",
+        type=int,
+        default=20,
+        help="simulated users to connect (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--ramp-seconds",
+        type=float,
+        default=2.0,
+        help="spread the connections over this long (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--scenario",
+        choices=sorted(SCENARIOS),
+        default="smalltalk",
+        help="conversation each user has (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--max-sessions",
+        type=int,
+        default=MAX_SESSIONS,
+        help="sessions the gateway serves at once (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--max-active-turns",
+        type=int,
+        default=MAX_ACTIVE_TURNS,
+        help="turns generating at once across sessions (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--admission-timeout",
+        type=float,
+        default=ADMISSION_TIMEOUT,
+        help="seconds a connection waits for a session slot (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--token-rate",
+        type=float,
+        default=TOKENS_PER_SECOND,
+        help="model output tokens per second (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--ttft",
+        type=float,
+        default=TIME_TO_FIRST_TOKEN,
+        help="model time to first token in seconds (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--polly-latency",
+        type=float,
+        default=POLLY_LATENCY,
+        help="seconds before each Polly response (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--words-per-second",
+        type=float,
+        default=WORDS_PER_SECOND,
+        help="speaking rate of the simulated users (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--playback-speed",
+        type=float,
+        default=5.0,
+        help="how many times faster than real time answers are sent "
+        "(default: %(default)s)",
+    )
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument(
+        "--verbose", action="store_true", help="show the gateway's own output"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    output = (
+        contextlib.nullcontext()
+        if args.verbose
+        else (contextlib.redirect_stdout(io.StringIO()))
+    )
+    with output:
+        report = asyncio.run(run_load_test(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
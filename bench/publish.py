@@ -0,0 +1,158 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from lib.post_blog import WordPressBlogger
+from lib.publish_queue import PublishQueue
+
+from bench.fake_wordpress import NEW_POST_LATENCY, FakeWordPress
+
+
+def run_publish_test(args):
+    """
+    Publish posts through the queue against a local stand-in WordPress.
+
+    Half the posts are submitted, the queue is stopped as if the process
+    exited, and a new queue on the same file publishes the rest, so the
+    report shows jobs surviving a restart as well as retries.
+
+    Args:
+        args: Parsed command line options
+
+    Returns:
+        dict: Submit and publish times, retry and connection counts
+    """
+    wordpress = FakeWordPress(latency=args.latency, fail_every=args.fail_every)
+    wordpress.start()
+
+    def connect():
+        blogger = WordPressBlogger(wordpress.url, "bench", "bench")
+        blogger.connect()
+        return blogger
+
+    posts = [
+        {"title": f"Post {index}", "content": f"Body of post {index}."}
+        for index in range(args.posts)
+    ]
+    try:
+        # What a turn used to wait for: connect and publish in the tool call
+        started = time.monotonic()
+        connect().post_content(**posts[0])
+        inline_seconds = time.monotonic() - started
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "publish_queue.json")
+            published_before = len(wordpress.posts)
+            submit_seconds = []
+            started = time.monotonic()
+
+            queue = PublishQueue(path, connect, retry_base=args.retry_base)
+            half = len(posts) // 2
+            for post in posts[:half]:
+                submitted = time.monotonic()
+                queue.submit(post)
+                submit_seconds.append(time.monotonic() - submitted)
+            # Let the in-flight post finish, then restart
+            queue.close(timeout=args.latency + 5)
+            first = queue.stats()
+
+            queue = PublishQueue(path, connect, retry_base=args.retry_base)
+            for post in posts[half:]:
+                submitted = time.monotonic()
+                queue.submit(post)
+                submit_seconds.append(time.monotonic() - submitted)
+            idle = queue.wait_idle(args.timeout)
+            elapsed = time.monotonic() - started
+            second = queue.stats()
+            jobs = queue.status()
+            queue.close()
+    finally:
+        wordpress.close()
+
+    return {
+        "posts": args.posts,
+        "inline_publish_seconds": inline_seconds,
+        "max_submit_ms": max(submit_seconds) * 1000,
+        "all_published_seconds": elapsed,
+        "finished": idle,
+        "published_after_restart": second["published"],
+        "published": len(wordpress.posts) - published_before,
+        "failed": first["failed"] + second["failed"],
+        "retries": first["retries"] + second["retries"],
+        "connections": first["connections"] + second["connections"],
+        "server_faults": wordpress.failures,
+        "latest_jobs": jobs,
+    }
+
+
+def print_report(report):
+    print(
+        f"inline publish (old path): {report['inline_publish_seconds']:.2f}s "
+        f"of turn time per post"
+    )
+    print(
+        f"queued: {report['posts']} posts, slowest submit "
+        f"{report['max_submit_ms']:.1f} ms, all published after "
+        f"{report['all_published_seconds']:.1f}s"
+    )
+    print(
+        f"{report['published']} published ({report['published_after_restart']} "
+        f"after the restart), {report['failed']} failed, {report['retries']} "
+        f"retries for {report['server_faults']} server faults, "
+        f"{report['connections']} connections"
+    )
+    if not report["finished"]:
+        print("error: queue did not finish within the timeout")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Publish queue against a local stand-in WordPress"
+    )
+    parser.add_argument(
+        "--posts",
+        type=int,
+        default=6,
+        help="posts to publish (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=NEW_POST_LATENCY,
+        help="seconds each new post takes (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--fail-every",
+        type=int,
+        default=3,
+        help="fail every n-th new post with a server fault (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--retry-base",
+        type=float,
+        default=0.2,
+        help="seconds before the first retry (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=120.0,
+        help="longest wait for every post to be published (default: %(default)s)",
+    )
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    report = run_publish_test(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import time
+
+from lib.answer_cache import AnswerCache, normalize_question
+from lib.audio_capture import AudioCapture
+from lib.audio_codecs import PCM, POLLY_FORMATS, TRANSCRIBE_ENCODINGS
+from lib.audio_player import AudioPlayer
+from lib.deadline import TURN_BUDGET_SECONDS
+from lib.filler import FillerBank, polly_synthesizer
+from lib.metrics import MetricsRegistry
+from lib.transcribe_session import ROLLOVER_SECONDS, TranscribeSession
+from lib.transcript_handler import TranscriptHandler
+from lib.tts_cache import SynthesisCache
+
+from bench.fakes import (
+    POLLY_LATENCY,
+    TIME_TO_FIRST_TOKEN,
+    TOKENS_PER_SECOND,
+    WORDS_PER_SECOND,
+    FakeBedrockRuntime,
+    FakePolly,
+    FakeTranscribeClient,
+    NullAudioDevice,
+)
+from bench.scenarios import SCENARIOS
+
+# Stages reported in the summary table, in turn order
+REPORT_STAGES = [
+    "request_setup",
+    "time_to_first_token",
+    "generation",
+    "polly_first_byte",
+    "time_to_first_audio",
+    "turn",
+]
+
+
+class BenchHandler(TranscriptHandler):
+    """
+    TranscriptHandler with scripted tools and per-turn stats collection.
+    """
+
+    def __init__(self, turns, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tools = {
+            (tool["name"], json.dumps(tool["input"], sort_keys=True)): turn
+            for turn in turns
+            for tool in turn.tools
+        }
+        self.replies = {normalize_question(turn.user): turn.reply for turn in turns}
+        self.turn_stats = []
+        self.degraded_answers_cached = 0
+        self.wrong_answers_replayed = 0
+
+    def handle_tool_use(self, tool_use):
+        key = (tool_use["name"], json.dumps(tool_use["input"], sort_keys=True))
+        turn = self.tools.get(key)
+        if turn is None:
+            return {"toolUseId": tool_use["toolUseId"], "content": [{"text": ""}]}
+        time.sleep(turn.tool_seconds)
+        return {
+            "toolUseId": tool_use["toolUseId"],
+            "content": [{"text": turn.tool_result}],
+        }
+
+    async def call_tool(self, tool_use):
+        # Every scripted tool, web_search included, runs on the tool pool
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.tool_pool, self.handle_tool_use, tool_use
+        )
+
+    def find_cached_answer(self, transcript):
+        entry = super().find_cached_answer(transcript)
+        if entry is not None and self.replies.get(entry.question) != self.replies.get(
+            normalize_question(transcript)
+        ):
+            self.wrong_answers_replayed += 1
+        return entry
+
+    def cache_answer(self, transcript, text):
+        stored = super().cache_answer(transcript, text)
+        if stored and (self.deadline.missed or self.deadline.fallback_spoken):
+            self.degraded_answers_cached += 1
+        return stored
+
+    def report_turn(self, turn_started):
+        super().report_turn(turn_started)
+        self.turn_stats.append(self.last_turn_stats)
+
+
+async def run_benchmark(args):
+    """
+    Play a scripted conversation through the real session and handler.
+
+    Args:
+        args: Parsed command line options
+
+    Returns:
+        dict: Latency percentiles, loop stall and throughput figures
+    """
+    turns = SCENARIOS[args.scenario] * args.repeat
+    device = NullAudioDevice(speed=args.playback_speed)
+    bedrock = FakeBedrockRuntime(
+        turns, args.token_rate, args.ttft, throttle_every=args.throttle_every
+    )
+    polly = FakePolly(args.polly_latency)
+    metrics = MetricsRegistry()
+
+    audio_player = AudioPlayer(audio=device)
+    audio_player.start()
+    capture = AudioCapture(audio=device)
+    tts_cache = SynthesisCache(
+        cache_dir=None, memory_bytes=32 * 1024 * 1024 if args.tts_cache else 0
+    )
+
+    fillers = None
+    if args.fillers:
+        # Synthesized up front like at startup, on their own Polly stand-in so
+        # the turns' Polly counts are unchanged
+        fillers = FillerBank()
+        fillers.load(polly_synthesizer(FakePolly(args.polly_latency)))
+
+    handler = BenchHandler(
+        turns,
+        bedrock,
+        None,
+        polly,
+        "en-US",
+        [],
+        audio_player=audio_player,
+        tts_cache=tts_cache,
+        speculative=args.speculative,
+        early_tools=args.early_tools,
+        answer_cache=AnswerCache() if args.answer_cache else None,
+        turn_budget=args.turn_budget,
+        fillers=fillers,
+        metrics=metrics,
+        barge_in=args.barge_in
+        or any(turn.barge_in_after is not None for turn in turns),
+        polly_format=args.polly_format,
+    )
+    transcribe = FakeTranscribeClient(
+        [turn.user for turn in turns],
+        lambda: handler.listening,
+        args.words_per_second,
+        barge_in_delays=[turn.barge_in_after for turn in turns],
+    )
+    stream_config = {
+        "media_sample_rate_hz": capture.rate,
+        "media_encoding": args.transcribe_encoding,
+        "language_code": "en-US",
+        "enable_partial_results_stabilization": True,
+    }
+    session = TranscribeSession(
+        transcribe,
+        capture,
+        handler,
+        stream_config,
+        rollover_seconds=args.rollover_seconds,
+        encoding=args.transcribe_encoding,
+    )
+
+    started = time.monotonic()
+    try:
+        capture.start()
+        run = asyncio.create_task(session.run())
+        finished = asyncio.create_task(transcribe.finished.wait())
+        await asyncio.wait({run, finished}, return_when=asyncio.FIRST_COMPLETED)
+        run.cancel()
+        finished.cancel()
+        results = await asyncio.gather(run, finished, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception) and not isinstance(
+                result, asyncio.CancelledError
+            ):
+                raise result
+    finally:
+        capture.close()
+        audio_player.close()
+    elapsed = time.monotonic() - started
+
+    stalls = [stats["max_loop_stall_ms"] for stats in handler.turn_stats]
+    stages = metrics.summary()
+    generation_seconds = stages.get("generation", {}).get("sum", 0.0)
+    return {
+        "scenario": args.scenario,
+        "turns": len(handler.turn_stats),
+        "elapsed_seconds": elapsed,
+        "stages": stages,
+        "max_loop_stall_ms": max(stalls, default=0.0),
+        "mean_loop_stall_ms": sum(stalls) / len(stalls) if stalls else 0.0,
+        "output_tokens_per_second": (
+            bedrock.output_tokens / generation_seconds if generation_seconds else 0.0
+        ),
+        "turns_per_minute": len(handler.turn_stats) / elapsed * 60 if elapsed else 0.0,
+        "bedrock_requests": bedrock.requests,
+        "bedrock_throttled": bedrock.throttled,
+        "router": handler.router.stats(),
+        "polly_requests": polly.requests,
+        "audio_seconds_played": device.bytes_played / (audio_player.rate * 2),
+        "audio_seconds_sent": session.stats()["audio"]["pcm_bytes"]
+        / (capture.rate * 2),
+        "transcribe_audio": session.stats()["audio"],
+        "polly_audio": handler.decode_stats.summary(),
+        "playback": audio_player.stats(),
+        "speculation": handler.speculation_stats.summary(),
+        "early_tools": handler.early_tool_stats.summary(),
+        "answer_cache": (
+            dict(
+                handler.answer_cache.stats(),
+                wrong_answers_replayed=handler.wrong_answers_replayed,
+            )
+            if handler.answer_cache
+            else None
+        ),
+        "barge_in": handler.barge_in_stats.summary(),
+        "deadline": dict(
+            handler.deadline_stats.summary(),
+            degraded_answers_cached=handler.degraded_answers_cached,
+        ),
+        "fillers": fillers.stats() if fillers else None,
+        "transcribe_streams": transcribe.streams_opened,
+    }
+
+
+def print_report(report):
+    print(
+        f"Scenario '{report['scenario']}': {report['turns']} turns "
+        f"in {report['elapsed_seconds']:.1f}s"
+    )
+    print(f"{'stage':<22}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for stage in REPORT_STAGES + sorted(
+        name for name in report["stages"] if name.startswith("tool:")
+    ):
+        summary = report["stages"].get(stage)
+        if summary:
+            print(
+                f"{stage:<22}{summary['p50']:>8.3f}s{summary['p95']:>8.3f}s"
+                f"{summary['p99']:>8.3f}s"
+            )
+    print(
+        f"event-loop stall: max {report['max_loop_stall_ms']:.1f} ms, "
+        f"mean of per-turn max {report['mean_loop_stall_ms']:.1f} ms"
+    )
+    print(
+        f"throughput: {report['output_tokens_per_second']:.1f} output tokens/s, "
+        f"{report['turns_per_minute']:.1f} turns/min"
+    )
+    print(
+        f"audio: {report['audio_seconds_played']:.1f}s played, "
+        f"{report['audio_seconds_sent']:.1f}s sent, "
+        f"{report['playback']['underruns']} underruns"
+    )
+    if report["bedrock_throttled"]:
+        print(
+            f"router: {report['bedrock_throttled']} throttled requests, "
+            f"{report['router']['failovers']} failovers, "
+            f"{report['router']['hedges']} hedges"
+        )
+    upstream = report["transcribe_audio"]
+    downstream = report["polly_audio"]
+    print(
+        f"wire: {upstream['wire_bytes']} bytes to Transcribe "
+        f"({upstream['ratio']:.2f} of PCM, {upstream['codec_ms']:.1f} ms encoding), "
+        f"{downstream['wire_bytes']} bytes from Polly "
+        f"({downstream['ratio']:.2f} of PCM, {downstream['codec_ms']:.1f} ms decoding)"
+    )
+    if report["barge_in"]["interruptions"]:
+        print(f"barge-in: {report['barge_in']}")
+    if report["speculation"]["started"]:
+        print(f"speculation: {report['speculation']}")
+    if report["early_tools"]["started"]:
+        print(f"early tools: {report['early_tools']}")
+    if report["answer_cache"]:
+        print(f"answer cache: {report['answer_cache']}")
+        if report["answer_cache"]["wrong_answers_replayed"]:
+            print(
+                f"error: {report['answer_cache']['wrong_answers_replayed']} "
+                "cached answers were replayed for a different question"
+            )
+    if report["fillers"]:
+        print(f"fillers: {report['fillers']}")
+    if report["deadline"]["turns_degraded"]:
+        print(f"deadline: {report['deadline']}")
+    if report["deadline"]["degraded_answers_cached"]:
+        print(
+            f"error: {report['deadline']['degraded_answers_cached']} answers "
+            "that missed the turn deadline were cached"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Offline benchmark of the voice chatbot hot path"
+    )
+    parser.add_argument(
+        "--scenario",
+        choices=sorted(SCENARIOS),
+        default="smalltalk",
+        help="scripted conversation to play (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        help="times to play the scenario back to back (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--token-rate",
+        type=float,
+        default=TOKENS_PER_SECOND,
+        help="model output tokens per second (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--ttft",
+        type=float,
+        default=TIME_TO_FIRST_TOKEN,
+        help="model time to first token in seconds (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--throttle-every",
+        type=int,
+        default=0,
+        help="throttle every Nth model request to exercise failover (default: never)",
+    )
+    parser.add_argument(
+        "--polly-latency",
+        type=float,
+        default=POLLY_LATENCY,
+        help="seconds before each Polly response (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--words-per-second",
+        type=float,
+        default=WORDS_PER_SECOND,
+        help="speaking rate of the scripted user (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--playback-speed",
+        type=float,
+        default=10.0,
+        help="how many times faster than real time audio plays (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--rollover-seconds",
+        type=float,
+        default=ROLLOVER_SECONDS,
+        help="replace the Transcribe stream after this long (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--speculative",
+        action="store_true",
+        help="start the model on stabilized partial transcripts",
+    )
+    parser.add_argument(
+        "--early-tools",
+        action="store_true",
+        help="start read-only tools while their input is still streaming",
+    )
+    parser.add_argument(
+        "--answer-cache",
+        action="store_true",
+        help="answer repeated questions from earlier spoken answers",
+    )
+    parser.add_argument(
+        "--turn-budget",
+        type=float,
+        default=TURN_BUDGET_SECONDS,
+        metavar="SECONDS",
+        help="time for a turn to start answering before it degrades; 0 disables "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--fillers",
+        action="store_true",
+        help="play a short phrase while tools run or the first token is slow",
+    )
+    parser.add_argument(
+        "--tts-cache",
+        action="store_true",
+        help="keep synthesized clips in memory between turns",
+    )
+    parser.add_argument(
+        "--transcribe-encoding",
+        choices=TRANSCRIBE_ENCODINGS,
+        default=PCM,
+        help="audio encoding sent to Transcribe (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--polly-format",
+        choices=POLLY_FORMATS,
+        default=PCM,
+        help="audio format requested from Polly (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--barge-in",
+        action="store_true",
+        help="let the scripted user interrupt answers (on for the barge_in scenario)",
+    )
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument(
+        "--verbose", action="store_true", help="show the chatbot's own output"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    output = (
+        contextlib.nullcontext()
+        if args.verbose
+        else (contextlib.redirect_stdout(io.StringIO()))
+    )
+    with output:
+        report = asyncio.run(run_benchmark(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
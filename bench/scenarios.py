@@ -0,0 +1,233 @@
+class ScriptedTurn:
+    """
+    One exchange of a scripted conversation.
+    """
+
+    def __init__(
+        self,
+        user,
+        reply,
+        tools=(),
+        preamble="",
+        tool_result=None,
+        tool_seconds=0.0,
+        barge_in_after=None,
+    ):
+        """
+        Args:
+            user (str): What the user says (the final transcript)
+            reply (str): The assistant's spoken answer
+            tools (list): Tool calls made in one message, as {"name": ..., "input": {...}}
+            preamble (str): Text streamed before the tool calls
+            tool_result (str, optional): Text each tool returns
+            tool_seconds (float): How long each tool call takes to run
+            barge_in_after (float, optional): Start speaking this many seconds
+                into the previous turn instead of waiting for it to finish
+        """
+        self.user = user
+        self.reply = reply
+        self.tools = list(tools)
+        self.preamble = preamble
+        self.tool_result = tool_result or "No results."
+        self.tool_seconds = tool_seconds
+        self.barge_in_after = barge_in_after
+
+
+SCENARIOS = {
+    "smalltalk": [
+        ScriptedTurn(
+            "hello there how are you today",
+            "I'm doing well, thanks for asking. How can I help you today?",
+        ),
+        ScriptedTurn(
+            "tell me a short fact about sydney",
+            "Sydney Harbour Bridge opened in 1932. Locals call it the Coathanger "
+            "because of its arched shape.",
+        ),
+        ScriptedTurn(
+            "what is a good name for a cat",
+            "How about Miso? It's short, friendly and easy to call out. Pepper "
+            "and Biscuit are popular choices too.",
+        ),
+    ],
+    "tools": [
+        ScriptedTurn(
+            "what is the weather in sydney tomorrow",
+            "Tomorrow in Sydney expect a top of 24 degrees with a few showers "
+            "clearing in the afternoon. Light winds from the south east.",
+            tools=[
+                {"name": "web_search", "input": {"query": "Sydney weather tomorrow"}}
+            ],
+            preamble="Let me check the forecast.",
+            tool_result="Title: Sydney Forecast\nLink: http://www.bom.gov.au\n"
+            "Content: Max 24. Showers clearing. Winds SE 15 km/h.",
+            tool_seconds=0.8,
+        ),
+        ScriptedTurn(
+            "and what about the weekend",
+            "The weekend looks sunny with tops around 27 degrees on both days.",
+            tools=[
+                {"name": "web_search", "input": {"query": "Sydney Saturday weather"}},
+                {"name": "web_search", "input": {"query": "Sydney Sunday weather"}},
+            ],
+            tool_result="Title: Sydney Forecast\nLink: http://www.bom.gov.au\n"
+            "Content: Saturday max 27, sunny. Sunday max 27, sunny.",
+            tool_seconds=0.8,
+        ),
+        ScriptedTurn(
+            "thanks that is helpful",
+            "You're welcome. Enjoy the sunshine!",
+        ),
+    ],
+    "long": [
+        ScriptedTurn(
+            "explain how a heat pump works",
+            "A heat pump moves heat instead of making it. A refrigerant absorbs "
+            "heat outside as it evaporates, even on a cool day. A compressor then "
+            "squeezes the gas, which raises its temperature. Inside, the hot gas "
+            "condenses and releases that heat into the room. Finally an expansion "
+            "valve drops the pressure so the cycle can start again. Because it "
+            "only moves heat, it can deliver three or four units of heat for each "
+            "unit of electricity it uses. In summer the same cycle runs in "
+            "reverse to cool the house.",
+        ),
+        ScriptedTurn(
+            "is it worth it for a small apartment",
+            "Often yes. A small reverse cycle split system is one of the cheapest "
+            "ways to heat and cool an apartment. Check the energy rating label, "
+            "size it to the room rather than oversizing it, and make sure your "
+            "strata allows an outdoor unit on the balcony.",
+        ),
+    ],
+    "barge_in": [
+        ScriptedTurn(
+            "explain how a heat pump works",
+            "A heat pump moves heat instead of making it. A refrigerant absorbs "
+            "heat outside as it evaporates, even on a cool day. A compressor then "
+            "squeezes the gas, which raises its temperature. Inside, the hot gas "
+            "condenses and releases that heat into the room. Finally an expansion "
+            "valve drops the pressure so the cycle can start again.",
+        ),
+        ScriptedTurn(
+            "hold up just give me one sentence",
+            "It moves heat from outside to inside using a refrigerant cycle.",
+            barge_in_after=3.0,
+        ),
+        ScriptedTurn(
+            "thanks",
+            "You're welcome.",
+        ),
+    ],
+    # The same questions asked again, as heard and reworded, then pairs of
+    # different questions that look alike
+    "repeats": [
+        ScriptedTurn(user, reply, tools=tools, preamble=preamble, tool_seconds=0.8)
+        for user, reply, tools, preamble in [
+            (
+                "what's the weather in sydney today",
+                "Today in Sydney expect a top of 22 degrees and a mostly sunny "
+                "afternoon.",
+                [{"name": "web_search", "input": {"query": "Sydney weather today"}}],
+                "Let me check.",
+            ),
+            (
+                "what is today's date",
+                "Today is the seventeenth of October.",
+                [],
+                "",
+            ),
+            (
+                "what's the weather in Sydney today?",
+                "Today in Sydney expect a top of 22 degrees and a mostly sunny "
+                "afternoon.",
+                [{"name": "web_search", "input": {"query": "Sydney weather today"}}],
+                "Let me check.",
+            ),
+            (
+                "hey what's the weather in sydney today",
+                "Today in Sydney expect a top of 22 degrees and a mostly sunny "
+                "afternoon.",
+                [{"name": "web_search", "input": {"query": "Sydney weather today"}}],
+                "Let me check.",
+            ),
+            (
+                "what's the weather in sydney tomorrow",
+                "Tomorrow in Sydney expect a top of 25 degrees with a late storm.",
+                [
+                    {
+                        "name": "web_search",
+                        "input": {"query": "Sydney weather tomorrow"},
+                    }
+                ],
+                "Let me check.",
+            ),
+            (
+                "what is today's date",
+                "Today is the seventeenth of October.",
+                [],
+                "",
+            ),
+            # Different questions that look alike: each must miss the cache
+            (
+                "what is the capital of austria",
+                "The capital of Austria is Vienna.",
+                [],
+                "",
+            ),
+            (
+                "what is the capital of australia",
+                "The capital of Australia is Canberra.",
+                [],
+                "",
+            ),
+            (
+                "what is the capital of niger",
+                "The capital of Niger is Niamey.",
+                [],
+                "",
+            ),
+            (
+                "what is the capital of nigeria",
+                "The capital of Nigeria is Abuja.",
+                [],
+                "",
+            ),
+            (
+                "how do i convert celsius to fahrenheit",
+                "Multiply by nine fifths, then add thirty two.",
+                [],
+                "",
+            ),
+            (
+                "how do i convert fahrenheit to celsius",
+                "Subtract thirty two, then multiply by five ninths.",
+                [],
+                "",
+            ),
+            (
+                "who is the president of france",
+                "Emmanuel Macron is the president of France.",
+                [],
+                "",
+            ),
+            (
+                "who was the president of france",
+                "Before Emmanuel Macron it was François Hollande.",
+                [],
+                "",
+            ),
+            (
+                "what's the weather in new york",
+                "New York is cloudy today with a top of 18 degrees.",
+                [],
+                "",
+            ),
+            (
+                "what's the weather in new york city",
+                "New York City is cloudy today with a top of 18 degrees.",
+                [],
+                "",
+            ),
+        ]
+    ],
+}
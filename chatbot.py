@@ -1,35 +1,367 @@
-import asyncio
+import time
 
-import pyaudio
-import boto3
+# Startup is timed from here, including the imports below
+STARTED = time.perf_counter()
 
-from amazon_transcribe.client import TranscribeStreamingClient
+import argparse
+import asyncio
 
-from lib.transcript_handler import TranscriptHandler
+# Only light modules are imported here; boto3, amazon_transcribe, PyAudio,
+# numpy and the handler are loaded in the background (see start_warmup)
+from lib.audio_player import AudioPlayer
+from lib.tts_cache import SynthesisCache
+from lib.answer_cache import AnswerCache
+from lib.deadline import TURN_BUDGET_SECONDS
+from lib.history import HISTORY_TOKEN_BUDGET
+from lib.metrics import MetricsRegistry
+from lib.search_results import SEARCH_RESULT_TOKEN_BUDGET
+from lib.audio_codecs import PCM, POLLY_FORMATS, TRANSCRIBE_ENCODINGS, import_av
+from lib.startup import USER, StartupProfile, Warmup, preload, warm_aws_connections
+from lib.audio_capture import (
+    BACKPRESSURE,
+    CHANNELS,
+    CHUNK,
+    DROP_OLDEST,
+    RATE,
+    AudioCapture,
+)
+from lib.vad import (
+    END_OF_UTTERANCE_MS,
+    HANGOVER_MS,
+    PRE_ROLL_MS,
+    START_MS,
+    THRESHOLD_DB,
+    VoiceActivityDetector,
+)
 
 # AWS region
 REGION = "us-west-2"
 
-# Audio input configuration
-CHUNK = 1024
-FORMAT = pyaudio.paInt16
-CHANNELS = 1
-RATE = 16000
+# Modules the session needs, imported while the language menu is shown
+SESSION_MODULES = [
+    "numpy",
+    "lib.transcript_handler",
+    "lib.transcribe_session",
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Voice chatbot using Transcribe, Bedrock and Polly"
+    )
+    parser.add_argument(
+        "--speculative",
+        action="store_true",
+        help="start the model on stabilized partial transcripts",
+    )
+    parser.add_argument(
+        "--early-tools",
+        action="store_true",
+        help="start read-only tools while their input is still streaming",
+    )
+    parser.add_argument(
+        "--answer-cache",
+        action="store_true",
+        help="answer repeated questions from earlier spoken answers",
+    )
+    parser.add_argument(
+        "--turn-budget",
+        type=float,
+        default=TURN_BUDGET_SECONDS,
+        metavar="SECONDS",
+        help="time for a turn to start answering before it degrades; 0 disables "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--fillers",
+        action="store_true",
+        help="play a short phrase while tools run or the first token is slow",
+    )
+    parser.add_argument(
+        "--barge-in",
+        action="store_true",
+        help="stop the answer as soon as the user starts speaking over it",
+    )
+    parser.add_argument(
+        "--vad",
+        action="store_true",
+        help="gate silence locally and start turns on local end-of-utterance",
+    )
+    parser.add_argument(
+        "--vad-threshold-db",
+        type=float,
+        default=THRESHOLD_DB,
+        help="speech energy threshold in dBFS (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--vad-start-ms",
+        type=int,
+        default=START_MS,
+        help="speech needed before audio is sent (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--vad-end-ms",
+        type=int,
+        default=END_OF_UTTERANCE_MS,
+        help="silence that ends an utterance locally (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--vad-hangover-ms",
+        type=int,
+        default=HANGOVER_MS,
+        help="silence still sent after speech (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--vad-pre-roll-ms",
+        type=int,
+        default=PRE_ROLL_MS,
+        help="audio kept from before speech onset (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--capture-overflow",
+        choices=[DROP_OLDEST, BACKPRESSURE],
+        default=DROP_OLDEST,
+        help="what to do when the mic ring buffer is full (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--history-tokens",
+        type=int,
+        default=HISTORY_TOKEN_BUDGET,
+        help="token budget for conversation history (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--search-tokens",
+        type=int,
+        default=SEARCH_RESULT_TOKEN_BUDGET,
+        help="token budget for each set of web search results (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--transcribe-encoding",
+        choices=TRANSCRIBE_ENCODINGS,
+        default=PCM,
+        help="audio encoding sent to Transcribe (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--polly-format",
+        choices=POLLY_FORMATS,
+        default=PCM,
+        help="audio format requested from Polly (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--serve",
+        metavar="HOST:PORT",
+        help="serve many voice sessions over TCP instead of using the local mic",
+    )
+    # Defaults come from lib/gateway.py, which is only imported with --serve
+    parser.add_argument(
+        "--max-sessions",
+        type=int,
+        help="sessions served at once with --serve (default: MAX_SESSIONS)",
+    )
+    parser.add_argument(
+        "--max-active-turns",
+        type=int,
+        help="turns generating at once across sessions with --serve "
+        "(default: MAX_ACTIVE_TURNS)",
+    )
+    parser.add_argument(
+        "--trace-file",
+        help="append a JSON line with each turn's latency timeline to this file",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        help="write latency percentiles in Prometheus text format to this file",
+    )
+    args = parser.parse_args()
+
+    # Compressed audio needs PyAV; say so before any AWS stream is opened
+    if args.transcribe_encoding != PCM or args.polly_format != PCM:
+        try:
+            import_av()
+        except RuntimeError as e:
+            parser.error(str(e))
+    if args.serve:
+        host, _, port = args.serve.rpartition(":")
+        if not port.isdigit():
+            parser.error("--serve needs HOST:PORT")
+        args.serve = (host or "0.0.0.0", int(port))
+    return args
+
+
+def vad_options(args):
+    return {
+        "threshold_db": args.vad_threshold_db,
+        "start_ms": args.vad_start_ms,
+        "end_of_utterance_ms": args.vad_end_ms,
+        "hangover_ms": args.vad_hangover_ms,
+        "pre_roll_ms": args.vad_pre_roll_ms,
+    }
+
+
+def create_clients(config=None):
+    """
+    Returns:
+        tuple: (TranscribeStreamingClient, bedrock-runtime client, Polly client)
+    """
+    import boto3
+    from amazon_transcribe.client import TranscribeStreamingClient
+
+    transcribe_client = TranscribeStreamingClient(region=REGION)
+    bedrock_runtime = boto3.client(
+        service_name="bedrock-runtime", region_name=REGION, config=config
+    )
+    polly_client = boto3.client("polly", region_name=REGION, config=config)
+    return transcribe_client, bedrock_runtime, polly_client
+
+
+def warm_connections(warmup):
+    from lib.transcript_handler import MODELS
+
+    _, bedrock_runtime, polly_client = warmup.wait("aws clients")
+    warm_aws_connections(bedrock_runtime, polly_client, REGION, MODELS[0])
+
+
+def open_audio_output():
+    # Opening the first PortAudio stream probes every audio device
+    audio_player = AudioPlayer()
+    audio_player.start()
+    return audio_player
+
+
+def load_fillers(warmup, fillers):
+    # Every language is synthesized while the user is still choosing one
+    from lib.filler import polly_synthesizer
+
+    _, _, polly_client = warmup.wait("aws clients")
+    fillers.load(polly_synthesizer(polly_client, warmup.wait("speech cache")))
+
+
+def resume_publishing():
+    # Blog posts left queued by the last run carry on in the background
+    from lib.publish_queue import resume_publishing
+
+    resume_publishing()
+
 
+def print_publish_stats():
+    from lib.publish_queue import default_publish_queue
 
-async def write_chunks(stream, audio_stream):
+    publish_queue = default_publish_queue(create=False)
+    if publish_queue is None:
+        return
+    stats = publish_queue.stats()
+    print(f"Publish queue stats: {stats}")
+    if stats["pending"]:
+        print(
+            f"{stats['pending']} blog posts are still queued; "
+            "they will be published on the next start"
+        )
+
+
+def start_warmup(profile):
+    """
+    Start everything the session needs that does not depend on the language.
+    """
+    warmup = Warmup(profile)
+    warmup.start("aws clients", create_clients)
+    warmup.start("aws connections", warm_connections, warmup)
+    warmup.start("audio output", open_audio_output)
+    warmup.start("session modules", preload, SESSION_MODULES)
+    warmup.start("speech cache", SynthesisCache)
+    warmup.start("publish queue", resume_publishing)
+    return warmup
+
+
+async def serve(args):
+    from lib.gateway import (
+        MAX_ACTIVE_TURNS,
+        MAX_SESSIONS,
+        VoiceGateway,
+        client_config,
+    )
+    from lib.model_router import ModelRouter
+    from lib.transcript_handler import MODELS
+
+    max_sessions = args.max_sessions or MAX_SESSIONS
+    max_active_turns = args.max_active_turns or MAX_ACTIVE_TURNS
+
+    # One set of clients and connection pools for every session
+    transcribe_client, bedrock_runtime, polly_client = create_clients(
+        client_config(max_active_turns)
+    )
+    tts_cache = SynthesisCache()
+    fillers = None
+    if args.fillers:
+        from lib.event_loop import run_blocking
+        from lib.filler import FillerBank, polly_synthesizer
+
+        # One bank for every session; phrases are kept per language
+        fillers = FillerBank()
+        await run_blocking(fillers.load, polly_synthesizer(polly_client, tts_cache))
+    metrics = MetricsRegistry(
+        enabled=bool(args.trace_file or args.metrics_file),
+        trace_path=args.trace_file,
+        prometheus_path=args.metrics_file,
+    )
+    gateway = VoiceGateway(
+        transcribe_client,
+        bedrock_runtime,
+        polly_client,
+        tts_cache,
+        metrics,
+        ModelRouter(MODELS),
+        max_sessions=max_sessions,
+        max_active_turns=max_active_turns,
+        transcribe_encoding=args.transcribe_encoding,
+        vad_options=vad_options(args) if args.vad else None,
+        handler_options={
+            "speculative": args.speculative,
+            "early_tools": args.early_tools,
+            # One cache for every session; answers are kept per language
+            "answer_cache": AnswerCache() if args.answer_cache else None,
+            "turn_budget": args.turn_budget,
+            "fillers": fillers,
+            "history_token_budget": args.history_tokens,
+            "search_token_budget": args.search_tokens,
+            "barge_in": args.barge_in,
+            "polly_format": args.polly_format,
+        },
+    )
+
+    host, port = args.serve
+    await gateway.start(host, port)
+    print(f"Voice gateway listening on {host}:{port} (Press Ctrl+C to stop)")
     try:
-        while True:
-            data = audio_stream.read(CHUNK, exception_on_overflow=False)
-            await stream.input_stream.send_audio_event(audio_chunk=data)
-    except asyncio.CancelledError:
-        # Handle task cancellation gracefully
-        raise
-    except Exception as e:
-        print(f"Error writing chunks: {e}")
+        await gateway.serve_forever()
+    finally:
+        await gateway.close()
+        print(f"\nGateway stats: {gateway.stats()}")
+        print(f"Speech cache stats: {gateway.tts_cache.stats()}")
+        print(f"Model router stats: {gateway.router.stats()}")
+        answer_cache = gateway.handler_options["answer_cache"]
+        if answer_cache:
+            print(f"Answer cache stats: {answer_cache.stats()}")
+        if fillers:
+            print(f"Filler stats: {fillers.stats()}")
+        print_publish_stats()
+        if metrics.enabled:
+            print(f"Turn latency: {metrics.summary()}")
+
+
+async def main(args, profile):
+    if args.serve:
+        await serve(args)
+        return
+
+    # Clients, connections and the speaker get ready while the user picks
+    warmup = start_warmup(profile)
+    fillers = None
+    if args.fillers:
+        from lib.filler import FillerBank
 
+        fillers = FillerBank()
+        warmup.start("fillers", load_fillers, warmup, fillers)
 
-async def main():
     supported_languages = {
         "1": "en-US",
         "2": "zh-CN",
@@ -46,90 +378,125 @@ async def main():
         if value == "es-ES":
             print(f"{key}: Español")
 
-    language_choice = input("Enter the number corresponding to your choice: ")
+    with profile.phase("language menu", USER):
+        language_choice = input("Enter the number corresponding to your choice: ")
     selected_language = supported_languages.get(language_choice, "en-US")
     conversation_history = []  # Initialize conversation history
-    while True:  # Loop to allow restarting on timeout
-        transcribe_client = None
-        bedrock_runtime = None
-        polly_client = None
-        audio = None
-        audio_stream = None
-        tasks = []
 
-        try:
+    # Clients, mic and speaker are created once and kept for the whole session
+    transcribe_client, bedrock_runtime, polly_client = await warmup.result(
+        "aws clients"
+    )
+    await warmup.result("session modules")
+    from lib.transcript_handler import TranscriptHandler
+    from lib.transcribe_session import TranscribeSession
 
-            transcribe_client = TranscribeStreamingClient(region=REGION)
-            bedrock_runtime = boto3.client(
-                service_name="bedrock-runtime", region_name=REGION
-            )
-            polly_client = boto3.client("polly", region_name=REGION)
-
-            audio = pyaudio.PyAudio()
-            audio_stream = audio.open(
-                format=FORMAT,
-                channels=CHANNELS,
-                rate=RATE,
-                input=True,
-                frames_per_buffer=CHUNK,
-            )
-
-            print("Listening... You can start speaking now! (Press Ctrl+C to stop)\n")
-
-            # Update stream_config with the selected language
-            stream_config = {
-                "media_sample_rate_hz": RATE,
-                "media_encoding": "pcm",
-                "language_code": selected_language,  # Use the selected language
-                "enable_partial_results_stabilization": True,
-            }
-
-            stream = await transcribe_client.start_stream_transcription(**stream_config)
-
-            handler = TranscriptHandler(
-                bedrock_runtime,
-                stream.output_stream,
-                polly_client,
-                selected_language,
-                conversation_history,
-            )
-            handler_task = asyncio.create_task(handler.handle_events())
-            writer_task = asyncio.create_task(write_chunks(stream, audio_stream))
-
-            tasks = [handler_task, writer_task]
-
-            await asyncio.gather(*tasks)
-
-        except KeyboardInterrupt:
-            break  # Exit the loop on manual interrupt
-        except Exception as e:
-            print(f"\nError: {e}")
-            # Optionally, you can add a delay before restarting
-            await asyncio.sleep(1)  # Delay before restarting
-        finally:
-            # Cancel tasks first
-            for task in tasks:
-                if not task.done():
-                    task.cancel()
+    # One output device for the whole session; Enter stops the current answer.
+    # stdin is only watched once the menu has read its answer
+    audio_player = await warmup.result("audio output")
+    audio_player.stop_on_enter()
+    tts_cache = await warmup.result("speech cache")
+
+    # Latency instrumentation is only switched on when something will read it
+    metrics = MetricsRegistry(
+        enabled=bool(args.trace_file or args.metrics_file),
+        trace_path=args.trace_file,
+        prometheus_path=args.metrics_file,
+    )
+
+    capture = AudioCapture(
+        rate=RATE,
+        channels=CHANNELS,
+        chunk=CHUNK,
+        policy=args.capture_overflow,
+    )
+
+    vad = None
+    if args.vad:
+        vad = VoiceActivityDetector(rate=RATE, **vad_options(args))
 
-            # Wait for tasks to complete their cancellation
-            if tasks:
-                await asyncio.gather(*tasks, return_exceptions=True)
+    handler = TranscriptHandler(
+        bedrock_runtime,
+        None,  # Result streams are supplied by the session as they are opened
+        polly_client,
+        selected_language,
+        conversation_history,
+        audio_player=audio_player,
+        tts_cache=tts_cache,
+        speculative=args.speculative,
+        early_tools=args.early_tools,
+        answer_cache=AnswerCache() if args.answer_cache else None,
+        turn_budget=args.turn_budget,
+        fillers=fillers,
+        history_token_budget=args.history_tokens,
+        metrics=metrics,
+        search_token_budget=args.search_tokens,
+        barge_in=args.barge_in,
+        polly_format=args.polly_format,
+    )
+
+    # Update stream_config with the selected language
+    stream_config = {
+        "media_sample_rate_hz": RATE,
+        "media_encoding": args.transcribe_encoding,
+        "language_code": selected_language,  # Use the selected language
+        "enable_partial_results_stabilization": True,
+    }
+
+    session = TranscribeSession(
+        transcribe_client,
+        capture,
+        handler,
+        stream_config,
+        vad=vad,
+        encoding=args.transcribe_encoding,
+    )
+
+    try:
+        with profile.phase("open microphone"):
+            capture.start()
+        print(profile.report())
+        # Connection warm-up is not needed to start listening and carries on
+        if warmup.pending():
+            print(f"(still warming up: {', '.join(warmup.pending())})")
+        print("Listening... You can start speaking now! (Press Ctrl+C to stop)\n")
+        await session.run()
+    finally:
+        # Clean up audio resources
+        capture.close()
+        audio_player.close()
 
-            # Clean up audio resources
-            if audio_stream:
-                audio_stream.stop_stream()
-                audio_stream.close()
-            if audio:
-                audio.terminate()
+        print("\nThank you for using the chatbot!")
+        print(f"Transcribe stream stats: {session.stats()}")
+        print(f"Capture stats: {capture.stats()}")
+        print(f"Playback stats: {audio_player.stats()}")
+        print(f"Speech cache stats: {tts_cache.stats()}")
+        if handler.answer_cache:
+            print(f"Answer cache stats: {handler.answer_cache.stats()}")
+        if args.turn_budget:
+            print(f"Turn deadline stats: {handler.deadline_stats.summary()}")
+        if fillers:
+            print(f"Filler stats: {fillers.stats()}")
+        print(f"Polly audio stats: {handler.decode_stats.summary()}")
+        print(f"History stats: {handler.conversation_history.stats()}")
+        print(f"Token usage: {handler.usage.summary()}")
+        from lib.web_search import default_searcher
 
-            print("\nThank you for using the chatbot!")
+        print(f"Web search stats: {default_searcher().stats()}")
+        print(f"Model router stats: {handler.router.stats()}")
+        print_publish_stats()
+        if args.barge_in:
+            print(f"Barge-in stats: {handler.barge_in_stats.summary()}")
+        if metrics.enabled:
+            print(f"Turn latency: {metrics.summary()}")
 
 
 if __name__ == "__main__":
     loop = asyncio.get_event_loop()
     try:
-        loop.run_until_complete(main())
+        profile = StartupProfile(STARTED)
+        profile.record("imports", time.perf_counter() - STARTED)
+        loop.run_until_complete(main(parse_args(), profile))
     except KeyboardInterrupt:
         pass  # Already handled in main()
     finally:
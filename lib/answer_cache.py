@@ -0,0 +1,314 @@
+import datetime
+import itertools
+import re
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+
+# How long answers stay fresh (seconds): answers built from tool results such
+# as a weather search go stale quickly, answers from the model alone do not.
+# No answer outlives the day it was given, since the prompt carries the date
+TOOL_ANSWER_TTL = 10 * 60
+STATIC_ANSWER_TTL = 24 * 60 * 60
+
+# Tools whose results may be replayed from the cache; anything with side
+# effects or state (post_blog, blog_post_status) keeps its turn uncached
+CACHEABLE_TOOLS = {"web_search"}
+
+# Trigram Jaccard similarity a question needs to reuse an answer
+SIMILARITY_THRESHOLD = 0.8
+
+# Words that do not change what is being asked, ignored when two similar
+# questions are compared word by word
+FILLER_WORDS = {"hey", "hi", "um", "uh", "er", "so", "ok", "okay", "well", "please"}
+
+# Questions shorter than this (normalized characters) are not cached: "why",
+# "tell me more" and the like depend on the conversation, not the words
+MIN_QUESTION_CHARS = 12
+
+# Size limits
+MAX_ENTRIES = 256
+MEMORY_BYTES = 64 * 1024 * 1024
+
+NGRAM = 3
+
+
+def normalize_question(text):
+    """
+    Normalize a transcript for comparison: width, case, punctuation, spacing.
+
+    Args:
+        text (str): Transcript
+
+    Returns:
+        str: Normalized text
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    kept = "".join(
+        char for char in text if not unicodedata.category(char).startswith(("P", "S"))
+    )
+    return " ".join(kept.split())
+
+
+def ngrams(text, n=NGRAM):
+    """
+    Character n-grams of normalized text, padded so short words still count.
+
+    Returns:
+        set: Distinct n-grams
+    """
+    padded = f" {text} "
+    if len(padded) <= n:
+        return {padded}
+    return {padded[i : i + n] for i in range(len(padded) - n + 1)}
+
+
+def numbers(text):
+    """
+    Returns:
+        list: Digit runs in the text, in order
+    """
+    return re.findall(r"\d+", text)
+
+
+def content_words(text):
+    """
+    Words of normalized text without fillers; each Chinese character counts
+    as one word.
+
+    Returns:
+        list: Words in order
+    """
+    words = re.findall(r"[\u3400-\u9fff]|[^\s\u3400-\u9fff]+", text)
+    return [word for word in words if word not in FILLER_WORDS]
+
+
+def same_words(words, other):
+    """
+    Whether two questions use the same words in the same order, allowing one
+    small edit: a single word that differs only by a trailing "s" ("sydney's"
+    and "sydney" once punctuation is gone).
+
+    Trigram similarity alone takes "capital of austria" for "capital of
+    australia" or "new york" for "new york city"; this is the check that
+    tells them apart.
+
+    Args:
+        words (list): Content words of one question
+        other (list): Content words of the other
+
+    Returns:
+        bool: True if the questions can share an answer
+    """
+    if len(words) != len(other):
+        return False
+    edits = [(word, theirs) for word, theirs in zip(words, other) if word != theirs]
+    if not edits:
+        return True
+    if len(edits) > 1:
+        return False
+    word, theirs = sorted(edits[0], key=len)
+    return theirs == f"{word}s"
+
+
+def end_of_day(now):
+    """
+    Returns:
+        float: Epoch time of the next local midnight after now
+    """
+    tomorrow = datetime.date.fromtimestamp(now) + datetime.timedelta(days=1)
+    return time.mktime(tomorrow.timetuple())
+
+
+class CachedAnswer:
+    """
+    A spoken answer: its text and the PCM of each segment as it was played.
+    """
+
+    def __init__(self, entry_id, language, question, text, segments, expires_at):
+        self.id = entry_id
+        self.language = language
+        self.question = question
+        self.grams = ngrams(question)
+        self.numbers = numbers(question)
+        self.words = content_words(question)
+        self.text = text
+        self.segments = segments
+        self.created_at = time.time()
+        self.expires_at = expires_at
+        self.size = sum(len(pcm) for _, pcm in segments)
+        self.hits = 0
+
+
+class AnswerCache:
+    """
+    In-memory cache of spoken answers, keyed by language and question.
+
+    Questions are matched exactly after normalization, then by trigram
+    Jaccard similarity through an inverted index from (language, trigram) to
+    entries, so a lookup only scores entries that share a trigram with the
+    question. A similar question must also use the same content words in the
+    same order, and questions with different numbers in them never match. Entries
+    expire on their own TTL and are evicted least recently used by count and
+    by audio size.
+    """
+
+    def __init__(
+        self,
+        threshold=SIMILARITY_THRESHOLD,
+        max_entries=MAX_ENTRIES,
+        memory_bytes=MEMORY_BYTES,
+    ):
+        """
+        Args:
+            threshold (float): Similarity a question needs to reuse an answer
+            max_entries (int): Maximum number of answers kept
+            memory_bytes (int): Maximum bytes of answer audio kept
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.memory_bytes = memory_bytes
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.lookup_seconds = 0.0
+        self._entries = OrderedDict()
+        self._exact = {}
+        self._index = {}
+        self._size = 0
+        self._ids = itertools.count()
+
+    def get(self, language, transcript):
+        """
+        Find an answer to the same or a nearly identical question.
+
+        Args:
+            language (str): Transcription language code
+            transcript (str): What the user said
+
+        Returns:
+            tuple: (CachedAnswer, similarity), or (None, 0.0) on a miss
+        """
+        started = time.perf_counter()
+        try:
+            return self._get(language, normalize_question(transcript))
+        finally:
+            self.lookup_seconds += time.perf_counter() - started
+
+    def put(self, language, transcript, text, segments, ttl):
+        """
+        Store a spoken answer.
+
+        Args:
+            language (str): Transcription language code
+            transcript (str): Question that was answered
+            text (str): Answer text
+            segments (list): (segment text, PCM) pairs in playback order
+            ttl (float): Seconds the answer stays fresh
+
+        Returns:
+            bool: Whether the answer was stored
+        """
+        question = normalize_question(transcript)
+        if len(question) < MIN_QUESTION_CHARS or not text or not segments:
+            return False
+        now = time.time()
+        entry = CachedAnswer(
+            next(self._ids),
+            language,
+            question,
+            text,
+            [(segment, bytes(pcm)) for segment, pcm in segments],
+            min(now + ttl, end_of_day(now)),
+        )
+        if entry.size > self.memory_bytes:
+            return False
+        previous = self._exact.get((language, question))
+        if previous is not None:
+            self._remove(previous)
+        self._entries[entry.id] = entry
+        self._exact[(language, question)] = entry
+        for gram in entry.grams:
+            self._index.setdefault((language, gram), set()).add(entry.id)
+        self._size += entry.size
+        while len(self._entries) > self.max_entries or self._size > self.memory_bytes:
+            self._remove(next(iter(self._entries.values())))
+            self.evictions += 1
+        return True
+
+    def stats(self):
+        hits = self.exact_hits + self.similar_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "audio_bytes": self._size,
+            "mean_lookup_ms": (
+                self.lookup_seconds / lookups * 1000 if lookups else 0.0
+            ),
+        }
+
+    def _get(self, language, question):
+        now = time.time()
+        entry = self._exact.get((language, question))
+        exact = entry is not None
+        similarity = 1.0
+        if not exact:
+            entry, similarity = self._most_similar(language, question)
+        if entry is not None and entry.expires_at <= now:
+            self._remove(entry)
+            self.expired += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None, 0.0
+        if exact:
+            self.exact_hits += 1
+        else:
+            self.similar_hits += 1
+        entry.hits += 1
+        self._entries.move_to_end(entry.id)
+        return entry, similarity
+
+    def _most_similar(self, language, question):
+        grams = ngrams(question)
+        question_numbers = numbers(question)
+        question_words = content_words(question)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._index.get((language, gram), ()))
+        best, best_similarity = None, 0.0
+        for entry_id, count in shared.items():
+            entry = self._entries[entry_id]
+            if entry.numbers != question_numbers:
+                # "the 2018 final" is a different question from "the 2022 final"
+                continue
+            similarity = count / (len(grams) + len(entry.grams) - count)
+            if similarity < self.threshold:
+                continue
+            if not same_words(entry.words, question_words):
+                # "capital of austria" is not "capital of australia"
+                continue
+            if similarity > best_similarity:
+                best, best_similarity = entry, similarity
+        if best_similarity < self.threshold:
+            return None, 0.0
+        return best, best_similarity
+
+    def _remove(self, entry):
+        del self._entries[entry.id]
+        self._exact.pop((entry.language, entry.question), None)
+        for gram in entry.grams:
+            ids = self._index.get((entry.language, gram))
+            if ids is not None:
+                ids.discard(entry.id)
+                if not ids:
+                    del self._index[(entry.language, gram)]
+        self._size -= entry.size
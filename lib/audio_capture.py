@@ -0,0 +1,219 @@
+import asyncio
+import threading
+
+# Audio input configuration
+CHUNK = 1024
+CHANNELS = 1
+RATE = 16000
+SAMPLE_WIDTH = 2  # 16-bit PCM
+
+# Seconds of audio the capture ring buffer can hold; large enough to bridge
+# a Transcribe stream reconnect without losing speech
+RING_SECONDS = 10.0
+
+# What to do when the ring buffer is full
+DROP_OLDEST = "drop-oldest"
+BACKPRESSURE = "backpressure"
+OVERFLOW_POLICIES = (DROP_OLDEST, BACKPRESSURE)
+
+# Longest a capture callback may wait for space under backpressure (seconds)
+BACKPRESSURE_TIMEOUT = 0.02
+
+
+class RingBuffer:
+    """
+    Fixed-size byte ring buffer shared between a producer and a consumer thread.
+
+    The storage is allocated once; writes and reads copy through memoryviews
+    so no buffers are created per chunk.
+    """
+
+    def __init__(self, capacity, policy=DROP_OLDEST):
+        """
+        Args:
+            capacity (int): Size in bytes
+            policy (str): DROP_OLDEST overwrites the oldest audio when full;
+                BACKPRESSURE waits briefly for the consumer, then drops the new audio
+        """
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        self.capacity = capacity
+        self.policy = policy
+        self.overflows = 0
+        self.dropped_bytes = 0
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+        self._read_pos = 0
+        self._size = 0
+        self._space = threading.Condition()
+
+    @property
+    def available(self):
+        return self._size
+
+    def write(self, data):
+        """
+        Append data, applying the overflow policy if it does not fit.
+
+        Args:
+            data (bytes-like): Audio to store
+
+        Returns:
+            int: Number of bytes stored
+        """
+        data = memoryview(data)
+        with self._space:
+            free = self.capacity - self._size
+            if len(data) > free:
+                if self.policy == BACKPRESSURE:
+                    self._space.wait_for(
+                        lambda: self.capacity - self._size >= len(data),
+                        timeout=BACKPRESSURE_TIMEOUT,
+                    )
+                    free = self.capacity - self._size
+                    if len(data) > free:
+                        self.overflows += 1
+                        self.dropped_bytes += len(data)
+                        return 0
+                else:
+                    self.overflows += 1
+                    if len(data) > self.capacity:
+                        self.dropped_bytes += len(data) - self.capacity
+                        data = data[-self.capacity :]
+                    drop = len(data) - free
+                    self._read_pos = (self._read_pos + drop) % self.capacity
+                    self._size -= drop
+                    self.dropped_bytes += drop
+
+            write_pos = (self._read_pos + self._size) % self.capacity
+            first = min(len(data), self.capacity - write_pos)
+            self._view[write_pos : write_pos + first] = data[:first]
+            if first < len(data):
+                self._view[: len(data) - first] = data[first:]
+            self._size += len(data)
+            return len(data)
+
+    def readinto(self, out):
+        """
+        Move up to len(out) bytes into out.
+
+        Args:
+            out (memoryview): Destination buffer
+
+        Returns:
+            int: Number of bytes copied
+        """
+        with self._space:
+            count = min(len(out), self._size)
+            first = min(count, self.capacity - self._read_pos)
+            out[:first] = self._view[self._read_pos : self._read_pos + first]
+            if first < count:
+                out[first:count] = self._view[: count - first]
+            self._read_pos = (self._read_pos + count) % self.capacity
+            self._size -= count
+            self._space.notify()
+            return count
+
+
+class AudioCapture:
+    """
+    Microphone capture in PyAudio callback mode.
+
+    PortAudio's callback thread writes into a RingBuffer and wakes the event
+    loop; read_chunk() drains one chunk at a time without ever blocking the
+    loop on the device.
+    """
+
+    def __init__(
+        self,
+        rate=RATE,
+        channels=CHANNELS,
+        chunk=CHUNK,
+        ring_seconds=RING_SECONDS,
+        policy=DROP_OLDEST,
+        audio=None,
+    ):
+        """
+        Args:
+            rate (int): Sample rate in Hz
+            channels (int): Number of input channels
+            chunk (int): Frames per chunk handed to read_chunk() callers
+            ring_seconds (float): Audio the ring buffer can hold
+            policy (str): Overflow policy, DROP_OLDEST or BACKPRESSURE
+            audio (optional): PyAudio-compatible object; a PyAudio instance by default
+        """
+        self.rate = rate
+        self.channels = channels
+        self.chunk = chunk
+        self.chunk_bytes = chunk * channels * SAMPLE_WIDTH
+        capacity = int(rate * ring_seconds) * channels * SAMPLE_WIDTH
+        self.ring = RingBuffer(max(capacity, self.chunk_bytes), policy)
+        self.device_overflows = 0
+        self.audio = audio
+        self.stream = None
+        self._loop = None
+        self._overflow_flag = 0
+        self._continue = 0
+        self._data_ready = asyncio.Event()
+        self._chunk = bytearray(self.chunk_bytes)
+        self._chunk_view = memoryview(self._chunk)
+
+    def start(self):
+        """
+        Open the input device; must be called from the event loop thread.
+        """
+        self._loop = asyncio.get_running_loop()
+        if self.audio is None:
+            import pyaudio
+
+            self._overflow_flag = pyaudio.paInputOverflow
+            self._continue = pyaudio.paContinue
+            self.audio = pyaudio.PyAudio()
+        self.stream = self.audio.open(
+            format=self.audio.get_format_from_width(SAMPLE_WIDTH),
+            channels=self.channels,
+            rate=self.rate,
+            input=True,
+            frames_per_buffer=self.chunk,
+            stream_callback=self._callback,
+        )
+        self.stream.start_stream()
+
+    def close(self):
+        if self.stream:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self.audio:
+            self.audio.terminate()
+            self.audio = None
+
+    async def read_chunk(self):
+        """
+        Wait for and return the next chunk of audio.
+
+        Returns:
+            bytes: chunk frames of 16-bit PCM (copied once, for the network send)
+        """
+        while self.ring.available < self.chunk_bytes:
+            self._data_ready.clear()
+            if self.ring.available >= self.chunk_bytes:
+                break
+            await self._data_ready.wait()
+        self.ring.readinto(self._chunk_view)
+        return bytes(self._chunk)
+
+    def stats(self):
+        return {
+            "ring_overflows": self.ring.overflows,
+            "dropped_bytes": self.ring.dropped_bytes,
+            "device_overflows": self.device_overflows,
+            "buffered_bytes": self.ring.available,
+        }
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        if status & self._overflow_flag:
+            self.device_overflows += 1
+        self.ring.write(in_data)
+        self._loop.call_soon_threadsafe(self._data_ready.set)
+        return (None, self._continue)
@@ -0,0 +1,275 @@
+import time
+from fractions import Fraction
+
+# Sample rate of the PCM the rest of the app works with
+RATE = 16000
+
+# Transcribe input encodings
+PCM = "pcm"
+FLAC = "flac"
+OGG_OPUS = "ogg-opus"
+TRANSCRIBE_ENCODINGS = (PCM, FLAC, OGG_OPUS)
+
+# Polly output formats
+MP3 = "mp3"
+OGG_VORBIS = "ogg_vorbis"
+POLLY_FORMATS = (PCM, MP3, OGG_VORBIS)
+
+# Opus settings: 20 ms frames at a speech bitrate. Ogg pages are flushed
+# every 60 ms, just under one capture chunk (64 ms), so every chunk sends its
+# page and no audio waits in the muxer; shorter pages only add overhead
+OPUS_BITRATE = 24000
+OPUS_FRAME_MS = 20
+OGG_PAGE_MS = 60
+
+# FLAC compression level 2 keeps blocks at 256 samples (16 ms at 16 kHz)
+FLAC_COMPRESSION_LEVEL = 2
+
+# Container, codec and options per Transcribe encoding
+ENCODERS = {
+    FLAC: ("flac", "flac", {}, {"compression_level": str(FLAC_COMPRESSION_LEVEL)}),
+    OGG_OPUS: (
+        "ogg",
+        "libopus",
+        {"page_duration": str(OGG_PAGE_MS * 1000)},
+        {"application": "voip", "frame_duration": str(OPUS_FRAME_MS)},
+    ),
+}
+
+# Container per Polly output format
+DECODERS = {
+    MP3: "mp3",
+    OGG_VORBIS: "ogg",
+}
+
+# Bytes read at a time from a compressed Polly stream
+DECODE_READ_BYTES = 4096
+
+
+def import_av():
+    """
+    Import PyAV, which is only needed for compressed audio.
+
+    Returns:
+        module: The av module
+
+    Raises:
+        RuntimeError: PyAV is not installed
+    """
+    try:
+        import av
+    except ImportError as e:
+        raise RuntimeError(
+            "Compressed audio needs PyAV; install it with 'pip install av' "
+            "or use pcm"
+        ) from e
+    return av
+
+
+class CodecStats:
+    """
+    Bytes and time spent in an encoder or decoder.
+    """
+
+    def __init__(self):
+        self.pcm_bytes = 0
+        self.wire_bytes = 0
+        self.seconds = 0.0
+        self.calls = 0
+
+    def merge(self, other):
+        self.pcm_bytes += other.pcm_bytes
+        self.wire_bytes += other.wire_bytes
+        self.seconds += other.seconds
+        self.calls += other.calls
+
+    def summary(self):
+        return {
+            "pcm_bytes": self.pcm_bytes,
+            "wire_bytes": self.wire_bytes,
+            "ratio": self.wire_bytes / self.pcm_bytes if self.pcm_bytes else 1.0,
+            "codec_ms": self.seconds * 1000,
+            "mean_codec_ms": self.seconds / self.calls * 1000 if self.calls else 0.0,
+        }
+
+
+class _ByteSink:
+    """
+    Write-only, unseekable file object collecting muxer output.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        return len(data)
+
+    def take(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+class StreamEncoder:
+    """
+    Encode PCM chunks for one Transcribe stream as they are captured.
+
+    Each Transcribe stream needs its own encoder, because the container
+    headers go out with the first bytes of the stream. encode() returns
+    whatever the muxer has produced so far, which may be empty while a
+    frame is still filling up.
+    """
+
+    def __init__(self, encoding=PCM, rate=RATE):
+        """
+        Args:
+            encoding (str): One of TRANSCRIBE_ENCODINGS
+            rate (int): Sample rate of the PCM in Hz
+        """
+        if encoding not in TRANSCRIBE_ENCODINGS:
+            raise ValueError(f"Unknown Transcribe encoding: {encoding}")
+        self.encoding = encoding
+        self.rate = rate
+        self.stats = CodecStats()
+        self.samples_in = 0
+        self._container = None
+        self._stream = None
+        self._sink = None
+        if encoding == PCM:
+            return
+
+        av = import_av()
+        container_format, codec, muxer_options, codec_options = ENCODERS[encoding]
+        self._av = av
+        self._sink = _ByteSink()
+        self._container = av.open(
+            self._sink, mode="w", format=container_format, options=muxer_options
+        )
+        self._stream = self._container.add_stream(
+            codec, rate=rate, options=codec_options
+        )
+        self._stream.codec_context.layout = "mono"
+        self._stream.codec_context.format = "s16"
+        if encoding == OGG_OPUS:
+            self._stream.codec_context.bit_rate = OPUS_BITRATE
+
+    def encode(self, pcm):
+        """
+        Args:
+            pcm (bytes): 16-bit mono PCM
+
+        Returns:
+            bytes: Encoded bytes ready to send (possibly empty)
+        """
+        self.stats.pcm_bytes += len(pcm)
+        if self._container is None:
+            self.stats.wire_bytes += len(pcm)
+            return pcm
+        # Like PyAV, numpy is only loaded once audio is compressed
+        import numpy as np
+
+        started = time.perf_counter()
+        samples = np.frombuffer(pcm, dtype=np.int16).reshape(1, -1)
+        frame = self._av.AudioFrame.from_ndarray(samples, format="s16", layout="mono")
+        frame.sample_rate = self.rate
+        frame.pts = self.samples_in
+        frame.time_base = Fraction(1, self.rate)
+        self.samples_in += samples.shape[1]
+        for packet in self._stream.encode(frame):
+            self._container.mux(packet)
+        return self._take(started)
+
+    def close(self):
+        """
+        Flush the encoder and finish the container.
+
+        Returns:
+            bytes: Remaining encoded bytes
+        """
+        if self._container is None:
+            return b""
+        started = time.perf_counter()
+        try:
+            for packet in self._stream.encode(None):
+                self._container.mux(packet)
+            self._container.close()
+        finally:
+            self._container = None
+        return self._take(started)
+
+    def _take(self, started):
+        data = self._sink.take()
+        self.stats.wire_bytes += len(data)
+        self.stats.seconds += time.perf_counter() - started
+        self.stats.calls += 1
+        return data
+
+
+class _CountingReader:
+    """
+    Unseekable file object over a Polly AudioStream that counts bytes read.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes_read = 0
+        self.read_seconds = 0.0
+
+    def read(self, size=DECODE_READ_BYTES):
+        if size is None or size < 0:
+            size = DECODE_READ_BYTES
+        started = time.perf_counter()
+        data = self.stream.read(size)
+        self.read_seconds += time.perf_counter() - started
+        self.bytes_read += len(data)
+        return data
+
+
+def decode_to_pcm(audio_stream, audio_format=PCM, rate=RATE, stats=None):
+    """
+    Read a Polly AudioStream and return 16-bit mono PCM.
+
+    Compressed formats are decoded while they download. The demuxer pulls
+    from the network stream a few kilobytes at a time.
+
+    Args:
+        audio_stream: File-like AudioStream from synthesize_speech
+        audio_format (str): OutputFormat the audio was requested in
+        rate (int): Sample rate to return
+        stats (CodecStats, optional): Receives bytes and decode time (time
+            spent waiting on the network is not counted)
+
+    Returns:
+        bytes: PCM at the requested rate
+    """
+    if audio_format == PCM:
+        pcm = audio_stream.read()
+        if stats:
+            stats.pcm_bytes += len(pcm)
+            stats.wire_bytes += len(pcm)
+        return pcm
+    if audio_format not in DECODERS:
+        raise ValueError(f"Unknown Polly output format: {audio_format}")
+
+    av = import_av()
+    started = time.perf_counter()
+    reader = _CountingReader(audio_stream)
+    pcm = bytearray()
+    resampler = av.AudioResampler(format="s16", layout="mono", rate=rate)
+    container = av.open(reader, mode="r", format=DECODERS[audio_format])
+    try:
+        for frame in container.decode(audio=0):
+            for resampled in resampler.resample(frame):
+                pcm += resampled.to_ndarray().tobytes()
+        for resampled in resampler.resample(None):
+            pcm += resampled.to_ndarray().tobytes()
+    finally:
+        container.close()
+
+    if stats:
+        stats.pcm_bytes += len(pcm)
+        stats.wire_bytes += reader.bytes_read
+        stats.seconds += time.perf_counter() - started - reader.read_seconds
+        stats.calls += 1
+    return bytes(pcm)
@@ -0,0 +1,308 @@
+import array
+import queue
+import sys
+import threading
+import time
+
+# Audio output
+CHANNELS = 1
+RATE = 16000
+CHUNK = 1024
+SAMPLE_WIDTH = 2  # 16-bit PCM
+
+# Pause the output stream after this long without audio (seconds)
+IDLE_TIMEOUT = 0.5
+
+# A clip that is cut short fades out over this long rather than clicking (seconds)
+FADE_OUT_SECONDS = 0.03
+
+
+def fade_out(pcm):
+    """
+    Ramp 16-bit little-endian PCM linearly down to silence.
+
+    Args:
+        pcm (bytes-like): Audio to fade
+
+    Returns:
+        bytes: The faded audio
+    """
+    samples = array.array("h")
+    samples.frombytes(bytes(pcm[: len(pcm) - len(pcm) % SAMPLE_WIDTH]))
+    if sys.byteorder == "big":
+        samples.byteswap()
+    count = len(samples)
+    for i in range(count):
+        samples[i] = samples[i] * (count - i) // count
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return samples.tobytes()
+
+
+class Clip:
+    """
+    A PCM buffer queued for playback.
+    """
+
+    def __init__(self, pcm, label=None, generation=0, filler=False):
+        self.pcm = pcm
+        self.label = label
+        self.generation = generation
+        self.filler = filler
+        self.played_bytes = 0
+        self.stopped = False
+        self.cut = False
+        self.started = threading.Event()
+        self.finished = threading.Event()
+
+    def release(self, stopped):
+        self.stopped = stopped
+        self.started.set()
+        self.finished.set()
+
+
+class AudioPlayer:
+    """
+    Long-lived audio output with a single output stream fed from a queue.
+
+    One PyAudio instance and output stream are opened once and kept for the
+    whole session. A writer thread takes clips off the queue and writes them
+    back to back; stop() cuts the current clip and drops everything queued.
+    """
+
+    def __init__(self, rate=RATE, channels=CHANNELS, chunk=CHUNK, audio=None):
+        """
+        Args:
+            rate (int): Sample rate in Hz
+            channels (int): Number of output channels
+            chunk (int): Frames written to the device per write call
+            audio (optional): PyAudio-compatible object; a PyAudio instance by default
+        """
+        self.rate = rate
+        self.channels = channels
+        self.chunk = chunk
+        self.audio = audio
+        self.stream = None
+        self.underruns = 0
+        self.underrun_seconds = 0.0
+        self.clips_played = 0
+        self._queue = queue.Queue()
+        self._generation = 0
+        self._utterance_open = False
+        self._utterance_stopped = False
+        self._underrun_started = None
+        self._current = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """
+        Open the output device and start the writer thread.
+        """
+        with self._lock:
+            if self._thread:
+                return
+            if self.audio is None:
+                import pyaudio
+
+                self.audio = pyaudio.PyAudio()
+            self.stream = self.audio.open(
+                format=self.audio.get_format_from_width(SAMPLE_WIDTH),
+                channels=self.channels,
+                rate=self.rate,
+                output=True,
+                frames_per_buffer=self.chunk,
+            )
+            self._thread = threading.Thread(target=self._write_clips, daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """
+        Stop playback, end the writer thread and release the device.
+        """
+        if not self._thread:
+            return
+        self.stop()
+        self._queue.put(None)
+        self._thread.join(timeout=2)
+        self._thread = None
+        if self.stream:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self.audio:
+            self.audio.terminate()
+            self.audio = None
+
+    def begin_utterance(self):
+        """
+        Mark the start of a run of clips that should play without gaps.
+        """
+        self._utterance_open = True
+        self._utterance_stopped = False
+        self._underrun_started = None
+
+    def end_utterance(self):
+        """
+        Mark that no more clips are coming for the current utterance.
+        """
+        self._utterance_open = False
+        self._underrun_started = None
+
+    def enqueue(self, pcm, label=None, filler=False):
+        """
+        Queue a PCM buffer for playback.
+
+        Args:
+            pcm (bytes): 16-bit mono PCM at the player's sample rate
+            label (str, optional): Text the clip speaks, for bookkeeping
+            filler (bool): The clip only covers a wait, so the silence after
+                it is not an underrun
+
+        Returns:
+            Clip: Handle whose events report when the clip starts and ends
+        """
+        self.start()
+        clip = Clip(pcm, label, self._generation, filler)
+        if self._utterance_stopped:
+            clip.release(stopped=True)
+            return clip
+        self._queue.put(clip)
+        return clip
+
+    def flush(self):
+        """
+        Drop queued clips that have not started playing yet.
+
+        Returns:
+            int: Number of clips dropped
+        """
+        dropped = 0
+        while True:
+            try:
+                clip = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if clip is None:
+                self._queue.put(None)
+                break
+            clip.release(stopped=True)
+            self._queue.task_done()
+            dropped += 1
+        return dropped
+
+    def cut(self, clip):
+        """
+        End one clip early, fading it out if it is playing; the clips queued
+        after it play as usual.
+
+        Args:
+            clip (Clip): Clip returned by enqueue()
+        """
+        clip.cut = True
+
+    def stop(self):
+        """
+        Cut the current clip and drop everything queued for this utterance.
+        """
+        self._generation += 1
+        if self._utterance_open:
+            self._utterance_stopped = True
+        self.flush()
+
+    def wait_idle(self):
+        """
+        Block until every queued clip has finished or been dropped.
+        """
+        self._queue.join()
+
+    @property
+    def is_playing(self):
+        return self._current is not None or not self._queue.empty()
+
+    def stats(self):
+        return {
+            "clips_played": self.clips_played,
+            "underruns": self.underruns,
+            "underrun_seconds": self.underrun_seconds,
+        }
+
+    def stop_on_enter(self):
+        """
+        Watch stdin on one long-lived thread and stop playback when Enter is pressed.
+        """
+
+        def wait_for_input():
+            while True:
+                try:
+                    input()
+                except EOFError:
+                    return
+                except Exception as e:
+                    print(f"\nError stopping playback: {e}")
+                    return
+                if self.is_playing:
+                    self.stop()
+
+        threading.Thread(target=wait_for_input, daemon=True).start()
+
+    def _write_clips(self):
+        stream_active = True
+        while True:
+            try:
+                clip = self._queue.get(timeout=IDLE_TIMEOUT)
+            except queue.Empty:
+                # Nothing to play; pause the stream rather than closing the device
+                if stream_active:
+                    self.stream.stop_stream()
+                    stream_active = False
+                continue
+
+            if clip is None:
+                self._queue.task_done()
+                return
+
+            try:
+                if clip.generation != self._generation or clip.cut:
+                    clip.release(stopped=True)
+                    continue
+
+                if self._underrun_started is not None:
+                    self.underruns += 1
+                    self.underrun_seconds += time.monotonic() - self._underrun_started
+                    self._underrun_started = None
+
+                if not stream_active:
+                    self.stream.start_stream()
+                    stream_active = True
+
+                self._current = clip
+                clip.started.set()
+                self._play_clip(clip)
+                self.clips_played += 1
+                clip.release(stopped=clip.generation != self._generation or clip.cut)
+            except Exception as e:
+                print(f"\nError in audio playback: {e}")
+                clip.release(stopped=True)
+            finally:
+                self._current = None
+                if self._utterance_open and self._queue.empty() and not clip.filler:
+                    self._underrun_started = time.monotonic()
+                self._queue.task_done()
+
+    def _play_clip(self, clip):
+        chunk_size = self.chunk * SAMPLE_WIDTH * self.channels
+        view = memoryview(clip.pcm)
+        for offset in range(0, len(view), chunk_size):
+            if clip.generation != self._generation:
+                return
+            if clip.cut:
+                fade_bytes = int(self.rate * FADE_OUT_SECONDS) * SAMPLE_WIDTH
+                fade_bytes *= self.channels
+                faded = fade_out(view[offset : offset + fade_bytes])
+                self.stream.write(faded)
+                clip.played_bytes += len(faded)
+                return
+            data = view[offset : offset + chunk_size]
+            self.stream.write(bytes(data))
+            clip.played_bytes += len(data)
@@ -0,0 +1,133 @@
+import re
+import time
+
+from lib.metrics import Histogram
+from lib.speculation import normalize_transcript
+
+# Longest acceptable time from detected speech onset to silence (milliseconds)
+BARGE_IN_TARGET_MS = 150
+
+# Where a speech onset was detected
+VAD = "vad"
+TRANSCRIPT = "transcript"
+
+# Fewest words a partial transcript needs before it can be taken for echo
+ECHO_MIN_WORDS = 3
+
+# Words of a transcript; each Chinese character counts as one
+_WORD = re.compile(r"[\u3400-\u9fff]|[^\s\u3400-\u9fff]+")
+
+
+def cut_text(text, fraction):
+    """
+    Cut text to about the given fraction of its length, at a word boundary.
+
+    Text without spaces (Chinese) is cut between characters.
+
+    Args:
+        text (str): Text of a clip
+        fraction (float): Share of the clip that was played
+
+    Returns:
+        str: The part that was heard, with an ellipsis if it was cut
+    """
+    if fraction >= 1:
+        return text
+    end = int(len(text) * fraction)
+    if " " in text.strip():
+        end = text.rfind(" ", 0, end + 1)
+    heard = text[: max(end, 0)].rstrip(" ,;:")
+    return f"{heard}…" if heard else ""
+
+
+def heard_text(clips):
+    """
+    Text of an answer as far as it was actually played.
+
+    Args:
+        clips (list): Clips queued for the answer, labelled with their text
+
+    Returns:
+        str: Fully played clips plus the played part of the one that was cut
+    """
+    parts = []
+    for clip in clips:
+        if not clip.label or not clip.pcm or not clip.played_bytes:
+            continue
+        parts.append(cut_text(clip.label, clip.played_bytes / len(clip.pcm)))
+    return " ".join(part for part in parts if part)
+
+
+def is_echo(transcript, clips):
+    """
+    Whether a transcript looks like the assistant's own voice picked up by the mic.
+
+    Short partials are never taken for echo: "no", "wait" or "ok" occur in
+    most answers, and they are how people usually interrupt.
+
+    Args:
+        transcript (str): Partial transcript heard during playback
+        clips (list): Clips queued for the answer so far
+
+    Returns:
+        bool: True if the transcript has at least ECHO_MIN_WORDS words and
+            they occur in the answer as a run of consecutive words
+    """
+    words = _WORD.findall(normalize_transcript(transcript))
+    if len(words) < ECHO_MIN_WORDS:
+        return False
+    answer = _WORD.findall(
+        normalize_transcript(" ".join(clip.label or "" for clip in clips))
+    )
+    return any(
+        answer[start : start + len(words)] == words
+        for start in range(len(answer) - len(words) + 1)
+    )
+
+
+class Interruption:
+    """
+    A turn being stopped because the user started speaking.
+    """
+
+    def __init__(self, source, timeline, history_start):
+        """
+        Args:
+            source (str): VAD or TRANSCRIPT
+            timeline: Timeline of the interrupted turn
+            history_start (int): Index of the turn's user message, or None if
+                the turn had not added it yet
+        """
+        self.source = source
+        self.timeline = timeline
+        self.history_start = history_start
+        self.detected_at = time.monotonic()
+
+
+class BargeInStats:
+    """
+    Counters and reaction times for barge-ins.
+    """
+
+    def __init__(self):
+        self.interruptions = 0
+        self.echoes_ignored = 0
+        self.over_target = 0
+        self.reactions = Histogram()
+
+    def record(self, reaction_seconds):
+        self.interruptions += 1
+        self.reactions.observe(reaction_seconds)
+        if reaction_seconds * 1000 > BARGE_IN_TARGET_MS:
+            self.over_target += 1
+
+    def summary(self):
+        reactions = self.reactions.summary()
+        return {
+            "interruptions": self.interruptions,
+            "echoes_ignored": self.echoes_ignored,
+            "p50_reaction_ms": reactions["p50"] * 1000,
+            "p95_reaction_ms": reactions["p95"] * 1000,
+            "max_reaction_ms": max(self.reactions.samples, default=0.0) * 1000,
+            "over_target": self.over_target,
+        }
@@ -0,0 +1,118 @@
+import collections
+import math
+import time
+
+# Stages of a turn that get a slice of its budget
+MODEL = "model"  # A Bedrock request, until its first streamed output
+TOOLS = "tools"  # A round of tool calls
+SPEECH = "speech"  # Synthesizing one segment of the answer
+STAGES = (MODEL, TOOLS, SPEECH)
+
+# Time from the final transcript until the answer is under way (seconds).
+# Once the model is speaking its answer it is not cut off
+TURN_BUDGET_SECONDS = 15.0
+
+# Longest wait for a Bedrock request's first output, whatever is left
+MODEL_FIRST_OUTPUT_SECONDS = 8.0
+
+# Budget tools leave for the model to answer from their results
+ANSWER_RESERVE_SECONDS = 4.0
+
+# Longest playback waits for one segment's audio before skipping it
+SPEECH_SEGMENT_SECONDS = 5.0
+
+# Spoken when the model cannot start an answer within the budget
+FALLBACK_PHRASES = {
+    "en-US": "Sorry, that is taking too long. Please ask me again.",
+    "zh-CN": "抱歉，处理时间太长了。请再问我一次。",
+    "es-ES": "Lo siento, está tardando demasiado. Pregúntame de nuevo, por favor.",
+}
+
+
+def fallback_phrase(language_code):
+    return FALLBACK_PHRASES.get(language_code, FALLBACK_PHRASES["en-US"])
+
+
+class DeadlineExceeded(Exception):
+    """
+    A stage of the turn ran out of its slice of the budget.
+    """
+
+    def __init__(self, stage):
+        super().__init__(f"{stage} missed the turn deadline")
+        self.stage = stage
+
+
+class DeadlineStats:
+    """
+    Turns run under a deadline and misses per stage.
+    """
+
+    def __init__(self):
+        self.turns = 0
+        self.turns_degraded = 0
+        self.misses = collections.Counter()
+
+    def summary(self):
+        return {
+            "turns": self.turns,
+            "turns_degraded": self.turns_degraded,
+            "misses": {stage: self.misses[stage] for stage in STAGES},
+        }
+
+
+class TurnDeadline:
+    """
+    Latency budget of one turn, shared by its stages.
+
+    Each stage asks for a slice: its own limit, capped by what is left of
+    the budget (less any reserve kept for later stages). A stage that runs
+    out cancels its work and records a miss, and the turn goes on in a
+    degraded way instead of failing. Without a budget no stage is limited.
+    """
+
+    def __init__(self, budget=TURN_BUDGET_SECONDS, stats=None):
+        """
+        Args:
+            budget (float): Seconds for the turn; None or 0 for no budget
+            stats (DeadlineStats, optional): Receives the turn's misses
+        """
+        self.enabled = bool(budget)
+        self.budget = budget or math.inf
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + self.budget
+        self.stats = stats
+        self.missed = []
+        self.fallback_spoken = False
+        if stats:
+            stats.turns += 1
+
+    def remaining(self, reserve=0.0):
+        """
+        Returns:
+            float: Seconds left, keeping reserve seconds back (never negative)
+        """
+        return max(0.0, self.expires_at - reserve - time.monotonic())
+
+    def slice(self, limit, reserve=0.0):
+        """
+        Args:
+            limit (float): The stage's own time limit (seconds)
+            reserve (float): Seconds to leave for later stages
+
+        Returns:
+            float: Seconds the stage may take, or None without a budget
+        """
+        if not self.enabled:
+            return None
+        return min(limit, self.remaining(reserve))
+
+    def miss(self, stage):
+        """
+        Record that a stage ran out of time.
+        """
+        if self.stats:
+            if not self.missed:
+                self.stats.turns_degraded += 1
+            self.stats.misses[stage] += 1
+        self.missed.append(stage)
@@ -0,0 +1,222 @@
+import asyncio
+import json
+import time
+
+# Tools that may run before their input has finished streaming. Only
+# read-only tools qualify: a speculative call can be thrown away and re-run.
+# post_blog publishes, so it always waits for its complete input.
+EARLY_DISPATCH_TOOLS = {"web_search"}
+
+_WHITESPACE = " \t\r\n"
+
+
+class IncrementalObjectParser:
+    """
+    Parse a JSON object as it streams in, one fragment at a time.
+
+    Top-level fields become available in fields as soon as their value is
+    complete: strings, objects and arrays at their closing character, other
+    scalars at the comma or brace that follows them. Fragments are scanned
+    once, so parsing a whole input costs about as much as json.loads.
+    """
+
+    def __init__(self):
+        self.fields = {}
+        self.closed = False
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key = None
+        self._token_start = None
+        self._expect = "key"
+
+    def feed(self, fragment):
+        """
+        Args:
+            fragment (str): Next piece of the JSON text
+
+        Returns:
+            list: Keys whose values were completed by this fragment
+        """
+        self._text += fragment
+        completed = []
+        text = self._text
+        while self._pos < len(text) and not self.closed:
+            char = text[self._pos]
+            if self._in_string:
+                self._scan_string(char, completed)
+            elif self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+            elif self._depth == 1:
+                self._scan_member(char, completed)
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1:
+                    # A nested object or array value just closed
+                    self._finish_value(self._pos + 1, completed)
+            self._pos += 1
+        return completed
+
+    def _scan_string(self, char, completed):
+        if self._escape:
+            self._escape = False
+        elif char == "\\":
+            self._escape = True
+        elif char == '"':
+            self._in_string = False
+            if self._depth != 1:
+                return
+            end = self._pos + 1
+            if self._expect == "key":
+                self._key = json.loads(self._text[self._token_start : end])
+                self._token_start = None
+                self._expect = "colon"
+            elif self._expect == "value":
+                self._finish_value(end, completed)
+
+    def _scan_member(self, char, completed):
+        if self._expect == "key":
+            if char == '"':
+                self._in_string = True
+                self._token_start = self._pos
+            elif char == "}":
+                self.closed = True
+        elif self._expect == "colon":
+            if char == ":":
+                self._expect = "value"
+        elif self._expect == "value":
+            if self._token_start is None:
+                if char in _WHITESPACE:
+                    return
+                self._token_start = self._pos
+                if char == '"':
+                    self._in_string = True
+                elif char in "{[":
+                    self._depth += 1
+            elif char in ",}" or char in _WHITESPACE:
+                # Numbers, true, false and null end at the next delimiter
+                self._finish_value(self._pos, completed)
+                if char == ",":
+                    self._expect = "key"
+                elif char == "}":
+                    self.closed = True
+        elif self._expect == "comma":
+            if char == ",":
+                self._expect = "key"
+            elif char == "}":
+                self.closed = True
+
+    def _finish_value(self, end, completed):
+        try:
+            self.fields[self._key] = json.loads(self._text[self._token_start : end])
+            completed.append(self._key)
+        except json.JSONDecodeError:
+            pass
+        self._token_start = None
+        self._key = None
+        self._expect = "comma"
+
+
+def with_defaults(schema, tool_input):
+    """
+    Fill in schema defaults the model left out.
+
+    Args:
+        schema (dict): JSON schema of the tool input
+        tool_input (dict): Input as sent by the model
+
+    Returns:
+        dict: Input with every property that has a default
+    """
+    filled = {
+        name: spec["default"]
+        for name, spec in schema.get("properties", {}).items()
+        if "default" in spec
+    }
+    filled.update(tool_input)
+    return filled
+
+
+class EarlyToolCall:
+    """
+    A tool call started before its toolUse block finished streaming.
+    """
+
+    def __init__(self, tool_use, schema, start_call):
+        """
+        Args:
+            tool_use (dict): toolUse with the fields parsed so far as its input
+            schema (dict): JSON schema of the tool input
+            start_call (callable): Returns the coroutine running the tool
+        """
+        self.tool_use = tool_use
+        self.schema = schema
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self.task = asyncio.create_task(start_call(tool_use))
+        self.task.add_done_callback(self._finished)
+
+    def matches(self, tool_input):
+        """
+        Whether the final input asks for the same call.
+        """
+        return with_defaults(self.schema, tool_input) == with_defaults(
+            self.schema, self.tool_use["input"]
+        )
+
+    def saved(self, dispatched_at):
+        """
+        How much sooner the result is ready than if the call had started at
+        dispatched_at.
+
+        Returns:
+            float: Seconds saved
+        """
+        finished_at = self.finished_at or time.monotonic()
+        return max(0.0, min(dispatched_at, finished_at) - self.started_at)
+
+    def cancel(self):
+        if not self.task.done():
+            self.task.cancel()
+
+    def _finished(self, task):
+        self.finished_at = time.monotonic()
+        # A discarded call's error has nobody to go to
+        if not task.cancelled():
+            task.exception()
+
+
+class EarlyToolStats:
+    """
+    Counters for early tool dispatch.
+    """
+
+    def __init__(self):
+        self.started = 0
+        self.reused = 0
+        self.rerun = 0
+        self.discarded = 0
+        self.latency_saved = 0.0
+
+    def record_reuse(self, seconds):
+        self.reused += 1
+        self.latency_saved += seconds
+
+    def summary(self):
+        return {
+            "started": self.started,
+            "reused": self.reused,
+            "rerun": self.rerun,
+            "discarded": self.discarded,
+            "latency_saved_seconds": self.latency_saved,
+            "mean_latency_saved_seconds": (
+                self.latency_saved / self.reused if self.reused else 0.0
+            ),
+        }
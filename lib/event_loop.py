@@ -0,0 +1,128 @@
+import asyncio
+import functools
+import threading
+
+# How often the stall monitor wakes up to measure event-loop lag (seconds)
+STALL_SAMPLE_INTERVAL = 0.01
+
+# Longest acceptable event-loop stall during a turn (milliseconds)
+MAX_LOOP_STALL_MS = 50
+
+_END = object()
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Run a blocking callable on the default executor and await its result.
+
+    Args:
+        func (callable): Blocking function to run off the event loop
+        *args: Positional arguments for func
+        **kwargs: Keyword arguments for func
+
+    Returns:
+        object: Whatever func returns
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+
+async def iterate_in_thread(iterable):
+    """
+    Consume a blocking iterable on a worker thread and yield its items on the loop.
+
+    Items are handed over through an asyncio.Queue, so the loop only ever waits
+    on the queue and never on the network. Closing the generator (break, return
+    or cancellation) stops the worker and closes the iterable if it supports it.
+
+    Args:
+        iterable: Blocking iterable, e.g. a Bedrock converse_stream event stream
+
+    Yields:
+        object: Items produced by the iterable, in order
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def put(item):
+        loop.call_soon_threadsafe(queue.put_nowait, item)
+
+    def pump():
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    break
+                put(item)
+            put(_END)
+        except Exception as e:
+            if not stop.is_set():
+                put(e)
+
+    worker = threading.Thread(target=pump, daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = await queue.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        if worker.is_alive():
+            stop.set()
+            close = getattr(iterable, "close", None)
+            if close:
+                try:
+                    close()
+                except Exception:
+                    pass
+
+
+class LoopStallMonitor:
+    """
+    Measure how long the event loop goes without getting a chance to run.
+
+    A background task sleeps for a fixed interval and records how late it
+    wakes up. Any lateness is time the loop spent blocked in someone's code,
+    which is exactly the time mic audio and transcript events could not flow.
+    """
+
+    def __init__(self, interval=STALL_SAMPLE_INTERVAL):
+        """
+        Args:
+            interval (float): Sampling interval in seconds
+        """
+        self.interval = interval
+        self.max_stall = 0.0
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    def reset(self):
+        """
+        Start a new measurement window.
+
+        Returns:
+            float: Longest stall in milliseconds seen in the window just closed
+        """
+        max_stall_ms = self.max_stall * 1000
+        self.max_stall = 0.0
+        return max_stall_ms
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = loop.time() - started - self.interval
+            if lag > self.max_stall:
+                self.max_stall = lag
@@ -0,0 +1,165 @@
+import concurrent.futures
+import threading
+
+from lib.audio_codecs import PCM
+from lib.audio_player import RATE
+from lib.speech import voice_for_language
+
+# Kinds of wait a filler covers
+TOOL = "tool"  # A tool call with nothing spoken before it
+THINKING = "thinking"  # A model request slow to produce its first output
+
+# Short phrases played while the answer is pending, per language and kind
+FILLER_PHRASES = {
+    "en-US": {
+        TOOL: ["Let me look that up.", "One moment, I'm checking."],
+        THINKING: ["Hmm, let me think.", "Just a second."],
+    },
+    "zh-CN": {
+        TOOL: ["我查一下。", "请稍等，我看看。"],
+        THINKING: ["嗯，让我想想。", "稍等一下。"],
+    },
+    "es-ES": {
+        TOOL: ["Déjame buscarlo.", "Un momento, lo compruebo."],
+        THINKING: ["Mmm, déjame pensar.", "Un segundo."],
+    },
+}
+
+# Time without model output before a thinking filler plays (seconds)
+FILLER_AFTER_SECONDS = 1.2
+
+# Polly requests made at once while the fillers are synthesized
+SYNTHESIS_WORKERS = 4
+
+
+def polly_synthesizer(polly_client, tts_cache=None, rate=RATE):
+    """
+    Build a function that synthesizes a phrase with the voice of a language.
+
+    Fillers are requested as PCM with the voices answers are spoken in, and
+    go through the speech cache so later starts do not call Polly again.
+
+    Args:
+        polly_client: Polly client
+        tts_cache (SynthesisCache, optional): Cache shared with the answers
+        rate (int): Sample rate of the PCM
+
+    Returns:
+        callable: Taking (text, language code) and returning PCM bytes
+    """
+
+    def synthesize(text, language_code):
+        voice_id, engine = voice_for_language(language_code)
+        key = tts_cache.key(text, voice_id, engine, PCM, rate) if tts_cache else None
+        if tts_cache:
+            pcm = tts_cache.get(key)
+            if pcm is not None:
+                return bytes(pcm)
+        response = polly_client.synthesize_speech(
+            Text=text,
+            OutputFormat=PCM,
+            VoiceId=voice_id,
+            Engine=engine,
+            SampleRate=str(rate),
+        )
+        pcm = response["AudioStream"].read() if "AudioStream" in response else b""
+        if tts_cache:
+            tts_cache.put(key, pcm)
+        return pcm
+
+    return synthesize
+
+
+class FillerBank:
+    """
+    Filler phrases synthesized ahead of time and kept in memory as PCM.
+
+    The bank is filled once at startup, usually on a background thread;
+    until then pick() finds nothing and turns go on without fillers. Each
+    language and kind rotates through its phrases so the same one is not
+    heard twice in a row.
+    """
+
+    def __init__(self, phrases=FILLER_PHRASES, after=FILLER_AFTER_SECONDS):
+        """
+        Args:
+            phrases (dict): Language code to kind to list of phrases
+            after (float): Seconds without model output before a thinking
+                filler plays
+        """
+        self.phrases = phrases
+        self.after = after
+        self.played = {TOOL: 0, THINKING: 0}
+        self.cut = 0
+        self.failed = 0
+        self._clips = {}
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def load(self, synthesize):
+        """
+        Synthesize every phrase. Phrases that fail are left out.
+
+        Args:
+            synthesize (callable): Taking (text, language code), returning PCM
+        """
+        requests = [
+            (language, kind, text)
+            for language, kinds in self.phrases.items()
+            for kind, texts in kinds.items()
+            for text in texts
+        ]
+        clips = {}
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=SYNTHESIS_WORKERS, thread_name_prefix="filler"
+        ) as pool:
+            futures = [
+                pool.submit(synthesize, text, language)
+                for language, _, text in requests
+            ]
+            for (language, kind, text), future in zip(requests, futures):
+                try:
+                    pcm = future.result()
+                except Exception as e:
+                    print(f"Error synthesizing filler '{text}': {e}")
+                    pcm = None
+                if not pcm:
+                    self.failed += 1
+                    continue
+                clips.setdefault((language, kind), []).append((text, bytes(pcm)))
+        self._clips = clips
+
+    @property
+    def ready(self):
+        return bool(self._clips)
+
+    def pick(self, language_code, kind):
+        """
+        Take the next filler for a language and kind.
+
+        Returns:
+            tuple: (text, PCM), or None when there is none
+        """
+        clips = self._clips.get((language_code, kind))
+        if not clips:
+            return None
+        with self._lock:
+            index = self._next.get((language_code, kind), 0)
+            self._next[(language_code, kind)] = index + 1
+            self.played[kind] += 1
+        return clips[index % len(clips)]
+
+    def record_cut(self):
+        with self._lock:
+            self.cut += 1
+
+    def stats(self):
+        return {
+            "phrases": sum(len(clips) for clips in self._clips.values()),
+            "audio_bytes": sum(
+                len(pcm) for clips in self._clips.values() for _, pcm in clips
+            ),
+            "failed": self.failed,
+            "played": dict(self.played),
+            "cut": self.cut,
+        }
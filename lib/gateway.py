@@ -0,0 +1,674 @@
+import asyncio
+import concurrent.futures
+import itertools
+import json
+import struct
+import time
+
+from botocore.config import Config
+
+from lib.audio_capture import CHUNK, DROP_OLDEST, RATE, SAMPLE_WIDTH, RingBuffer
+from lib.audio_codecs import PCM
+from lib.audio_player import AudioPlayer
+from lib.event_loop import run_blocking
+from lib.metrics import Histogram
+from lib.model_router import MAX_HEDGES
+from lib.speech import SYNTHESIS_LOOKAHEAD, VOICES
+from lib.transcribe_session import TranscribeSession
+from lib.transcript_handler import TranscriptHandler
+from lib.vad import VoiceActivityDetector
+
+# Frames on the wire: a type byte and a big-endian payload length, then the payload
+FRAME_HEADER = struct.Struct("!BI")
+AUDIO = 1  # 16-bit mono PCM at RATE, in both directions
+EVENT = 2  # UTF-8 JSON object with an "event" field, in both directions
+MAX_FRAME_BYTES = 1024 * 1024
+
+# Admission control: sessions served at once, and how long a new connection
+# may wait for one to end before it is turned away (seconds)
+MAX_SESSIONS = 32
+ADMISSION_TIMEOUT = 2.0
+
+# Time allowed for the client's hello event (seconds)
+HELLO_TIMEOUT = 5.0
+
+# Turns generating an answer at once across all sessions; the rest wait for a
+# slot, which keeps Bedrock and Polly request rates bounded
+MAX_ACTIVE_TURNS = 8
+
+# Per-session limits
+SESSION_INPUT_SECONDS = 5.0  # Client audio buffered before the oldest is dropped
+SESSION_TOOL_WORKERS = 2  # Tool calls one session can run at once
+IDLE_TIMEOUT = 30.0  # A session that sends nothing for this long is closed
+DRAIN_TIMEOUT = 5.0  # A session whose output stays unread this long is closed
+
+# Blocking calls one session can have on the shared executor at once: a Bedrock
+# request and its hedge, synthesis lookahead, the playback wait and a summary
+BLOCKING_CALLS_PER_SESSION = 1 + MAX_HEDGES + SYNTHESIS_LOOKAHEAD + 2
+
+# HTTP connections kept per shared boto3 client beyond what active turns need,
+# for speculative requests and history summaries
+POOL_HEADROOM = 8
+
+# Audio sent ahead of real time, held in the client's jitter buffer (seconds)
+PLAYBACK_LEAD_SECONDS = 0.2
+
+
+def encode_frame(kind, payload):
+    return FRAME_HEADER.pack(kind, len(payload)) + payload
+
+
+def encode_event(event, **fields):
+    return encode_frame(EVENT, json.dumps(dict(fields, event=event)).encode("utf-8"))
+
+
+def decode_event(payload):
+    """
+    Raises:
+        ValueError: The payload is not a UTF-8 JSON object
+    """
+    event = json.loads(payload.decode("utf-8"))
+    if not isinstance(event, dict):
+        raise ValueError("event must be a JSON object")
+    return event
+
+
+async def read_frame(reader):
+    """
+    Read one frame from a connection.
+
+    Args:
+        reader (asyncio.StreamReader): Connection to read from
+
+    Returns:
+        tuple: (frame type, payload bytes)
+
+    Raises:
+        asyncio.IncompleteReadError: The connection closed
+        ValueError: The frame is larger than MAX_FRAME_BYTES
+    """
+    kind, length = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame of {length} bytes exceeds {MAX_FRAME_BYTES}")
+    return kind, await reader.readexactly(length)
+
+
+def client_config(max_active_turns=MAX_ACTIVE_TURNS):
+    """
+    botocore Config for the Bedrock and Polly clients shared by all sessions.
+
+    botocore keeps 10 connections per client by default; with many sessions
+    each active turn can hold a Bedrock request, its hedge and
+    SYNTHESIS_LOOKAHEAD Polly requests at once.
+
+    Args:
+        max_active_turns (int): Turns generating at once across the gateway
+
+    Returns:
+        Config: Client config with a connection pool sized for the gateway
+    """
+    return Config(
+        max_pool_connections=max_active_turns * (1 + MAX_HEDGES + SYNTHESIS_LOOKAHEAD)
+        + POOL_HEADROOM,
+    )
+
+
+class NetworkCapture:
+    """
+    Client audio arriving over a connection, read like an AudioCapture.
+
+    Frames of any size go into a RingBuffer as they arrive; read_chunk()
+    hands them to the TranscribeSession in fixed chunks. When the session
+    falls behind, the oldest audio is dropped.
+    """
+
+    def __init__(self, rate=RATE, chunk=CHUNK, buffer_seconds=SESSION_INPUT_SECONDS):
+        """
+        Args:
+            rate (int): Sample rate of the client audio in Hz
+            chunk (int): Frames per chunk handed to read_chunk() callers
+            buffer_seconds (float): Audio the ring buffer can hold
+        """
+        self.rate = rate
+        self.chunk = chunk
+        self.chunk_bytes = chunk * SAMPLE_WIDTH
+        capacity = int(rate * buffer_seconds) * SAMPLE_WIDTH
+        self.ring = RingBuffer(max(capacity, self.chunk_bytes), DROP_OLDEST)
+        self.bytes_received = 0
+        self._data_ready = asyncio.Event()
+        self._chunk = bytearray(self.chunk_bytes)
+        self._chunk_view = memoryview(self._chunk)
+
+    def feed(self, pcm):
+        self.bytes_received += len(pcm)
+        self.ring.write(pcm)
+        self._data_ready.set()
+
+    async def read_chunk(self):
+        """
+        Wait for and return the next chunk of client audio.
+
+        Returns:
+            bytes: chunk frames of 16-bit PCM
+        """
+        while self.ring.available < self.chunk_bytes:
+            self._data_ready.clear()
+            await self._data_ready.wait()
+        self.ring.readinto(self._chunk_view)
+        return bytes(self._chunk)
+
+    def stats(self):
+        return {
+            "bytes_received": self.bytes_received,
+            "ring_overflows": self.ring.overflows,
+            "dropped_bytes": self.ring.dropped_bytes,
+            "buffered_bytes": self.ring.available,
+        }
+
+
+class SocketAudioDevice:
+    """
+    PyAudio stand-in that plays to a network client instead of a sound card.
+
+    AudioPlayer writes to it from its writer thread as it would to a speaker.
+    Each write is sent as an AUDIO frame and then paced so the client is never
+    more than lead_seconds ahead, which keeps stop() as quick as on a local
+    device.
+    """
+
+    def __init__(self, send, speed=1.0, lead_seconds=PLAYBACK_LEAD_SECONDS):
+        """
+        Args:
+            send (callable): Thread-safe callable taking PCM to send
+            speed (float): How many times faster than real time to send
+            lead_seconds (float): Audio the client may hold ahead of playback
+        """
+        self.send = send
+        self.speed = speed
+        self.lead_seconds = lead_seconds
+        self.bytes_played = 0
+
+    def get_format_from_width(self, width):
+        return width
+
+    def open(self, rate, channels, frames_per_buffer, output=False, **kwargs):
+        return _SocketStream(self, rate, channels)
+
+    def terminate(self):
+        pass
+
+
+class _SocketStream:
+    def __init__(self, device, rate, channels):
+        self.device = device
+        self.bytes_per_second = rate * channels * SAMPLE_WIDTH
+        self.play_until = 0.0
+
+    def write(self, data):
+        now = time.monotonic()
+        seconds = len(data) / self.bytes_per_second / self.device.speed
+        self.play_until = max(self.play_until, now) + seconds
+        self.device.send(data)
+        self.device.bytes_played += len(data)
+        time.sleep(max(0.0, self.play_until - now - self.device.lead_seconds))
+
+    def start_stream(self):
+        pass
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class GatewayHandler(TranscriptHandler):
+    """
+    TranscriptHandler for one gateway connection.
+
+    Turns wait for one of the gateway's shared turn slots before calling
+    Bedrock. The client is told about each turn through EVENT frames, so it
+    can show the transcript and drop buffered audio after a barge-in.
+    """
+
+    def __init__(self, session, *args, **kwargs):
+        """
+        Args:
+            session (GatewaySession): Connection the handler serves
+            *args: TranscriptHandler arguments
+            **kwargs: TranscriptHandler keyword arguments
+        """
+        super().__init__(*args, **kwargs)
+        self.session = session
+        self.stop_hint = f"(session {session.id} speaking)"
+
+    def start_turn(self, transcript):
+        super().start_turn(transcript)
+        self.session.send_event("transcript", text=transcript)
+
+    def interrupt_turn(self, source):
+        was_listening = self.listening
+        super().interrupt_turn(source)
+        if self.listening and not was_listening:
+            self.session.send_event("interrupted", source=source)
+
+    async def run_turn(self, transcript, speculation=None, previous=None, cached=None):
+        gateway = self.session.gateway
+        queued = time.monotonic()
+        try:
+            await gateway.turn_slots.acquire()
+        except asyncio.CancelledError:
+            # Interrupted while waiting: nothing was said or stored yet
+            if self.interruptions.pop(asyncio.current_task(), None) is None:
+                raise
+            if speculation:
+                speculation.cancel()
+            return False
+        gateway.turn_started(time.monotonic() - queued)
+        try:
+            completed = await super().run_turn(
+                transcript, speculation, previous, cached
+            )
+        finally:
+            gateway.turn_slots.release()
+            gateway.active_turns -= 1
+        self.session.send_event("turn_end", completed=completed)
+        return completed
+
+
+class GatewaySession:
+    """
+    One client connection with its own handler, history, Transcribe stream
+    and player.
+    """
+
+    def __init__(self, gateway, session_id, reader, writer, language):
+        """
+        Args:
+            gateway (VoiceGateway): Server the session belongs to
+            session_id (int): Identifier sent to the client
+            reader (asyncio.StreamReader): Connection input
+            writer (asyncio.StreamWriter): Connection output
+            language (str): Transcription language chosen by the client
+        """
+        self.gateway = gateway
+        self.id = session_id
+        self.reader = reader
+        self.writer = writer
+        self.language = language
+        self.loop = asyncio.get_running_loop()
+        self.started_at = time.monotonic()
+        self.bytes_sent = 0
+        self._drain_task = None
+        self.capture = NetworkCapture(buffer_seconds=gateway.session_input_seconds)
+        self.device = SocketAudioDevice(self.send_audio, speed=gateway.playback_speed)
+        self.audio_player = AudioPlayer(audio=self.device)
+        self.handler = gateway.handler_class(
+            self,
+            gateway.bedrock_runtime,
+            None,  # Result streams are supplied by the Transcribe session
+            gateway.polly_client,
+            language,
+            [],
+            audio_player=self.audio_player,
+            tts_cache=gateway.tts_cache,
+            metrics=gateway.metrics,
+            router=gateway.router,
+            tool_workers=gateway.session_tool_workers,
+            **gateway.handler_options,
+        )
+        stream_config = {
+            "media_sample_rate_hz": RATE,
+            "media_encoding": gateway.transcribe_encoding,
+            "language_code": language,
+            "enable_partial_results_stabilization": True,
+        }
+        vad = None
+        if gateway.vad_options is not None:
+            vad = VoiceActivityDetector(rate=RATE, **gateway.vad_options)
+        self.transcribe = TranscribeSession(
+            gateway.transcribe_client,
+            self.capture,
+            self.handler,
+            stream_config,
+            vad=vad,
+            encoding=gateway.transcribe_encoding,
+        )
+
+    async def run(self):
+        """
+        Serve the connection until the client leaves or the session fails.
+        """
+        self.audio_player.start()
+        transcribe = asyncio.create_task(self.transcribe.run())
+        receive = asyncio.create_task(self.receive())
+        try:
+            done, _ = await asyncio.wait(
+                {transcribe, receive}, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if not task.cancelled() and task.exception():
+                    print(f"\nSession {self.id} failed: {task.exception()}")
+                    self.send_event("error", message=str(task.exception()))
+        finally:
+            transcribe.cancel()
+            receive.cancel()
+            await asyncio.gather(transcribe, receive, return_exceptions=True)
+            # The writer thread may be pacing a chunk; joining it blocks briefly
+            await run_blocking(self.audio_player.close)
+
+    async def receive(self):
+        while True:
+            try:
+                kind, payload = await asyncio.wait_for(
+                    read_frame(self.reader), self.gateway.idle_timeout
+                )
+            except asyncio.IncompleteReadError:
+                return
+            except asyncio.TimeoutError:
+                self.send_event("error", message="idle timeout")
+                return
+
+            if kind == AUDIO:
+                if len(payload) % SAMPLE_WIDTH:
+                    self.send_event("error", message="audio must be whole samples")
+                    return
+                self.capture.feed(payload)
+            elif kind == EVENT:
+                try:
+                    event = decode_event(payload)
+                except ValueError as e:
+                    self.send_event("error", message=f"invalid event: {e}")
+                    return
+                if event.get("event") == "bye":
+                    return
+            else:
+                self.send_event("error", message=f"unknown frame type {kind}")
+                return
+
+    def send_audio(self, pcm):
+        # Called on the player's writer thread, which waits until the client
+        # has taken the audio, so a slow reader holds up playback rather than
+        # growing the output buffer
+        try:
+            sent = asyncio.run_coroutine_threadsafe(
+                self._send(encode_frame(AUDIO, pcm)), self.loop
+            )
+        except RuntimeError:
+            return  # The loop has closed
+        try:
+            sent.result(DRAIN_TIMEOUT + 1)
+        except (concurrent.futures.TimeoutError, concurrent.futures.CancelledError):
+            pass
+
+    def send_event(self, event, **fields):
+        self._write(encode_event(event, session=self.id, **fields))
+        if self._drain_task is None or self._drain_task.done():
+            self._drain_task = self.loop.create_task(self._drain())
+
+    async def _send(self, frame):
+        self._write(frame)
+        await self._drain()
+
+    async def _drain(self):
+        try:
+            await asyncio.wait_for(self.writer.drain(), DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            if not self.writer.is_closing():
+                print(f"\nSession {self.id} closed: client stopped reading")
+                self.gateway.slow_clients += 1
+                # Dropping the connection ends receive() and with it the session
+                self.writer.transport.abort()
+        except ConnectionError:
+            pass
+
+    def _write(self, frame):
+        if self.writer.is_closing():
+            return
+        self.writer.write(frame)
+        self.bytes_sent += len(frame)
+
+    def stats(self):
+        return {
+            "session": self.id,
+            "language": self.language,
+            "seconds": time.monotonic() - self.started_at,
+            "audio_seconds_in": self.capture.bytes_received / (RATE * SAMPLE_WIDTH),
+            "audio_seconds_out": self.device.bytes_played / (RATE * SAMPLE_WIDTH),
+            "input": self.capture.stats(),
+            "tokens": self.handler.usage.summary(),
+        }
+
+
+class VoiceGateway:
+    """
+    Serve many voice sessions from one process over plain TCP.
+
+    Clients send a hello event, then stream PCM in AUDIO frames and receive
+    the answers the same way. The Transcribe, Bedrock and Polly clients, the
+    model router, the speech cache and the metrics registry are shared; each
+    connection gets its own GatewaySession and conversation history.
+
+    Admission control caps the sessions served at once: a new connection
+    waits up to admission_timeout for a slot and is then turned away with a
+    busy event. Turns generating at once are capped across all sessions, and
+    each session has a bounded input buffer, tool pool and idle timeout, and
+    is closed if its client stops reading its output.
+    """
+
+    def __init__(
+        self,
+        transcribe_client,
+        bedrock_runtime,
+        polly_client,
+        tts_cache,
+        metrics,
+        router,
+        max_sessions=MAX_SESSIONS,
+        max_active_turns=MAX_ACTIVE_TURNS,
+        admission_timeout=ADMISSION_TIMEOUT,
+        session_input_seconds=SESSION_INPUT_SECONDS,
+        session_tool_workers=SESSION_TOOL_WORKERS,
+        idle_timeout=IDLE_TIMEOUT,
+        transcribe_encoding=PCM,
+        vad_options=None,
+        handler_options=None,
+        handler_class=GatewayHandler,
+        playback_speed=1.0,
+    ):
+        """
+        Args:
+            transcribe_client: TranscribeStreamingClient shared by all sessions
+            bedrock_runtime: bedrock-runtime client (see client_config())
+            polly_client: Polly client (see client_config())
+            tts_cache (SynthesisCache): Speech cache shared by all sessions
+            metrics (MetricsRegistry): Turn timelines from every session
+            router (ModelRouter): Routing shared so every session learns from
+                the latency and throttling the others see
+            max_sessions (int): Sessions served at once
+            max_active_turns (int): Turns generating at once across sessions
+            admission_timeout (float): Longest wait for a session slot (seconds)
+            session_input_seconds (float): Client audio buffered per session
+            session_tool_workers (int): Tool calls one session can run at once
+            idle_timeout (float): Close a session silent for this long (seconds)
+            transcribe_encoding (str): Audio encoding sent to Transcribe
+            vad_options (dict, optional): VoiceActivityDetector arguments; None
+                disables local VAD
+            handler_options (dict, optional): Further TranscriptHandler arguments
+            handler_class: GatewayHandler or a subclass
+            playback_speed (float): How many times faster than real time
+                answers are sent (for load tests)
+        """
+        self.transcribe_client = transcribe_client
+        self.bedrock_runtime = bedrock_runtime
+        self.polly_client = polly_client
+        self.tts_cache = tts_cache
+        self.metrics = metrics
+        self.router = router
+        self.max_sessions = max_sessions
+        self.admission_timeout = admission_timeout
+        self.session_input_seconds = session_input_seconds
+        self.session_tool_workers = session_tool_workers
+        self.idle_timeout = idle_timeout
+        self.transcribe_encoding = transcribe_encoding
+        self.vad_options = vad_options
+        self.handler_options = handler_options or {}
+        self.handler_class = handler_class
+        self.playback_speed = playback_speed
+        self.turn_slots = asyncio.Semaphore(max_active_turns)
+        self.sessions = {}
+        self.server = None
+        self.admitted = 0
+        self.rejected = 0
+        self.slow_clients = 0
+        self.peak_sessions = 0
+        self.active_turns = 0
+        self.peak_active_turns = 0
+        self.admission_waits = Histogram()
+        self.turn_waits = Histogram()
+        self.ended = {
+            "input_overflows": 0,
+            "audio_seconds_in": 0.0,
+            "audio_seconds_out": 0.0,
+        }
+        self._session_slots = asyncio.Semaphore(max_sessions)
+        self._session_ids = itertools.count(1)
+        self._connections = {}
+
+    async def start(self, host, port):
+        """
+        Start listening; port 0 picks a free port (see address).
+        """
+        # Every session runs its blocking AWS calls on the default executor,
+        # whose stock size would serialize them across sessions
+        asyncio.get_running_loop().set_default_executor(
+            concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_sessions * BLOCKING_CALLS_PER_SESSION,
+                thread_name_prefix="gateway",
+            )
+        )
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+
+    @property
+    def address(self):
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self):
+        await self.server.serve_forever()
+
+    async def close(self):
+        if self.server:
+            self.server.close()
+        # Closing the sockets ends each session the way a client leaving does
+        for writer in self._connections.values():
+            writer.close()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        if self.server:
+            await self.server.wait_closed()
+
+    async def handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            language = await self.read_hello(reader, writer)
+            if language and await self.admit(writer):
+                try:
+                    await self.run_session(reader, writer, language)
+                finally:
+                    self._session_slots.release()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+    async def read_hello(self, reader, writer):
+        """
+        Returns:
+            str: Language the client asked for, or None if the hello was invalid
+        """
+        try:
+            kind, payload = await asyncio.wait_for(read_frame(reader), HELLO_TIMEOUT)
+            hello = decode_event(payload) if kind == EVENT else {}
+        except (asyncio.TimeoutError, ValueError):
+            hello = {}
+        if hello.get("event") != "hello":
+            writer.write(encode_event("error", message="expected a hello event"))
+            return None
+        language = hello.get("language", "en-US")
+        if language not in VOICES:
+            writer.write(
+                encode_event("error", message=f"unsupported language {language}")
+            )
+            return None
+        return language
+
+    async def admit(self, writer):
+        """
+        Wait for a session slot.
+
+        Returns:
+            bool: True if the session may start; otherwise the client was
+                sent a busy event
+        """
+        queued = time.monotonic()
+        try:
+            await asyncio.wait_for(
+                self._session_slots.acquire(), self.admission_timeout
+            )
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            writer.write(encode_event("busy", retry_after=self.admission_timeout))
+            await writer.drain()
+            return False
+        self.admission_waits.observe(time.monotonic() - queued)
+        return True
+
+    async def run_session(self, reader, writer, language):
+        session = GatewaySession(
+            self, next(self._session_ids), reader, writer, language
+        )
+        self.sessions[session.id] = session
+        self.admitted += 1
+        self.peak_sessions = max(self.peak_sessions, len(self.sessions))
+        print(
+            f"\nSession {session.id} started ({language}, "
+            f"{len(self.sessions)} of {self.max_sessions} active)"
+        )
+        try:
+            session.send_event(
+                "ready", rate=RATE, channels=1, sample_width=SAMPLE_WIDTH
+            )
+            await session.run()
+        finally:
+            del self.sessions[session.id]
+            stats = session.stats()
+            self.ended["input_overflows"] += stats["input"]["ring_overflows"]
+            self.ended["audio_seconds_in"] += stats["audio_seconds_in"]
+            self.ended["audio_seconds_out"] += stats["audio_seconds_out"]
+            print(f"\nSession {session.id} ended: {stats}")
+
+    def turn_started(self, waited):
+        self.turn_waits.observe(waited)
+        self.active_turns += 1
+        self.peak_active_turns = max(self.peak_active_turns, self.active_turns)
+
+    def stats(self):
+        totals = dict(self.ended)
+        for session in self.sessions.values():
+            stats = session.stats()
+            totals["input_overflows"] += stats["input"]["ring_overflows"]
+            totals["audio_seconds_in"] += stats["audio_seconds_in"]
+            totals["audio_seconds_out"] += stats["audio_seconds_out"]
+        return {
+            "active_sessions": len(self.sessions),
+            "peak_sessions": self.peak_sessions,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "slow_clients": self.slow_clients,
+            "admission_wait": self.admission_waits.summary(),
+            "active_turns": self.active_turns,
+            "peak_active_turns": self.peak_active_turns,
+            "turn_wait": self.turn_waits.summary(),
+            **totals,
+        }
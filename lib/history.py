@@ -0,0 +1,281 @@
+import asyncio
+import json
+
+from lib.event_loop import run_blocking
+
+# Estimated input tokens the conversation history may use per request
+HISTORY_TOKEN_BUDGET = 6000
+
+# Summarizing brings the history back down to this share of the budget
+SUMMARY_TARGET_RATIO = 0.5
+
+# If a summary is not ready in time, drop old turns past this multiple of the budget
+HARD_LIMIT_RATIO = 2.0
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:"
+
+# Ends an assistant answer the user talked over, so the model knows it was cut
+INTERRUPTED_MARKER = "[interrupted by the user]"
+
+SUMMARY_SYSTEM = [
+    {
+        "text": (
+            "Summarize the conversation you are given for use as context in a "
+            "voice assistant. Keep names, facts, numbers, decisions, open "
+            "questions and results of web searches or blog posts. Write plain "
+            "prose, at most 150 words, in the language of the conversation."
+        )
+    }
+]
+
+SUMMARY_INFERENCE_CONFIG = {"maxTokens": 300, "temperature": 0.0}
+
+# Per-message overhead for role and block framing
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text):
+    """
+    Roughly estimate the tokens in a piece of text.
+
+    CJK characters are counted as one token each; everything else at about
+    four characters per token.
+
+    Args:
+        text (str): Text to measure
+
+    Returns:
+        int: Estimated token count
+    """
+    cjk = sum(1 for char in text if "\u3000" <= char <= "\u9fff")
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def message_tokens(message):
+    """
+    Estimate the tokens of one Converse message.
+
+    Args:
+        message (dict): Message with role and content blocks
+
+    Returns:
+        int: Estimated token count
+    """
+    tokens = MESSAGE_OVERHEAD_TOKENS
+    for block in message["content"]:
+        if "text" in block:
+            tokens += estimate_tokens(block["text"])
+        elif "toolUse" in block:
+            tokens += estimate_tokens(json.dumps(block["toolUse"], ensure_ascii=False))
+        elif "toolResult" in block:
+            for item in block["toolResult"].get("content", []):
+                tokens += estimate_tokens(item.get("text", json.dumps(item)))
+    return tokens
+
+
+def is_turn_start(message):
+    """
+    Whether a message starts a user turn (and not a toolResult reply).
+    """
+    return message["role"] == "user" and not any(
+        "toolResult" in block for block in message["content"]
+    )
+
+
+def render_transcript(messages):
+    """
+    Flatten messages into plain text for the summarizer.
+    """
+    lines = []
+    for message in messages:
+        speaker = "User" if message["role"] == "user" else "Assistant"
+        for block in message["content"]:
+            if block.get("text"):
+                lines.append(f"{speaker}: {block['text']}")
+            elif "toolUse" in block:
+                tool_use = block["toolUse"]
+                tool_input = json.dumps(tool_use.get("input", {}), ensure_ascii=False)
+                lines.append(f"Assistant called {tool_use['name']}: {tool_input}")
+            elif "toolResult" in block:
+                texts = [
+                    item["text"]
+                    for item in block["toolResult"].get("content", [])
+                    if "text" in item
+                ]
+                lines.append(f"Tool result: {' '.join(texts)[:1000]}")
+    return "\n".join(lines)
+
+
+class ConversationHistory(list):
+    """
+    Conversation messages kept within a token budget.
+
+    Behaves as the plain list of Converse messages the handler appends to
+    and sends. Between turns, once the estimate goes over budget, the oldest
+    turns are summarized in the background by a cheaper model; the summary
+    replaces them at the start of a later turn. Cuts are only made where a
+    user turn begins, so a toolUse is never separated from its toolResult.
+    """
+
+    def __init__(
+        self,
+        bedrock_runtime,
+        summary_model_id,
+        messages=(),
+        token_budget=HISTORY_TOKEN_BUDGET,
+    ):
+        """
+        Args:
+            bedrock_runtime: Bedrock runtime client used for summaries
+            summary_model_id (str): Model that writes the summaries
+            messages (list, optional): Existing messages
+            token_budget (int): Estimated token budget for the history
+        """
+        super().__init__(messages)
+        self.bedrock_runtime = bedrock_runtime
+        self.summary_model_id = summary_model_id
+        self.token_budget = token_budget
+        self.summaries = 0
+        self.dropped_messages = 0
+        self._summary_task = None
+        self._summary_cut = None
+
+    def total_tokens(self):
+        return sum(message_tokens(message) for message in self)
+
+    def stats(self):
+        return {
+            "messages": len(self),
+            "estimated_tokens": self.total_tokens(),
+            "token_budget": self.token_budget,
+            "summaries": self.summaries,
+            "dropped_messages": self.dropped_messages,
+        }
+
+    def schedule_summary(self):
+        """
+        Start summarizing old turns in the background if over budget.
+
+        Call between turns; the result is applied by apply_summary().
+        """
+        if self._summary_task or self.total_tokens() <= self.token_budget:
+            return
+        cut = self._find_cut(self.token_budget * SUMMARY_TARGET_RATIO)
+        if cut is None:
+            return
+        old_messages = list(self[:cut])
+        self._summary_cut = cut
+        self._summary_task = asyncio.create_task(
+            run_blocking(self._summarize, old_messages)
+        )
+
+    def apply_summary(self):
+        """
+        Fold a finished summary into the history; call before a turn starts.
+        """
+        task = self._summary_task
+        if task and task.done():
+            self._summary_task = None
+            summary = None
+            try:
+                summary = task.result()
+            except Exception as e:
+                print(f"\nError summarizing history: {e}")
+            if summary:
+                self._replace_prefix(self._summary_cut, summary)
+                self.summaries += 1
+
+        # Never let the history run away while a summary is slow or failing
+        if self.total_tokens() > self.token_budget * HARD_LIMIT_RATIO:
+            cut = self._find_cut(self.token_budget)
+            if cut is not None:
+                if self._summary_task:
+                    self._summary_task.cancel()
+                    self._summary_task = None
+                del self[:cut]
+                self.dropped_messages += cut
+
+    def replace_tool_results(self, replacements):
+        """
+        Swap the content of earlier toolResult blocks, e.g. for short references.
+
+        Args:
+            replacements (dict): toolUseId to the new toolResult content
+        """
+        for index, message in enumerate(self):
+            if not any(
+                block.get("toolResult", {}).get("toolUseId") in replacements
+                for block in message["content"]
+            ):
+                continue
+            content = []
+            for block in message["content"]:
+                tool_result = block.get("toolResult")
+                if tool_result and tool_result.get("toolUseId") in replacements:
+                    block = {
+                        "toolResult": dict(
+                            tool_result, content=replacements[tool_result["toolUseId"]]
+                        )
+                    }
+                content.append(block)
+            self[index] = dict(message, content=content)
+
+    def end_interrupted_turn(self, start, spoken_text):
+        """
+        Replace the answer of an interrupted turn with what the user heard.
+
+        Tool calls and any unspoken text are dropped, so the next request
+        sees the turn the way the user experienced it.
+
+        Args:
+            start (int): Index of the turn's user message
+            spoken_text (str): Part of the answer that was played
+        """
+        del self[start + 1 :]
+        text = f"{spoken_text} {INTERRUPTED_MARKER}".strip()
+        self.append({"role": "assistant", "content": [{"text": text}]})
+
+    def cancel(self):
+        if self._summary_task:
+            self._summary_task.cancel()
+            self._summary_task = None
+
+    def _find_cut(self, target_tokens):
+        """
+        Find the earliest turn boundary leaving at most target_tokens after it.
+        """
+        remaining = self.total_tokens()
+        for index, message in enumerate(self):
+            if index > 0 and is_turn_start(message) and remaining <= target_tokens:
+                return index
+            remaining -= message_tokens(message)
+        # Fall back to the last turn boundary so at least something is freed
+        for index in range(len(self) - 1, 0, -1):
+            if is_turn_start(self[index]):
+                return index
+        return None
+
+    def _replace_prefix(self, cut, summary):
+        first = self[cut]
+        content = [
+            block
+            for block in first["content"]
+            if not block.get("text", "").startswith(SUMMARY_PREFIX)
+        ]
+        merged = {
+            "role": "user",
+            "content": [{"text": f"{SUMMARY_PREFIX} {summary}"}] + content,
+        }
+        self[: cut + 1] = [merged]
+
+    def _summarize(self, messages):
+        response = self.bedrock_runtime.converse(
+            modelId=self.summary_model_id,
+            system=SUMMARY_SYSTEM,
+            inferenceConfig=SUMMARY_INFERENCE_CONFIG,
+            messages=[
+                {"role": "user", "content": [{"text": render_transcript(messages)}]}
+            ],
+        )
+        content = response["output"]["message"]["content"]
+        return " ".join(block["text"] for block in content if "text" in block).strip()
@@ -0,0 +1,254 @@
+import collections
+import json
+import os
+import threading
+import time
+
+# Timeline marks recorded during a turn
+TRANSCRIPT_FINAL = "transcript_final"
+BEDROCK_REQUEST = "bedrock_request"
+FIRST_TOKEN = "first_token"
+TOOL_START = "tool_start"
+TOOL_END = "tool_end"
+LAST_TOKEN = "last_token"
+POLLY_REQUEST = "polly_request"
+POLLY_FIRST_BYTE = "polly_first_byte"
+PLAYBACK_START = "playback_start"
+PLAYBACK_END = "playback_end"
+BARGE_IN = "barge_in"
+SPEECH_STOPPED = "speech_stopped"
+
+# Spans derived from the marks: (name, from mark, to mark)
+SPANS = [
+    ("request_setup", TRANSCRIPT_FINAL, BEDROCK_REQUEST),
+    ("time_to_first_token", BEDROCK_REQUEST, FIRST_TOKEN),
+    ("generation", FIRST_TOKEN, LAST_TOKEN),
+    ("polly_first_byte", POLLY_REQUEST, POLLY_FIRST_BYTE),
+    ("time_to_first_audio", TRANSCRIPT_FINAL, PLAYBACK_START),
+    ("turn", TRANSCRIPT_FINAL, PLAYBACK_END),
+    ("barge_in_reaction", BARGE_IN, SPEECH_STOPPED),
+]
+
+# Samples kept per histogram for percentile estimates
+HISTOGRAM_SAMPLES = 2048
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class TurnTimeline:
+    """
+    Timestamps of what happened during one turn, relative to its start.
+    """
+
+    enabled = True
+
+    def __init__(self, turn_id):
+        self.turn_id = turn_id
+        self.started_at = time.monotonic()
+        self.wall_time = time.time()
+        self.marks = []
+
+    def mark(self, name, **attrs):
+        """
+        Record that something happened now.
+
+        Args:
+            name (str): One of the mark constants
+            **attrs: Extra details such as the tool being called
+        """
+        self.marks.append((name, time.monotonic() - self.started_at, attrs))
+
+    def mark_once(self, name, **attrs):
+        """
+        Record a mark only the first time it happens in the turn.
+        """
+        if self.first(name) is None:
+            self.mark(name, **attrs)
+
+    def first(self, name):
+        for mark, offset, _ in self.marks:
+            if mark == name:
+                return offset
+        return None
+
+    def last(self, name):
+        for mark, offset, _ in reversed(self.marks):
+            if mark == name:
+                return offset
+        return None
+
+    def spans(self):
+        """
+        Returns:
+            dict: Span name to seconds, for every span whose marks were recorded
+        """
+        spans = {}
+        for name, start_mark, end_mark in SPANS:
+            start = self.first(start_mark)
+            # Spans ending in a "last" mark run to its final occurrence
+            if end_mark in (LAST_TOKEN, PLAYBACK_END):
+                end = self.last(end_mark)
+            else:
+                end = self.first(end_mark)
+            if start is not None and end is not None:
+                spans[name] = end - start
+
+        # Tool calls are matched start to end by their tool use ID
+        started = {}
+        for mark, offset, attrs in self.marks:
+            if mark == TOOL_START:
+                started[attrs.get("id")] = (offset, attrs.get("tool", "tool"))
+            elif mark == TOOL_END and attrs.get("id") in started:
+                start, tool_name = started.pop(attrs.get("id"))
+                spans[f"tool:{tool_name}"] = spans.get(f"tool:{tool_name}", 0.0) + (
+                    offset - start
+                )
+        return spans
+
+    def to_dict(self):
+        return {
+            "turn": self.turn_id,
+            "started": self.wall_time,
+            "marks": [
+                dict(attrs, mark=mark, at=round(offset, 6))
+                for mark, offset, attrs in self.marks
+            ],
+            "spans": {name: round(value, 6) for name, value in self.spans().items()},
+        }
+
+
+class NullTimeline:
+    """
+    Stand-in used when metrics are disabled; every call is a no-op.
+    """
+
+    enabled = False
+
+    def mark(self, name, **attrs):
+        pass
+
+    def mark_once(self, name, **attrs):
+        pass
+
+
+NULL_TIMELINE = NullTimeline()
+
+
+class Histogram:
+    """
+    Latency samples with count, sum and percentiles over a bounded window.
+    """
+
+    def __init__(self, max_samples=HISTOGRAM_SAMPLES):
+        self.count = 0
+        self.total = 0.0
+        self.samples = collections.deque(maxlen=max_samples)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.samples.append(value)
+
+    def percentile(self, quantile):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(quantile * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self):
+        result = {"count": self.count, "sum": self.total}
+        for quantile in QUANTILES:
+            result[f"p{int(quantile * 100)}"] = self.percentile(quantile)
+        return result
+
+
+class MetricsRegistry:
+    """
+    Collects turn timelines into histograms and exports them.
+
+    Each finished turn is appended to a JSONL trace file, and the histograms
+    can be written as Prometheus text. When disabled, new_turn() hands out
+    NULL_TIMELINE so instrumented code pays for little more than a method call.
+    """
+
+    def __init__(self, enabled=True, trace_path=None, prometheus_path=None):
+        """
+        Args:
+            enabled (bool): Whether to record anything at all
+            trace_path (str, optional): JSONL file receiving one line per turn
+            prometheus_path (str, optional): File rewritten with Prometheus text
+        """
+        self.enabled = enabled
+        self.trace_path = trace_path
+        self.prometheus_path = prometheus_path
+        self.histograms = collections.defaultdict(Histogram)
+        self._turns = 0
+        self._lock = threading.Lock()
+
+    def new_turn(self):
+        if not self.enabled:
+            return NULL_TIMELINE
+        self._turns += 1
+        return TurnTimeline(self._turns)
+
+    def finish_turn(self, timeline):
+        """
+        Fold a turn's spans into the histograms and export it.
+
+        Args:
+            timeline (TurnTimeline): Timeline returned by new_turn()
+        """
+        if not timeline.enabled:
+            return
+        record = timeline.to_dict()
+        with self._lock:
+            for name, value in record["spans"].items():
+                self.histograms[name].observe(value)
+        if self.trace_path:
+            try:
+                with open(self.trace_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            except OSError as e:
+                print(f"Error writing trace: {e}")
+        if self.prometheus_path:
+            self.write_prometheus(self.prometheus_path)
+
+    def summary(self):
+        with self._lock:
+            return {name: h.summary() for name, h in sorted(self.histograms.items())}
+
+    def prometheus_text(self):
+        """
+        Render the histograms as Prometheus summaries.
+
+        Returns:
+            str: Text exposition format
+        """
+        lines = [
+            "# HELP chatbot_turn_stage_seconds Latency of each stage of a voice turn",
+            "# TYPE chatbot_turn_stage_seconds summary",
+        ]
+        for stage, summary in self.summary().items():
+            for quantile in QUANTILES:
+                value = summary[f"p{int(quantile * 100)}"]
+                lines.append(
+                    f'chatbot_turn_stage_seconds{{stage="{stage}",'
+                    f'quantile="{quantile}"}} {value:.6f}'
+                )
+            lines.append(
+                f'chatbot_turn_stage_seconds_sum{{stage="{stage}"}} {summary["sum"]:.6f}'
+            )
+            lines.append(
+                f'chatbot_turn_stage_seconds_count{{stage="{stage}"}} {summary["count"]}'
+            )
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(self.prometheus_text())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing metrics: {e}")
@@ -0,0 +1,286 @@
+import collections
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+from lib.history import estimate_tokens
+
+# Weight of the newest sample in the moving averages
+EWMA_ALPHA = 0.2
+
+# Time-to-first-token assumed for a model with no samples yet (seconds)
+DEFAULT_TTFT = 1.0
+
+# Models failing more than this share of recent requests are avoided
+MAX_ERROR_RATE = 0.5
+
+# A throttled or failing model is avoided for this long (seconds)
+THROTTLE_COOLDOWN = 30.0
+
+# Start a hedge request on the next model when the first has not answered
+# within this multiple of its expected time-to-first-token
+HEDGE_MULTIPLIER = 2.0
+HEDGE_MIN_DELAY = 1.5
+MAX_HEDGES = 1
+
+# Utterances up to this many estimated tokens, with no tool hints, go to the fastest model
+SHORT_UTTERANCE_TOKENS = 16
+
+# Words suggesting the request will need tools or fresh information
+TOOL_HINTS = (
+    "search",
+    "look up",
+    "latest",
+    "news",
+    "weather",
+    "forecast",
+    "today",
+    "current",
+    "blog",
+    "post",
+    "buscar",
+    "noticias",
+    "tiempo",
+    "hoy",
+    "搜索",
+    "新闻",
+    "天气",
+    "今天",
+    "博客",
+)
+
+# Bedrock errors worth retrying on another model
+RETRYABLE_ERRORS = {
+    "ThrottlingException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+    "ModelTimeoutException",
+    "InternalServerException",
+    "ModelStreamErrorException",
+    "throttlingException",
+    "serviceUnavailableException",
+    "internalServerException",
+    "modelStreamErrorException",
+}
+
+FAST = "fast"
+STRONG = "strong"
+
+# Routing decisions kept for inspection
+DECISION_HISTORY = 50
+
+
+def error_code(error):
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code", "")
+    return getattr(error, "code", "")
+
+
+def is_retryable(error):
+    return error_code(error) in RETRYABLE_ERRORS
+
+
+def is_throttle(error):
+    return error_code(error).lower() == "throttlingexception"
+
+
+class StreamError(Exception):
+    """
+    An exception event delivered inside a converse_stream response.
+    """
+
+    def __init__(self, code, message=""):
+        super().__init__(f"{code}: {message}" if message else code)
+        self.code = code
+
+
+class StreamInterrupted(Exception):
+    """
+    A response stream failed with a retryable error.
+    """
+
+    def __init__(self, error, text_emitted):
+        """
+        Args:
+            error (Exception): The underlying error
+            text_emitted (bool): Whether any text had already been printed and spoken
+        """
+        super().__init__(str(error))
+        self.error = error
+        self.text_emitted = text_emitted
+
+
+class ModelStats:
+    """
+    Moving averages and counters for one model.
+    """
+
+    def __init__(self):
+        self.ttft = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.throttles = 0
+        self.throttled_until = 0.0
+        self.last_error_at = 0.0
+
+    def expected_ttft(self):
+        return DEFAULT_TTFT if self.ttft is None else self.ttft
+
+    def healthy(self, now):
+        if now < self.throttled_until:
+            return False
+        # A failing model gets another chance once it has been left alone a while
+        return (
+            self.error_rate <= MAX_ERROR_RATE
+            or now - self.last_error_at > THROTTLE_COOLDOWN
+        )
+
+    def summary(self):
+        return {
+            "ttft_ms": self.expected_ttft() * 1000,
+            "error_rate": self.error_rate,
+            "requests": self.requests,
+            "errors": self.errors,
+            "throttles": self.throttles,
+            "throttled": time.monotonic() < self.throttled_until,
+        }
+
+
+class RoutingDecision:
+    """
+    The model chosen for a request, why, and where to go if it fails.
+    """
+
+    def __init__(self, model_id, kind, reason, fallbacks):
+        self.model_id = model_id
+        self.kind = kind
+        self.reason = reason
+        self.fallbacks = fallbacks
+
+    @property
+    def models(self):
+        return [self.model_id] + self.fallbacks
+
+    def summary(self):
+        return {
+            "model": self.model_id,
+            "kind": self.kind,
+            "reason": self.reason,
+            "fallbacks": self.fallbacks,
+        }
+
+
+class ModelRouter:
+    """
+    Pick a Bedrock model per request from observed latency and errors.
+
+    Short, simple utterances go to the model with the lowest moving-average
+    time-to-first-token; long or tool-heavy requests go to the strongest
+    healthy model. Throttled or failing models are avoided for a while and
+    every decision lists fallbacks for failover and hedging.
+    """
+
+    def __init__(self, models):
+        """
+        Args:
+            models (list): Model IDs ordered from fastest/cheapest to strongest
+        """
+        self.models = list(models)
+        self.model_stats = {model_id: ModelStats() for model_id in self.models}
+        self.decisions = collections.deque(maxlen=DECISION_HISTORY)
+        self.hedges = 0
+        self.failovers = 0
+        self._lock = threading.Lock()
+
+    def choose(self, transcript, history=(), record=True):
+        """
+        Route a request.
+
+        Args:
+            transcript (str): The user's utterance
+            history (list): Conversation messages before it
+            record (bool): Keep the decision in the inspectable history
+
+        Returns:
+            RoutingDecision: Chosen model and fallbacks
+        """
+        kind, reason = self._classify(transcript, history)
+        now = time.monotonic()
+        healthy = [m for m in self.models if self.model_stats[m].healthy(now)]
+        unhealthy = sorted(
+            (m for m in self.models if m not in healthy),
+            key=lambda m: self.model_stats[m].throttled_until,
+        )
+        if kind == FAST:
+            ordered = sorted(healthy, key=lambda m: self.model_stats[m].expected_ttft())
+        else:
+            ordered = list(reversed(healthy))
+        ordered += unhealthy
+
+        decision = RoutingDecision(ordered[0], kind, reason, ordered[1:])
+        if record:
+            self.decisions.append(dict(decision.summary(), transcript=transcript[:80]))
+        return decision
+
+    def hedge_delay(self, model_id):
+        """
+        Returns:
+            float: Seconds to wait for a response before hedging on another model
+        """
+        expected = self._stats(model_id).expected_ttft()
+        return max(HEDGE_MIN_DELAY, HEDGE_MULTIPLIER * expected)
+
+    def record_ttft(self, model_id, seconds):
+        with self._lock:
+            stats = self._stats(model_id)
+            stats.requests += 1
+            stats.ttft = (
+                seconds
+                if stats.ttft is None
+                else EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * stats.ttft
+            )
+            stats.error_rate *= 1 - EWMA_ALPHA
+
+    def record_error(self, model_id, error):
+        with self._lock:
+            stats = self._stats(model_id)
+            stats.requests += 1
+            stats.errors += 1
+            stats.error_rate = EWMA_ALPHA + (1 - EWMA_ALPHA) * stats.error_rate
+            stats.last_error_at = time.monotonic()
+            if is_throttle(error):
+                stats.throttles += 1
+                stats.throttled_until = time.monotonic() + THROTTLE_COOLDOWN
+
+    def stats(self):
+        return {
+            "models": {
+                model_id: stats.summary()
+                for model_id, stats in self.model_stats.items()
+            },
+            "hedges": self.hedges,
+            "failovers": self.failovers,
+            "recent_decisions": list(self.decisions)[-5:],
+        }
+
+    def _stats(self, model_id):
+        # Speculative or configured models outside the list still get stats
+        if model_id not in self.model_stats:
+            self.model_stats[model_id] = ModelStats()
+        return self.model_stats[model_id]
+
+    def _classify(self, transcript, history):
+        text = transcript.casefold()
+        for hint in TOOL_HINTS:
+            if hint in text:
+                return STRONG, f"mentions '{hint}'"
+        tokens = estimate_tokens(transcript)
+        if tokens > SHORT_UTTERANCE_TOKENS:
+            return STRONG, f"long utterance ({tokens} tokens)"
+        # A follow-up to a turn that used tools probably needs them again
+        for message in list(history)[-4:]:
+            if any("toolUse" in block for block in message["content"]):
+                return STRONG, "follows a tool call"
+        return FAST, "short utterance"
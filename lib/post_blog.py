@@ -41,7 +41,9 @@ class WordPressBlogger:
                 "Failed to authenticate with WordPress. Check credentials."
             )
         except Exception as e:
-            raise ConnectionError(f"Failed to connect to WordPress site: {str(e)}")
+            raise ConnectionError(
+                f"Failed to connect to WordPress site: {str(e)}"
+            ) from e
 
     def post_content(self, title, content, status="draft", categories=None, tags=None):
         """
@@ -72,16 +74,19 @@ class WordPressBlogger:
         post.content = content
         post.post_status = status
 
+        terms_names = {}
         if categories:
-            post.terms_names = {"category": categories}
+            terms_names["category"] = categories
         if tags:
-            post.terms_names = {"post_tag": tags}
+            terms_names["post_tag"] = tags
+        if terms_names:
+            post.terms_names = terms_names
 
         try:
             post_id = self.client.call(NewPost(post))
             return post_id
         except Exception as e:
-            raise Exception(f"Failed to create post: {str(e)}")
+            raise Exception(f"Failed to create post: {str(e)}") from e
 
 
 # Example usage:
@@ -0,0 +1,103 @@
+# Models that accept cachePoint blocks in Converse requests
+PROMPT_CACHE_MODELS = {
+    "amazon.nova-micro-v1:0",
+    "amazon.nova-lite-v1:0",
+    "amazon.nova-pro-v1:0",
+    "anthropic.claude-3-5-haiku-20241022-v1:0",
+    "anthropic.claude-3-7-sonnet-20250219-v1:0",
+    "anthropic.claude-sonnet-4-20250514-v1:0",
+    "anthropic.claude-opus-4-20250514-v1:0",
+}
+
+# Nova models cache the system prompt and messages but not tool definitions
+TOOL_CACHE_EXCLUDED_PREFIXES = ("amazon.nova",)
+
+CACHE_POINT = {"cachePoint": {"type": "default"}}
+
+# Cross-region inference profile prefixes, e.g. 'us.amazon.nova-micro-v1:0'
+_PROFILE_PREFIXES = ("us.", "eu.", "apac.", "us-gov.")
+
+
+def base_model_id(model_id):
+    for prefix in _PROFILE_PREFIXES:
+        if model_id.startswith(prefix):
+            return model_id[len(prefix) :]
+    return model_id
+
+
+def supports_prompt_caching(model_id):
+    return base_model_id(model_id) in PROMPT_CACHE_MODELS
+
+
+def add_cache_points(model_id, system, tool_config, messages):
+    """
+    Insert cache points into a Converse request for models that support them.
+
+    Cache points go after the system prompt, after the tool definitions and
+    at the end of the newest message. Everything up to that last point is
+    the stable prefix the next request (a tool round or the next turn) reads
+    back from the cache. Nothing passed in is modified.
+
+    Args:
+        model_id (str): Bedrock model or inference profile ID
+        system (list): System content blocks
+        tool_config (dict): Converse toolConfig
+        messages (list): Conversation messages
+
+    Returns:
+        tuple: (system, tool_config, messages) ready to send
+    """
+    if not supports_prompt_caching(model_id):
+        return system, tool_config, messages
+
+    system = list(system) + [CACHE_POINT]
+    if not base_model_id(model_id).startswith(TOOL_CACHE_EXCLUDED_PREFIXES):
+        tool_config = dict(
+            tool_config, tools=list(tool_config["tools"]) + [CACHE_POINT]
+        )
+    if messages:
+        last = dict(messages[-1], content=list(messages[-1]["content"]) + [CACHE_POINT])
+        messages = list(messages[:-1]) + [last]
+    return system, tool_config, messages
+
+
+class TokenUsage:
+    """
+    Running totals of token usage reported in Converse metadata events.
+    """
+
+    FIELDS = (
+        "inputTokens",
+        "outputTokens",
+        "cacheReadInputTokens",
+        "cacheWriteInputTokens",
+    )
+
+    def __init__(self):
+        self.requests = 0
+        self.totals = dict.fromkeys(self.FIELDS, 0)
+
+    def add(self, usage):
+        """
+        Args:
+            usage (dict): 'usage' from a converse_stream metadata event
+        """
+        self.requests += 1
+        for field in self.FIELDS:
+            self.totals[field] += usage.get(field, 0) or 0
+
+    def merge(self, other):
+        self.requests += other.requests
+        for field in self.FIELDS:
+            self.totals[field] += other.totals[field]
+
+    def summary(self):
+        read = self.totals["cacheReadInputTokens"]
+        prompt = (
+            self.totals["inputTokens"] + read + self.totals["cacheWriteInputTokens"]
+        )
+        return dict(
+            self.totals,
+            requests=self.requests,
+            cache_hit_ratio=read / prompt if prompt else 0.0,
+        )
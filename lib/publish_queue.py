@@ -0,0 +1,370 @@
+import json
+import os
+import random
+import threading
+import time
+import uuid
+import xmlrpc.client
+from collections import OrderedDict
+
+from wordpress_xmlrpc.exceptions import InvalidCredentialsError, XmlrpcDisabledError
+
+from lib.post_blog import WordPressBlogger
+
+# Where queued and recent posts are kept between sessions
+PUBLISH_QUEUE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "audio-chatbot", "publish_queue.json"
+)
+
+# Attempts per post, and the backoff between them (seconds)
+MAX_ATTEMPTS = 6
+RETRY_BASE_SECONDS = 2
+RETRY_MAX_SECONDS = 300
+
+# Finished jobs kept for status queries; unfinished jobs are never dropped
+FINISHED_JOBS_KEPT = 50
+
+# Job states
+QUEUED = "queued"
+PUBLISHING = "publishing"
+RETRYING = "retrying"
+PUBLISHED = "published"
+FAILED = "failed"
+FINISHED_STATES = (PUBLISHED, FAILED)
+
+
+def blogger_from_env():
+    """
+    Connect to the WordPress site named by WP_SITE_URL, WP_USERNAME and
+    WP_APP_PASSWORD.
+
+    Returns:
+        WordPressBlogger: Connected blogger
+    """
+    missing = [
+        name
+        for name in ("WP_SITE_URL", "WP_USERNAME", "WP_APP_PASSWORD")
+        if not os.environ.get(name)
+    ]
+    if missing:
+        raise ValueError(f"{', '.join(missing)} not set")
+    blogger = WordPressBlogger(
+        url=os.environ["WP_SITE_URL"],
+        username=os.environ["WP_USERNAME"],
+        password=os.environ["WP_APP_PASSWORD"],
+    )
+    blogger.connect()
+    return blogger
+
+
+def is_permanent(error):
+    """
+    Whether a publishing error will happen again however often it is retried.
+
+    Bad credentials, a disabled XML-RPC API, invalid input and client-side
+    faults are permanent; network errors and server faults are retried.
+    """
+    error = error.__cause__ or error
+    if isinstance(error, (InvalidCredentialsError, XmlrpcDisabledError, ValueError)):
+        return True
+    if isinstance(error, xmlrpc.client.Fault):
+        return 400 <= error.faultCode < 500
+    if isinstance(error, xmlrpc.client.ProtocolError):
+        return 400 <= error.errcode < 500 and error.errcode != 429
+    return False
+
+
+def _backoff(base_delay, attempts):
+    # Exponential backoff with jitter, capped
+    delay = min(RETRY_MAX_SECONDS, base_delay * 2 ** (attempts - 1))
+    return delay * (0.5 + random.random() / 2)
+
+
+class PublishQueue:
+    """
+    Blog posts published by a background thread, persisted as a JSON file.
+
+    submit() returns a job ID at once, so a slow WordPress site never holds
+    up a voice turn. One worker publishes the jobs in order through a single
+    connected WordPressBlogger that is reused until it fails. Failed attempts
+    are retried with exponential backoff; a job left unfinished by a restart
+    is picked up again when the queue is next created. A post that was being
+    sent when the process died may therefore be published twice.
+    """
+
+    def __init__(
+        self,
+        path=PUBLISH_QUEUE_PATH,
+        connect=blogger_from_env,
+        max_attempts=MAX_ATTEMPTS,
+        retry_base=RETRY_BASE_SECONDS,
+    ):
+        """
+        Args:
+            path (str): JSON file the jobs are saved to; None keeps them in memory
+            connect (callable): Returns a connected WordPressBlogger
+            max_attempts (int): Attempts per post before it fails for good
+            retry_base (float): Delay before the first retry (seconds); it
+                doubles with every further attempt
+        """
+        self.path = path
+        self.connect = connect
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.published = 0
+        self.failed = 0
+        self.retries = 0
+        self.connections = 0
+        self._jobs = OrderedDict()
+        self._blogger = None
+        self._closed = False
+        self._condition = threading.Condition()
+        if path:
+            self._load()
+        self._worker = threading.Thread(
+            target=self._run, name="publish queue", daemon=True
+        )
+        self._worker.start()
+
+    def submit(self, post):
+        """
+        Queue a post for publishing.
+
+        Args:
+            post (dict): post_content() arguments (title, content, status,
+                categories, tags)
+
+        Returns:
+            str: Job ID for status()
+        """
+        job_id = uuid.uuid4().hex[:8]
+        with self._condition:
+            self._jobs[job_id] = {
+                "id": job_id,
+                "post": post,
+                "state": QUEUED,
+                "attempts": 0,
+                "created": time.time(),
+                "next_attempt": time.time(),
+                "post_id": None,
+                "error": None,
+            }
+            self._save()
+            self._condition.notify()
+        return job_id
+
+    def status(self, job_id=None):
+        """
+        Look up one job, or the most recent ones.
+
+        Args:
+            job_id (str, optional): Job ID from submit()
+
+        Returns:
+            list: Job dicts (title, state, attempts, post_id, error), newest
+                first; empty if the job is unknown
+        """
+        with self._condition:
+            if job_id is not None:
+                jobs = [self._jobs[job_id]] if job_id in self._jobs else []
+            else:
+                jobs = list(reversed(self._jobs.values()))[:5]
+            return [
+                {
+                    "id": job["id"],
+                    "title": job["post"].get("title"),
+                    "state": job["state"],
+                    "attempts": job["attempts"],
+                    "post_id": job["post_id"],
+                    "error": job["error"],
+                    "retry_in_seconds": (
+                        max(0.0, job["next_attempt"] - time.time())
+                        if job["state"] == RETRYING
+                        else None
+                    ),
+                }
+                for job in jobs
+            ]
+
+    def pending(self):
+        """
+        Returns:
+            int: Jobs not yet published or failed
+        """
+        with self._condition:
+            return sum(
+                job["state"] not in FINISHED_STATES for job in self._jobs.values()
+            )
+
+    def wait_idle(self, timeout=None):
+        """
+        Block until every job is published or has failed.
+
+        Returns:
+            bool: Whether the queue went idle within the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while any(
+                job["state"] not in FINISHED_STATES for job in self._jobs.values()
+            ):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def stats(self):
+        return {
+            "pending": self.pending(),
+            "published": self.published,
+            "failed": self.failed,
+            "retries": self.retries,
+            "connections": self.connections,
+        }
+
+    def close(self, timeout=1.0):
+        """
+        Stop the worker. Unfinished jobs stay saved for the next start.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._worker.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                job = self._next_job()
+                if job is None:
+                    return
+                job["state"] = PUBLISHING
+                job["attempts"] += 1
+                post = dict(job["post"])
+                self._save()
+
+            post_id, error = self._publish(post)
+
+            with self._condition:
+                if error is None:
+                    job.update(state=PUBLISHED, post_id=post_id, error=None)
+                    self.published += 1
+                elif is_permanent(error) or job["attempts"] >= self.max_attempts:
+                    job.update(state=FAILED, error=str(error))
+                    self.failed += 1
+                    print(f"\nBlog post '{post.get('title')}' failed: {error}")
+                else:
+                    delay = _backoff(self.retry_base, job["attempts"])
+                    job.update(
+                        state=RETRYING,
+                        error=str(error),
+                        next_attempt=time.time() + delay,
+                    )
+                    self.retries += 1
+                self._trim()
+                self._save()
+                self._condition.notify_all()
+
+    def _next_job(self):
+        """
+        Wait for the earliest job that is due. Called with the lock held.
+
+        Returns:
+            dict: Job to publish, or None once the queue is closed
+        """
+        while not self._closed:
+            waiting = [
+                job for job in self._jobs.values() if job["state"] in (QUEUED, RETRYING)
+            ]
+            if waiting:
+                job = min(waiting, key=lambda job: job["next_attempt"])
+                delay = job["next_attempt"] - time.time()
+                if delay <= 0:
+                    return job
+                self._condition.wait(delay)
+            else:
+                self._condition.wait()
+        return None
+
+    def _publish(self, post):
+        """
+        Send one post, connecting first if there is no working connection.
+
+        Returns:
+            tuple: (post ID, None) on success, (None, error) on failure
+        """
+        try:
+            if self._blogger is None:
+                self._blogger = self.connect()
+                self.connections += 1
+            return self._blogger.post_content(**post), None
+        except Exception as e:
+            if not isinstance(e.__cause__ or e, xmlrpc.client.Fault):
+                # No answer from the site; the next attempt reconnects
+                self._blogger = None
+            return None, e
+
+    def _trim(self):
+        finished = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job["state"] in FINISHED_STATES
+        ]
+        for job_id in finished[: max(0, len(finished) - FINISHED_JOBS_KEPT)]:
+            del self._jobs[job_id]
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                jobs = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Error loading publish queue: {e}")
+            return
+
+        for job in jobs:
+            if job["state"] == PUBLISHING:
+                # Interrupted mid-attempt; try again
+                job["state"] = RETRYING
+            self._jobs[job["id"]] = job
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(list(self._jobs.values()), f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error saving publish queue: {e}")
+
+
+_publish_queue = None
+_publish_queue_lock = threading.Lock()
+
+
+def default_publish_queue(create=True):
+    """
+    Args:
+        create (bool): Start the queue if it is not running yet
+
+    Returns:
+        PublishQueue: The process-wide queue, or None if it was never started
+            and create is False
+    """
+    global _publish_queue
+    with _publish_queue_lock:
+        if _publish_queue is None and create:
+            _publish_queue = PublishQueue()
+        return _publish_queue
+
+
+def resume_publishing():
+    """
+    Start the queue at once if an earlier run left jobs behind.
+    """
+    if os.path.exists(PUBLISH_QUEUE_PATH):
+        default_publish_queue()
@@ -0,0 +1,218 @@
+import random
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+from lib.history import estimate_tokens
+
+# Estimated tokens of search results sent back to the model per search
+SEARCH_RESULT_TOKEN_BUDGET = 600
+
+# Near-duplicate detection: character shingles hashed into a MinHash signature
+SHINGLE_CHARS = 5
+MINHASH_PERMUTATIONS = 64
+DUPLICATE_SIMILARITY = 0.8
+
+# Snippets shorter than this are dropped rather than trimmed further
+MIN_SNIPPET_TOKENS = 20
+
+# Full result payloads kept out of line for the session
+STORED_SEARCHES = 64
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+
+_TERM = re.compile(r"[\u3000-\u9fff]|[^\W_]+", re.UNICODE)
+_SENTENCE_END = re.compile(r"(?<=[.!?。！？])\s*")
+
+
+def terms(text):
+    """
+    Split text into lowercase terms; CJK characters count as one term each.
+    """
+    return _TERM.findall(text.casefold())
+
+
+def minhash(text):
+    """
+    MinHash signature of the text's character shingles.
+
+    Args:
+        text (str): Text to fingerprint
+
+    Returns:
+        list: MINHASH_PERMUTATIONS minimum hash values
+    """
+    normalized = " ".join(terms(text))
+    shingles = {
+        normalized[index : index + SHINGLE_CHARS]
+        for index in range(max(1, len(normalized) - SHINGLE_CHARS + 1))
+    }
+    hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles]
+    return [
+        min((a * value + b) % _MERSENNE_PRIME for value in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def similarity(signature, other):
+    """
+    Estimated Jaccard similarity of two MinHash signatures.
+    """
+    return sum(1 for x, y in zip(signature, other) if x == y) / len(signature)
+
+
+def deduplicate(results):
+    """
+    Drop results whose title and body nearly duplicate an earlier result.
+
+    Args:
+        results (list): Search results with title, link and body
+
+    Returns:
+        list: Results in their original order, without near-duplicates
+    """
+    kept = []
+    signatures = []
+    for result in results:
+        signature = minhash(f"{result['title']} {result['body']}")
+        if any(
+            similarity(signature, seen) >= DUPLICATE_SIMILARITY for seen in signatures
+        ):
+            continue
+        kept.append(result)
+        signatures.append(signature)
+    return kept
+
+
+def rank(results, query):
+    """
+    Order results by lexical overlap with the query, title matches first.
+
+    Args:
+        results (list): Search results
+        query (str): The search query
+
+    Returns:
+        list: Results, best match first (ties keep the search engine's order)
+    """
+    query_terms = set(terms(query))
+    if not query_terms:
+        return list(results)
+
+    def score(result):
+        title_terms = set(terms(result["title"]))
+        body_terms = set(terms(result["body"]))
+        return 2 * len(query_terms & title_terms) + len(query_terms & body_terms)
+
+    return sorted(results, key=score, reverse=True)
+
+
+def trim(text, max_tokens):
+    """
+    Cut text to about max_tokens, at a sentence end where possible.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    trimmed = ""
+    for sentence in _SENTENCE_END.split(text):
+        candidate = f"{trimmed} {sentence}".strip()
+        if estimate_tokens(candidate) > max_tokens:
+            break
+        trimmed = candidate
+    if trimmed:
+        return trimmed
+    # No sentence fits; cut at a word boundary instead
+    words = text.split()
+    while words and estimate_tokens(" ".join(words)) > max_tokens:
+        words = words[: len(words) * 3 // 4]
+    return " ".join(words) + "…"
+
+
+def compact_results(query, results, token_budget=SEARCH_RESULT_TOKEN_BUDGET):
+    """
+    Deduplicate, rank and trim search results to a token budget.
+
+    Args:
+        query (str): The search query
+        results (list): Search results with title, link and body
+        token_budget (int): Estimated tokens the formatted results may use
+
+    Returns:
+        list: toolResult content blocks, best match first
+    """
+    blocks = []
+    remaining = token_budget
+    ranked = rank(deduplicate(results), query)
+    for position, result in enumerate(ranked):
+        header = f"Title: {result['title']}\nLink: {result['link']}\nContent: "
+        # Share what is left so lower-ranked hits still get a snippet; budget a
+        # short result leaves unused goes to the ones after it
+        share = remaining // (len(ranked) - position)
+        body_budget = share - estimate_tokens(header)
+        if body_budget < MIN_SNIPPET_TOKENS:
+            continue
+        text = header + trim(result["body"], body_budget)
+        blocks.append({"text": text})
+        remaining -= estimate_tokens(text)
+    return blocks
+
+
+class SearchResultStore:
+    """
+    Full search payloads kept outside the conversation history.
+
+    The model sees compacted results for the turn that ran the search; after
+    that the history only holds a short reference to the entry here, which
+    the search_results tool reads back.
+    """
+
+    def __init__(self, max_entries=STORED_SEARCHES):
+        """
+        Args:
+            max_entries (int): Searches kept before the oldest is dropped
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def put(self, query, results):
+        """
+        Store a search and return its reference.
+
+        Returns:
+            str: Reference such as 'search-3'
+        """
+        with self._lock:
+            self._count += 1
+            ref = f"search-{self._count}"
+            self._entries[ref] = {"query": query, "results": results}
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return ref
+
+    def get(self, ref):
+        """
+        Returns:
+            dict: {"query": ..., "results": [...]} or None if no longer stored
+        """
+        with self._lock:
+            return self._entries.get(ref)
+
+    @staticmethod
+    def reference(ref, query, results):
+        """
+        Short text that stands in for a search in later requests.
+        """
+        titles = "; ".join(result["title"] for result in results[:3])
+        return (
+            f'[web_search "{query}" ({ref}, {len(results)} results, '
+            f"compacted after use; read again with search_results). "
+            f"Top results: {titles}]"
+        )
@@ -0,0 +1,187 @@
+import asyncio
+import re
+import time
+from contextlib import aclosing
+
+from lib.event_loop import iterate_in_thread, run_blocking
+
+# Minimum words in a stabilized partial transcript before speculating on it
+MIN_STABLE_WORDS = 3
+
+_PUNCTUATION = re.compile(r"[^\w\s]", re.UNICODE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_transcript(text):
+    """
+    Normalize a transcript for comparison (case, punctuation and spacing).
+
+    Args:
+        text (str): Transcript text
+
+    Returns:
+        str: Normalized text
+    """
+    text = _PUNCTUATION.sub(" ", text.lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def stable_transcript(result):
+    """
+    Return the partial transcript if every item in it has been stabilized.
+
+    Args:
+        result: Partial amazon_transcribe Result
+
+    Returns:
+        str: Transcript text, or None while any item may still change
+    """
+    alternative = result.alternatives[0]
+    items = alternative.items or []
+    if not items or not all(item.stable for item in items):
+        return None
+    if len(normalize_transcript(alternative.transcript).split()) < MIN_STABLE_WORDS:
+        return None
+    return alternative.transcript
+
+
+def close_response(response):
+    """
+    Close a converse_stream response so its connection goes back to the pool.
+
+    Args:
+        response (dict): converse_stream response, or None
+    """
+    stream = response.get("stream") if response else None
+    if stream is not None:
+        try:
+            stream.close()
+        except Exception:
+            pass
+
+
+def _close_when_done(request):
+    if not request.cancelled() and request.exception() is None:
+        close_response(request.result())
+
+
+class SpeculativeRequest:
+    """
+    A converse_stream request started on a stabilized partial transcript.
+
+    The response is buffered rather than printed or spoken. If the final
+    transcript matches, replay() yields the buffered events followed by the
+    live remainder; otherwise the request is cancelled.
+    """
+
+    def __init__(self, transcript, model_id, start_request):
+        """
+        Args:
+            transcript (str): Partial transcript the request was built from
+            model_id (str): Bedrock model the request uses
+            start_request (callable): Blocking function returning the converse_stream response
+        """
+        self.transcript = transcript
+        self.normalized = normalize_transcript(transcript)
+        self.model_id = model_id
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self.error = None
+        self.events = []
+        self._changed = asyncio.Event()
+        self._done = False
+        self._task = asyncio.create_task(self._run(start_request))
+
+    def matches(self, transcript):
+        return (
+            self.error is None and normalize_transcript(transcript) == self.normalized
+        )
+
+    def head_start(self):
+        """
+        Returns:
+            float: Seconds of request time already done before the final transcript
+        """
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def cancel(self):
+        if not self._task.done():
+            self._task.cancel()
+
+    async def replay(self):
+        """
+        Yield buffered events, then live ones until the stream ends.
+
+        A replay closed before the end (barge-in, deadline) cancels the request.
+        """
+        index = 0
+        try:
+            while True:
+                if index < len(self.events):
+                    yield self.events[index]
+                    index += 1
+                    continue
+                if self._done:
+                    if self.error:
+                        raise self.error
+                    return
+                self._changed.clear()
+                await self._changed.wait()
+        finally:
+            self.cancel()
+
+    async def _run(self, start_request):
+        # The request runs on a worker thread and cannot be interrupted; if
+        # this task is cancelled first, the response is closed once it arrives
+        request = asyncio.ensure_future(run_blocking(start_request))
+        response = None
+        try:
+            response = await asyncio.shield(request)
+            if "stream" in response:
+                async with aclosing(iterate_in_thread(response["stream"])) as events:
+                    async for event in events:
+                        self.events.append(event)
+                        self._changed.set()
+        except asyncio.CancelledError:
+            if response is None:
+                request.add_done_callback(_close_when_done)
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            close_response(response)
+            self.finished_at = time.monotonic()
+            self._done = True
+            self._changed.set()
+
+
+class SpeculationStats:
+    """
+    Counters for speculative requests.
+    """
+
+    def __init__(self):
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+
+    def record_hit(self, speculation):
+        self.hits += 1
+        self.latency_saved += speculation.head_start()
+
+    def record_miss(self):
+        self.misses += 1
+
+    def summary(self):
+        decided = self.hits + self.misses
+        return {
+            "started": self.started,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / decided if decided else 0.0,
+            "latency_saved_seconds": self.latency_saved,
+            "mean_latency_saved_seconds": (
+                self.latency_saved / self.hits if self.hits else 0.0
+            ),
+        }
@@ -0,0 +1,229 @@
+import asyncio
+
+from lib.event_loop import run_blocking
+
+# Polly voice and engine per transcription language
+VOICES = {
+    "en-US": ("Joanna", "generative"),
+    "zh-CN": ("Zhiyu", "neural"),
+    "es-ES": ("Lucia", "neural"),
+}
+DEFAULT_VOICE = VOICES["en-US"]
+
+# Punctuation that always ends a speakable segment (CJK forms have no trailing space)
+CJK_SENTENCE_END = "。！？；…"
+SENTENCE_END = ".!?;"
+
+# Punctuation that ends a segment once enough text has accumulated
+CJK_CLAUSE_END = "，、："
+CLAUSE_END = ",:"
+
+# Minimum characters before splitting on a clause; lower for the first segment
+# so speech starts as early as possible
+MIN_CLAUSE_CHARS = 60
+MIN_FIRST_CLAUSE_CHARS = 20
+
+# Number of segments synthesized ahead of the one currently playing
+SYNTHESIS_LOOKAHEAD = 2
+
+
+def voice_for_language(language_code):
+    """
+    Pick the Polly voice used for a transcription language.
+
+    Args:
+        language_code (str): Language code such as 'en-US'
+
+    Returns:
+        tuple: (VoiceId, Engine)
+    """
+    return VOICES.get(language_code, DEFAULT_VOICE)
+
+
+class SentenceSplitter:
+    """
+    Split streamed text deltas into sentences or clauses as they arrive.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.segments_emitted = 0
+
+    def feed(self, text):
+        """
+        Add a text delta.
+
+        Args:
+            text (str): Next piece of streamed model output
+
+        Returns:
+            list: Complete segments ready to be spoken
+        """
+        self.buffer += text
+        segments = []
+        start = 0
+        i = 0
+        while i < len(self.buffer):
+            char = self.buffer[i]
+            end = None
+            if char in CJK_SENTENCE_END or char == "\n":
+                end = i + 1
+            elif char in SENTENCE_END:
+                # ASCII punctuation only counts once followed by whitespace,
+                # which keeps numbers like 3.5 and 'e.g.' together
+                if i + 1 < len(self.buffer) and self.buffer[i + 1].isspace():
+                    end = i + 1
+            elif char in CJK_CLAUSE_END or (
+                char in CLAUSE_END
+                and i + 1 < len(self.buffer)
+                and self.buffer[i + 1].isspace()
+            ):
+                min_chars = (
+                    MIN_FIRST_CLAUSE_CHARS
+                    if self.segments_emitted == 0 and not segments
+                    else MIN_CLAUSE_CHARS
+                )
+                if i + 1 - start >= min_chars:
+                    end = i + 1
+            if end is not None:
+                segment = self.buffer[start:end].strip()
+                if segment:
+                    segments.append(segment)
+                start = end
+            i += 1
+        self.buffer = self.buffer[start:]
+        self.segments_emitted += len(segments)
+        return segments
+
+    def flush(self):
+        """
+        Return whatever text is left once the stream has ended.
+
+        Returns:
+            list: Remaining segment, if any
+        """
+        segment = self.buffer.strip()
+        self.buffer = ""
+        if segment:
+            self.segments_emitted += 1
+            return [segment]
+        return []
+
+
+class SpeechPipeline:
+    """
+    Speak streamed text segment by segment.
+
+    Segments are synthesized ahead of playback with a small lookahead, so
+    segment N+1 is being synthesized while segment N plays, and played back
+    to back on a single worker so there are no gaps between them.
+    """
+
+    def __init__(
+        self,
+        synthesize,
+        play,
+        lookahead=SYNTHESIS_LOOKAHEAD,
+        segment_timeout=None,
+        on_timeout=None,
+    ):
+        """
+        Args:
+            synthesize (callable): Blocking function taking text and returning PCM bytes
+            play (callable): Blocking function taking PCM bytes and the text they
+                speak; returns False when playback was stopped
+            lookahead (int): Segments to synthesize ahead of the playing one
+            segment_timeout (float, optional): Longest playback waits for a
+                segment's audio; a segment that takes longer is skipped
+            on_timeout (callable, optional): Called with the text of a skipped
+                segment
+        """
+        self.synthesize = synthesize
+        self.play = play
+        self.segment_timeout = segment_timeout
+        self.on_timeout = on_timeout
+        self.splitter = SentenceSplitter()
+        self.spoken_segments = []
+        self.stopped = False
+        self._texts = asyncio.Queue()
+        self._clips = asyncio.Queue()
+        self._slots = asyncio.Semaphore(lookahead + 1)
+        self._synthesis_task = asyncio.create_task(self._synthesize_segments())
+        self._playback_task = asyncio.create_task(self._play_segments())
+
+    def feed(self, text):
+        """
+        Add streamed text; complete segments are queued for synthesis.
+
+        Args:
+            text (str): Next piece of streamed model output
+        """
+        if self.stopped:
+            return
+        for segment in self.splitter.feed(text):
+            self._texts.put_nowait(segment)
+
+    async def finish(self):
+        """
+        Queue any remaining text and wait until everything has been spoken.
+        """
+        if not self.stopped:
+            for segment in self.splitter.flush():
+                self._texts.put_nowait(segment)
+        self._texts.put_nowait(None)
+        try:
+            await self._playback_task
+        finally:
+            self._shutdown()
+
+    def cancel(self):
+        """
+        Stop speaking and drop any pending synthesis.
+        """
+        self.stopped = True
+        self._shutdown()
+
+    def _shutdown(self):
+        for task in (self._synthesis_task, self._playback_task):
+            if not task.done():
+                task.cancel()
+        while not self._clips.empty():
+            clip = self._clips.get_nowait()
+            if clip is not None:
+                clip[1].cancel()
+
+    async def _synthesize_segments(self):
+        while True:
+            text = await self._texts.get()
+            if text is None:
+                self._clips.put_nowait(None)
+                return
+            await self._slots.acquire()
+            clip = asyncio.ensure_future(run_blocking(self.synthesize, text))
+            self._clips.put_nowait((text, clip))
+
+    async def _play_segments(self):
+        while True:
+            item = await self._clips.get()
+            if item is None:
+                return
+            text, clip = item
+            try:
+                pcm = await asyncio.wait_for(clip, self.segment_timeout)
+            except asyncio.TimeoutError:
+                # Skip it rather than leave the listener in silence
+                print(f"\n(speech timed out, skipped: {text})")
+                if self.on_timeout:
+                    self.on_timeout(text)
+                self._slots.release()
+                continue
+            except Exception as e:
+                print(f"Error in text-to-speech: {e}")
+                self._slots.release()
+                continue
+            played = await run_blocking(self.play, pcm, text) if pcm else True
+            self._slots.release()
+            if played is False:
+                self.stopped = True
+                return
+            self.spoken_segments.append(text)
@@ -0,0 +1,186 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import importlib
+import socket
+import threading
+import time
+
+# Kinds of startup phase
+MAIN = "main"  # On the path to listening; the user waits for it
+BACKGROUND = "background"  # Overlaps the language menu
+USER = "user"  # Waiting for the user; not counted as startup
+
+
+class StartupProfile:
+    """
+    Wall-clock breakdown of startup.
+
+    Main phases are what the user waits for. Background phases overlap them
+    and the language menu, and time spent waiting for the user is kept apart
+    so it does not count against startup.
+    """
+
+    def __init__(self, started=None):
+        """
+        Args:
+            started (float, optional): perf_counter() value startup is timed from
+        """
+        self.started = time.perf_counter() if started is None else started
+        self.phases = []
+        self.failures = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name, kind=MAIN):
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.failures[name] = str(e)
+            raise
+        finally:
+            self.record(name, time.perf_counter() - started, kind)
+
+    def record(self, name, seconds, kind=MAIN):
+        with self._lock:
+            self.phases.append((name, seconds, kind))
+
+    def summary(self):
+        """
+        Returns:
+            dict: Startup time without the user's time, and every phase in ms
+        """
+        elapsed = time.perf_counter() - self.started
+        user = sum(seconds for _, seconds, kind in self.phases if kind == USER)
+        return {
+            "startup_ms": (elapsed - user) * 1000,
+            "phases": {
+                kind: {
+                    name: seconds * 1000
+                    for name, seconds, k in self.phases
+                    if k == kind
+                }
+                for kind in (MAIN, BACKGROUND, USER)
+            },
+            "failures": dict(self.failures),
+        }
+
+    def report(self):
+        summary = self.summary()
+        phases = summary["phases"]
+
+        def describe(kind):
+            return ", ".join(f"{name} {ms:.0f} ms" for name, ms in phases[kind].items())
+
+        lines = [f"(startup {summary['startup_ms']:.0f} ms: {describe(MAIN)})"]
+        if phases[BACKGROUND]:
+            lines.append(f"(in the background: {describe(BACKGROUND)})")
+        if phases[USER]:
+            lines.append(f"(not counted: {describe(USER)})")
+        for name, error in summary["failures"].items():
+            lines.append(f"Warning: {name} failed during startup: {error}")
+        return "\n".join(lines)
+
+
+class Warmup:
+    """
+    Slow startup work run on background threads while the user is busy.
+
+    Each task starts at once on its own daemon thread, so one stuck on the
+    network never holds up exit. Its result is collected where it is
+    needed; a failure is raised there, so a warm-up error surfaces where the
+    resource is used rather than at startup.
+    """
+
+    def __init__(self, profile):
+        """
+        Args:
+            profile (StartupProfile): Receives the timing of every task
+        """
+        self.profile = profile
+        self._tasks = {}
+
+    def start(self, name, func, *args):
+        """
+        Start func(*args) in the background as the task called name.
+        """
+        future = concurrent.futures.Future()
+
+        def run():
+            future.set_running_or_notify_cancel()
+            try:
+                with self.profile.phase(name, BACKGROUND):
+                    future.set_result(func(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+        self._tasks[name] = future
+        threading.Thread(target=run, name=f"warmup {name}", daemon=True).start()
+
+    def wait(self, name):
+        """
+        Block until a task is done; for use inside other tasks.
+        """
+        return self._tasks[name].result()
+
+    async def result(self, name):
+        """
+        Wait for a task without blocking the event loop.
+
+        Time spent waiting is recorded as a main phase, since the user waits
+        for it too.
+
+        Returns:
+            object: What the task returned
+        """
+        future = self._tasks[name]
+        if future.done():
+            return future.result()
+        started = time.perf_counter()
+        try:
+            return await asyncio.wrap_future(future)
+        finally:
+            # A failure is already recorded by the task itself
+            self.profile.record(f"waiting for {name}", time.perf_counter() - started)
+
+    def pending(self):
+        """
+        Returns:
+            list: Names of tasks still running
+        """
+        return [name for name, future in self._tasks.items() if not future.done()]
+
+
+def preload(module_names):
+    """
+    Import modules ahead of use.
+
+    Args:
+        module_names (list): Dotted module names
+    """
+    for name in module_names:
+        importlib.import_module(name)
+
+
+def warm_aws_connections(bedrock_runtime, polly_client, region, model_id):
+    """
+    Resolve credentials and open the HTTPS connections the first turn uses.
+
+    The connections stay in each client's pool. Bedrock has no free read-only
+    call, so it gets a converse request with no messages: it fails
+    validation without invoking the model. Transcribe streaming opens its
+    own HTTP/2 connection per stream, so only its host name is resolved.
+
+    Args:
+        bedrock_runtime: bedrock-runtime client
+        polly_client: Polly client
+        region (str): AWS region of the clients
+        model_id (str): Model the first request is likely to use
+    """
+    from botocore.exceptions import ClientError
+
+    with contextlib.suppress(ClientError):
+        bedrock_runtime.converse(modelId=model_id, messages=[])
+    polly_client.describe_voices(LanguageCode="en-US")
+    socket.getaddrinfo(f"transcribestreaming.{region}.amazonaws.com", 443)
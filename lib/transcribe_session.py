@@ -0,0 +1,245 @@
+import asyncio
+import time
+
+from lib.audio_codecs import PCM, CodecStats, StreamEncoder
+
+# Transcribe ends a stream after four hours; roll over to a fresh one before that
+ROLLOVER_SECONDS = 4 * 60 * 60 - 10 * 60
+
+# A planned rollover waits up to this long for a pause in the user's speech
+ROLLOVER_GRACE_SECONDS = 60
+
+# Transcribe times out a stream that receives no audio for 15 seconds; when
+# local VAD is holding back silence, send a silence frame at least this often
+KEEPALIVE_SECONDS = 5.0
+SILENCE_FRAME_MS = 100
+
+# Backoff between attempts to reopen a stream after an error (seconds)
+RECONNECT_BASE_DELAY = 0.25
+RECONNECT_MAX_DELAY = 5.0
+
+
+class TranscribeSession:
+    """
+    Keep mic audio flowing into Amazon Transcribe across stream rollovers.
+
+    The Transcribe client, the mic capture and the transcript handler live for
+    the whole session. Only the stream itself is replaced: before it expires
+    (or after it fails) a new stream is opened, the audio writer switches over
+    between two chunks and the old stream is ended so its last results still
+    arrive. Audio captured while a replacement is opening waits in the
+    capture ring buffer, so none of it is lost.
+    """
+
+    def __init__(
+        self,
+        transcribe_client,
+        capture,
+        handler,
+        stream_config,
+        vad=None,
+        rollover_seconds=ROLLOVER_SECONDS,
+        keepalive_seconds=KEEPALIVE_SECONDS,
+        encoding=PCM,
+    ):
+        """
+        Args:
+            transcribe_client: TranscribeStreamingClient
+            capture: AudioCapture (or anything with an async read_chunk())
+            handler (TranscriptHandler): Receives transcript and VAD events
+            stream_config (dict): Arguments for start_stream_transcription
+            vad (VoiceActivityDetector, optional): Gates silence before sending
+            rollover_seconds (float): Age at which a stream is replaced
+            keepalive_seconds (float): Longest gap between audio events
+            encoding (str): Audio encoding sent to Transcribe; must match the
+                media_encoding in stream_config
+        """
+        self.transcribe_client = transcribe_client
+        self.capture = capture
+        self.handler = handler
+        self.stream_config = stream_config
+        self.vad = vad
+        self.rollover_seconds = rollover_seconds
+        self.keepalive_seconds = keepalive_seconds
+        self.encoding = encoding
+        self.stream = None
+        self.encoder = None
+        self.codec_stats = CodecStats()
+        self.reconnect_times = []
+        self._stream_ready = asyncio.Event()
+        self._broken = asyncio.Event()
+        self._readers = set()
+        silence_samples = capture.rate * SILENCE_FRAME_MS // 1000
+        self._silence_frame = bytes(silence_samples * 2)
+
+    async def run(self):
+        """
+        Stream audio and dispatch transcripts until cancelled.
+        """
+        self.handler.start()
+        writer = asyncio.create_task(self._write_audio())
+        try:
+            self._switch_to(await self._open_stream_with_retry())
+            while True:
+                opened_at = time.monotonic()
+                expiry = opened_at + self.rollover_seconds
+                reason = await self._wait_for_rollover(expiry)
+                await self._rollover(reason)
+        finally:
+            writer.cancel()
+            for reader in list(self._readers):
+                reader.cancel()
+            await asyncio.gather(writer, *self._readers, return_exceptions=True)
+            self.handler.close()
+
+    def stats(self):
+        count = len(self.reconnect_times)
+        return {
+            "reconnects": count,
+            "last_reconnect_ms": self.reconnect_times[-1] * 1000 if count else 0.0,
+            "max_reconnect_ms": max(self.reconnect_times) * 1000 if count else 0.0,
+            "mean_reconnect_ms": (
+                sum(self.reconnect_times) / count * 1000 if count else 0.0
+            ),
+            "encoding": self.encoding,
+            "audio": self._codec_summary(),
+        }
+
+    def _codec_summary(self):
+        stats = CodecStats()
+        stats.merge(self.codec_stats)
+        if self.encoder:
+            stats.merge(self.encoder.stats)
+        return stats.summary()
+
+    async def _wait_for_rollover(self, expiry):
+        broken = asyncio.create_task(self._broken.wait())
+        try:
+            done, _ = await asyncio.wait({broken}, timeout=expiry - time.monotonic())
+        finally:
+            broken.cancel()
+        if done:
+            return "stream error"
+
+        # Planned rollover: prefer a moment when nobody is mid-sentence
+        deadline = time.monotonic() + ROLLOVER_GRACE_SECONDS
+        while self.handler.last_partial and time.monotonic() < deadline:
+            if self._broken.is_set():
+                return "stream error"
+            await asyncio.sleep(0.1)
+        return "stream age"
+
+    async def _rollover(self, reason):
+        started = time.monotonic()
+        old_stream = self.stream
+        old_encoder = self.encoder
+        if self._broken.is_set():
+            # The writer must not keep sending into a dead stream
+            self._stream_ready.clear()
+
+        self._switch_to(await self._open_stream_with_retry())
+        reconnect_time = time.monotonic() - started
+        self.reconnect_times.append(reconnect_time)
+        print(
+            f"\n(Transcribe stream replaced after {reason} "
+            f"in {reconnect_time * 1000:.0f} ms)"
+        )
+
+        if old_stream:
+            try:
+                # Audio still held by the old encoder belongs to the old stream
+                tail = old_encoder.close() if old_encoder else b""
+                if tail:
+                    await old_stream.input_stream.send_audio_event(audio_chunk=tail)
+            except Exception:
+                pass
+            try:
+                # Ending the input lets the old stream deliver its last results
+                await old_stream.input_stream.end_stream()
+            except Exception:
+                pass
+        if old_encoder:
+            self.codec_stats.merge(old_encoder.stats)
+
+    async def _open_stream_with_retry(self):
+        """
+        Open a stream, retrying with exponential backoff until one opens.
+
+        Returns:
+            The new Transcribe stream
+        """
+        delay = RECONNECT_BASE_DELAY
+        while True:
+            try:
+                return await self._open_stream()
+            except Exception as e:
+                print(f"\nError opening Transcribe stream: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def _open_stream(self):
+        return await self.transcribe_client.start_stream_transcription(
+            **self.stream_config
+        )
+
+    def _switch_to(self, stream):
+        # Container headers go out at the start of every stream
+        self.encoder = StreamEncoder(self.encoding, self.capture.rate)
+        self.stream = stream
+        self._broken.clear()
+        self._stream_ready.set()
+        reader = asyncio.create_task(self._read_results(stream))
+        self._readers.add(reader)
+        reader.add_done_callback(self._readers.discard)
+
+    async def _read_results(self, stream):
+        try:
+            await self.handler.consume(stream.output_stream)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"\nTranscribe stream error: {e}")
+
+        # Old streams end after a rollover; the current one ending is a failure
+        if stream is self.stream:
+            self._stream_ready.clear()
+            self._broken.set()
+
+    async def _write_audio(self):
+        last_sent = time.monotonic()
+        pending = []
+        while True:
+            if not pending:
+                data = await self.capture.read_chunk()
+                if self.vad is None:
+                    pending = [data]
+                else:
+                    # Silence is held back; speech is sent along with its pre-roll
+                    pending, event = self.vad.process(data)
+                    if event:
+                        self.handler.handle_vad_event(event)
+                    if not pending and time.monotonic() - last_sent > (
+                        self.keepalive_seconds
+                    ):
+                        pending = [self._silence_frame]
+
+            await self._stream_ready.wait()
+            stream = self.stream
+            encoder = self.encoder
+            try:
+                # After a rollover the rest goes through the new stream's encoder
+                while pending and encoder is self.encoder:
+                    data = encoder.encode(pending[0])
+                    # A compressed frame may still be filling; send nothing yet
+                    if data:
+                        await stream.input_stream.send_audio_event(audio_chunk=data)
+                    pending.pop(0)
+                    last_sent = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Keep the unsent audio and retry it on the replacement stream
+                print(f"\nError writing chunks: {e}")
+                if stream is self.stream:
+                    self._stream_ready.clear()
+                    self._broken.set()
@@ -1,32 +1,119 @@
+import asyncio
+import concurrent.futures
+import functools
 import threading
-import os
-import sys
-import random
 import json
 import time
+from contextlib import aclosing
 
 from amazon_transcribe.handlers import TranscriptResultStreamHandler
 from amazon_transcribe.model import TranscriptEvent
 
-from lib.web_search import web_search
-from lib.post_blog import WordPressBlogger
-
-# Audio output
-SIZE = -16
-CHANNELS = 1
-RATE = 16000
-CHUNK = 1024
-
-# Bedrock settings
+from lib.web_search import async_web_search, web_search
+from lib.search_results import (
+    SEARCH_RESULT_TOKEN_BUDGET,
+    SearchResultStore,
+    compact_results,
+)
+from lib.publish_queue import default_publish_queue
+from lib.audio_player import RATE, AudioPlayer
+from lib.audio_codecs import PCM, CodecStats, decode_to_pcm
+from lib.speech import SpeechPipeline, voice_for_language
+from lib.tts_cache import SynthesisCache
+from lib.speculation import SpeculationStats, SpeculativeRequest, stable_transcript
+from lib.answer_cache import CACHEABLE_TOOLS, STATIC_ANSWER_TTL, TOOL_ANSWER_TTL
+from lib.deadline import (
+    ANSWER_RESERVE_SECONDS,
+    MODEL,
+    MODEL_FIRST_OUTPUT_SECONDS,
+    SPEECH,
+    SPEECH_SEGMENT_SECONDS,
+    TOOLS,
+    TURN_BUDGET_SECONDS,
+    DeadlineExceeded,
+    DeadlineStats,
+    TurnDeadline,
+    fallback_phrase,
+)
+from lib.filler import THINKING, TOOL
+from lib.early_tools import (
+    EARLY_DISPATCH_TOOLS,
+    EarlyToolCall,
+    EarlyToolStats,
+    IncrementalObjectParser,
+)
+from lib.vad import END_OF_UTTERANCE, SPEECH_START
+from lib.barge_in import (
+    BARGE_IN_TARGET_MS,
+    TRANSCRIPT,
+    VAD,
+    BargeInStats,
+    Interruption,
+    heard_text,
+    is_echo,
+)
+from lib.history import HISTORY_TOKEN_BUDGET, ConversationHistory
+from lib.prompt_cache import TokenUsage, add_cache_points
+from lib.metrics import (
+    BARGE_IN,
+    BEDROCK_REQUEST,
+    FIRST_TOKEN,
+    LAST_TOKEN,
+    NULL_TIMELINE,
+    PLAYBACK_END,
+    PLAYBACK_START,
+    POLLY_FIRST_BYTE,
+    POLLY_REQUEST,
+    SPEECH_STOPPED,
+    TOOL_END,
+    TOOL_START,
+    TRANSCRIPT_FINAL,
+    MetricsRegistry,
+)
+from lib.model_router import (
+    MAX_HEDGES,
+    ModelRouter,
+    StreamError,
+    StreamInterrupted,
+    error_code,
+    is_retryable,
+)
+from lib.event_loop import (
+    MAX_LOOP_STALL_MS,
+    LoopStallMonitor,
+    iterate_in_thread,
+    run_blocking,
+)
+
+# Bedrock settings, ordered from fastest to strongest (see ModelRouter)
 MODELS = [
     # "us.amazon.nova-micro-v1:0",
     # "us.amazon.nova-lite-v1:0",
     # "us.amazon.nova-pro-v1:0",
-    # "anthropic.claude-3-5-haiku-20241022-v1:0",
+    "anthropic.claude-3-5-haiku-20241022-v1:0",
     # "anthropic.claude-3-5-sonnet-20240620-v1:0",
     "anthropic.claude-3-5-sonnet-20241022-v2:0",
 ]
 
+# Cheaper model from the list above that summarizes old conversation turns
+SUMMARY_MODEL = "anthropic.claude-3-5-haiku-20241022-v1:0"
+
+# Rounds of tool calls allowed in one turn before the model must answer
+MAX_TOOL_ROUNDS = 5
+
+# Tool calls from one message run concurrently on a pool of this size
+TOOL_WORKERS = 4
+
+# Per-tool timeouts (seconds)
+TOOL_TIMEOUTS = {
+    "web_search": 20,
+    # Posts are only queued here; publishing runs in the background
+    "post_blog": 5,
+    "blog_post_status": 5,
+    "search_results": 5,
+}
+DEFAULT_TOOL_TIMEOUT = 20
+
 INFERENCE_CONFIG = {
     "maxTokens": 1000,
     "temperature": 0.2,
@@ -53,10 +140,13 @@ SYSTEM = [
               - The most recent information is not within your current knowledge
               - You cannot confidently construct a response using existing information
               - The query requires verified, up-to-date information
+            - Earlier searches show up as references such as (search-3); use search_results with that ID to read them again instead of searching again
 
           ## Blog post writing guidelines
 
             - Use post_blog when user says create a blog post      
+            - post_blog queues the post and returns a job ID; tell the user it is being published
+            - Use blog_post_status when the user asks whether a post has gone up
 
             - Pre-Writing Preparation
               - Conduct thorough research on the topic
@@ -155,16 +245,49 @@ TOOL_CONFIG = {
                 },
             }
         },
+        {
+            "toolSpec": {
+                "name": "blog_post_status",
+                "description": "Check whether blog posts queued with post_blog have been published.",
+                "inputSchema": {
+                    "json": {
+                        "type": "object",
+                        "properties": {
+                            "job_id": {
+                                "type": "string",
+                                "description": "Job ID returned by post_blog; omit for the latest posts",
+                            },
+                        },
+                    }
+                },
+            }
+        },
+        {
+            "toolSpec": {
+                "name": "search_results",
+                "description": "Read again the results of an earlier web search by its reference.",
+                "inputSchema": {
+                    "json": {
+                        "type": "object",
+                        "properties": {
+                            "ref": {
+                                "type": "string",
+                                "description": "Reference of the search, such as search-3",
+                            },
+                        },
+                        "required": ["ref"],
+                    }
+                },
+            }
+        },
     ]
 }
 
-
-class NullDevice:
-    def write(self, *args, **kwargs):
-        pass
-
-    def flush(self):
-        pass
+# Input schema of each tool, by name
+TOOL_SCHEMAS = {
+    tool["toolSpec"]["name"]: tool["toolSpec"]["inputSchema"]["json"]
+    for tool in TOOL_CONFIG["tools"]
+}
 
 
 class TranscriptHandler(TranscriptResultStreamHandler):
@@ -175,6 +298,21 @@ class TranscriptHandler(TranscriptResultStreamHandler):
         polly_client,
         language_code,
         converstation_history,
+        audio_player=None,
+        tts_cache=None,
+        speculative=False,
+        history_token_budget=HISTORY_TOKEN_BUDGET,
+        metrics=None,
+        search_token_budget=SEARCH_RESULT_TOKEN_BUDGET,
+        router=None,
+        barge_in=False,
+        polly_format=PCM,
+        tool_workers=TOOL_WORKERS,
+        early_tools=False,
+        publish_queue=None,
+        answer_cache=None,
+        turn_budget=TURN_BUDGET_SECONDS,
+        fillers=None,
     ):
         super().__init__(transcript_result_stream)
         self.bedrock_runtime = bedrock_runtime
@@ -182,17 +320,65 @@ class TranscriptHandler(TranscriptResultStreamHandler):
         self.language_code = language_code
         self.listening = True
         self.polly_finished = threading.Event()
-        self.conversation_history = converstation_history
-
-        # Pre-initialize pygame mixer
-        original_stdout = sys.stdout
-        sys.stdout = NullDevice()
-        from pygame import mixer
-
-        sys.stdout = original_stdout
-        self.mixer = mixer
-        self.mixer.init(frequency=RATE, size=SIZE, channels=CHANNELS)
-        self.mixer_lock = threading.Lock()
+        self.conversation_history = ConversationHistory(
+            bedrock_runtime,
+            SUMMARY_MODEL,
+            converstation_history,
+            token_budget=history_token_budget,
+        )
+        self.stall_monitor = LoopStallMonitor()
+        self.turn_task = None
+        self.last_turn_stats = {}
+        self.speech = None
+        self.audio_player = audio_player or AudioPlayer()
+        self.tts_cache = tts_cache or SynthesisCache()
+        self.speculative = speculative
+        self.speculation = None
+        self.turn_speculation = None
+        self.speculation_stats = SpeculationStats()
+        self.last_partial = None
+        self.endpointed_result_id = None
+        self.usage = TokenUsage()
+        self.turn_usage = TokenUsage()
+        self.metrics = metrics or MetricsRegistry(enabled=False)
+        self.timeline = NULL_TIMELINE
+        self.turn_budget = turn_budget
+        self.deadline = TurnDeadline(None)
+        self.deadline_stats = DeadlineStats()
+        self.fillers = fillers
+        self.filler_clip = None
+        self.filler_timer = None
+        # play_filler runs on the event loop, play_audio on a worker thread
+        self.filler_lock = threading.RLock()
+        self.turn_fillers = []
+        self.search_token_budget = search_token_budget
+        self.router = router or ModelRouter(MODELS)
+        self.last_decision = None
+        self.search_store = SearchResultStore()
+        self.compacted_tool_results = {}
+        self.tool_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=tool_workers, thread_name_prefix="tool"
+        )
+        self.early_tools = early_tools
+        self.publish_queue = publish_queue
+        self.answer_cache = answer_cache
+        self.turn_tools = set()
+        self.last_cache_hit = None
+        self.early_calls = {}
+        self.early_tool_stats = EarlyToolStats()
+        self.turn_tool_saved = 0.0
+        self.polly_format = polly_format
+        self.decode_stats = CodecStats()
+        self.barge_in = barge_in
+        self.barge_in_stats = BargeInStats()
+        self.interruptions = {}
+        self.turn_clips = []
+        self.turn_history_start = None
+        self.stop_hint = (
+            "Press Enter or start speaking to stop the voice playback..."
+            if barge_in
+            else "Press Enter to stop the voice playback..."
+        )
 
     def handle_tool_use(self, tool_use):
         try:
@@ -201,45 +387,64 @@ class TranscriptHandler(TranscriptResultStreamHandler):
                 query = input_data["query"]
                 max_results = input_data.get("max_results", 5)
                 search_results = web_search(query, max_results)
-
-                text_results = []
-                for result in search_results:
-                    text_results.append(
-                        {
-                            "text": f"Title: {result['title']}\nLink: {result['link']}\nContent: {result['body']}"
-                        }
-                    )
-
-                return {"toolUseId": tool_use["toolUseId"], "content": text_results}
+                return self.search_tool_result(tool_use, search_results)
 
             elif tool_use["name"] == "post_blog":
                 input_data = tool_use["input"]
-                wp = WordPressBlogger(
-                    url=os.environ["WP_SITE_URL"],
-                    username=os.environ["WP_USERNAME"],
-                    password=os.environ["WP_APP_PASSWORD"],
-                )
-
-                try:
-                    wp.connect()
-                    post_id = wp.post_content(
-                        title=input_data["title"],
-                        content=input_data["content"],
-                        status=input_data.get("status", "draft"),
-                        categories=input_data.get("categories"),
-                        tags=input_data.get("tags"),
-                    )
+                if not input_data.get("title") or not input_data.get("content"):
                     return {
                         "toolUseId": tool_use["toolUseId"],
-                        "content": [
-                            {"text": f"Successfully created post with ID: {post_id}"}
-                        ],
+                        "content": [{"text": "Title and content are required."}],
+                        "status": "error",
+                    }
+                # Publishing happens in the background; the turn goes on
+                job_id = self.get_publish_queue().submit(
+                    {
+                        "title": input_data["title"],
+                        "content": input_data["content"],
+                        "status": input_data.get("status", "draft"),
+                        "categories": input_data.get("categories"),
+                        "tags": input_data.get("tags"),
                     }
-                except Exception as e:
+                )
+                return {
+                    "toolUseId": tool_use["toolUseId"],
+                    "content": [
+                        {
+                            "text": f"Queued the post for publishing as job {job_id}. "
+                            "Check on it with blog_post_status."
+                        }
+                    ],
+                }
+
+            elif tool_use["name"] == "blog_post_status":
+                job_id = tool_use["input"].get("job_id")
+                jobs = self.get_publish_queue().status(job_id)
+                if not jobs:
+                    text = (
+                        f"No blog post job {job_id}."
+                        if job_id
+                        else "No blog posts have been queued."
+                    )
+                else:
+                    text = json.dumps(jobs, ensure_ascii=False)
+                return {
+                    "toolUseId": tool_use["toolUseId"],
+                    "content": [{"text": text}],
+                }
+
+            elif tool_use["name"] == "search_results":
+                ref = tool_use["input"].get("ref", "")
+                entry = self.search_store.get(ref)
+                if entry is None:
                     return {
                         "toolUseId": tool_use["toolUseId"],
-                        "content": [{"text": f"Error posting to WordPress: {str(e)}"}],
+                        "content": [{"text": f"No stored search {ref}."}],
+                        "status": "error",
                     }
+                return self.search_tool_result(
+                    tool_use, entry["results"], entry["query"], ref
+                )
 
         except Exception as e:
             print(f"Error executing tool {tool_use['name']}: {e}")
@@ -248,210 +453,1067 @@ class TranscriptHandler(TranscriptResultStreamHandler):
                 "content": [{"text": f"Error executing {tool_use['name']}"}],
             }
 
-    def process_response_stream(self, response_stream, modelId, initial_response=""):
-        full_response = initial_response
-        current_tool_use = None
-        tool_use_input_parts = []
+    def get_publish_queue(self):
+        return self.publish_queue or default_publish_queue()
+
+    def converse_request(self, modelId, messages):
+        system, tool_config, messages = add_cache_points(
+            modelId, SYSTEM, TOOL_CONFIG, messages
+        )
+        return {
+            "modelId": modelId,
+            "inferenceConfig": INFERENCE_CONFIG,
+            "system": system,
+            "messages": messages,
+            "toolConfig": tool_config,
+        }
+
+    async def process_response_stream(self, models, response_stream=None):
+        """
+        Speak a response, running tool calls until the model gives its answer.
+
+        Each assistant message is read in full first; all toolUse blocks in it
+        run concurrently and their results go back in one user message. This
+        repeats for at most MAX_TOOL_ROUNDS rounds.
+
+        Args:
+            models (list): Model IDs to use, preferred first, then fallbacks
+            response_stream (optional): Stream already started on models[0]
 
-        for event in response_stream:
+        Returns:
+            str: Text of the final assistant message, for the caller to store
+        """
+        for tool_round in range(MAX_TOOL_ROUNDS + 1):
             try:
-                if "contentBlockStart" in event:
-                    start = event["contentBlockStart"].get("start", {})
-                    if "toolUse" in start:
-                        current_tool_use = start["toolUse"]
-                        tool_use_input_parts = []
-
-                elif "contentBlockDelta" in event:
-                    delta = event["contentBlockDelta"]["delta"]
-                    if "text" in delta:
-                        text = delta["text"]
-                        full_response += text
-                        print(text, end="", flush=True)
-                    elif "toolUse" in delta and current_tool_use:
-                        tool_use_input_parts.append(delta["toolUse"]["input"])
-
-                elif "contentBlockStop" in event:
-                    if current_tool_use and tool_use_input_parts:
-                        # Handle tool use and get new response
-                        tool_input_str = "".join(tool_use_input_parts)
-                        tool_input = json.loads(tool_input_str)
-                        current_tool_use["input"] = tool_input
-
-                        # Add the current response and tool use to conversation history
-                        self.conversation_history.append(
-                            {
-                                "role": "assistant",
-                                "content": [
-                                    {"text": full_response},
-                                    {
-                                        "toolUse": {
-                                            "toolUseId": current_tool_use["toolUseId"],
-                                            "name": current_tool_use["name"],
-                                            "input": tool_input,
-                                        }
-                                    },
-                                ],
-                            }
-                        )
+                modelId, content = await self.stream_message(models, response_stream)
+            except DeadlineExceeded:
+                self.discard_early_tools()
+                return self.speak_fallback()
+            # Follow-up requests stay on the model that answered
+            models = [modelId] + [model for model in models if model != modelId]
+            response_stream = None
+
+            tool_uses = [block["toolUse"] for block in content if "toolUse" in block]
+            text = "".join(block["text"] for block in content if "text" in block)
+            limit = None
+            if tool_round >= MAX_TOOL_ROUNDS:
+                limit = "Tool limit reached. Answer with what you have."
+            elif tool_uses and not self.deadline.remaining(ANSWER_RESERVE_SECONDS):
+                # What is left of the budget is kept for the answer
+                self.deadline.miss(TOOLS)
+                limit = "Out of time for tools. Answer from what you know."
+            # Early calls only count for tools that are about to run
+            self.discard_early_tools(
+                keep=(
+                    {tool_use["toolUseId"] for tool_use in tool_uses}
+                    if limit is None
+                    else ()
+                )
+            )
+            if not tool_uses:
+                return text
+
+            self.conversation_history.append({"role": "assistant", "content": content})
+            if limit is None:
+                if not text:
+                    # Nothing was said before the tools; cover their silence
+                    self.play_filler(TOOL)
+                tool_results = await self.run_tools(tool_uses)
+            else:
+                # Ask for an answer from what has been found so far
+                tool_results = [
+                    {
+                        "toolUseId": tool_use["toolUseId"],
+                        "content": [{"text": limit}],
+                        "status": "error",
+                    }
+                    for tool_use in tool_uses
+                ]
+            self.conversation_history.append(
+                {
+                    "role": "user",
+                    "content": [{"toolResult": result} for result in tool_results],
+                }
+            )
+            if limit is not None:
+                break
 
-                        # Execute tool and add result to conversation history
-                        tool_result = self.handle_tool_use(current_tool_use)
-                        self.conversation_history.append(
-                            {
-                                "role": "user",
-                                "content": [{"toolResult": tool_result}],
-                            }
-                        )
+        # No more tools; keep only the text of the answer
+        try:
+            _, content = await self.stream_message(models)
+        except DeadlineExceeded:
+            return self.speak_fallback()
+        finally:
+            self.discard_early_tools()
+        return "".join(block["text"] for block in content if "text" in block)
+
+    def speak_fallback(self):
+        """
+        Say a short apology when the model cannot answer within the budget.
+
+        Returns:
+            str: The words spoken, for the caller to store as the answer
+        """
+        text = fallback_phrase(self.language_code)
+        self.deadline.fallback_spoken = True
+        print(text, end="", flush=True)
+        if self.speech:
+            self.speech.feed(text)
+        return text
+
+    async def stream_message(self, models, response_stream=None):
+        """
+        Get one assistant message, failing over to the next model on errors.
+
+        A retryable error before any text was spoken moves the request to the
+        next model; once text has been spoken the error is raised. Each
+        request must produce its first output within its slice of the turn
+        budget; after that the message is read to the end.
+
+        Returns:
+            tuple: (model ID that answered, content blocks)
 
-                        # Get new response after tool use
-                        new_response = self.bedrock_runtime.converse_stream(
-                            modelId=modelId,
-                            inferenceConfig=INFERENCE_CONFIG,
-                            toolConfig=TOOL_CONFIG,
-                            system=SYSTEM,
-                            messages=self.conversation_history,
+        Raises:
+            DeadlineExceeded: No output within the slice; the request is closed
+        """
+        models = list(models)
+        while True:
+            started = None
+            if self.fillers:
+                # Cancelled by the first output; until then silence gets a filler
+                self.filler_timer = asyncio.get_running_loop().call_later(
+                    self.fillers.after, self.play_filler, THINKING
+                )
+            try:
+                async with asyncio.timeout(
+                    self.deadline.slice(MODEL_FIRST_OUTPUT_SECONDS)
+                ) as first_output:
+                    if response_stream is None:
+                        modelId, response_stream, started = await self.open_stream(
+                            models
                         )
+                    else:
+                        modelId = models[0]
+                    content = await self.read_assistant_message(
+                        response_stream, modelId, started, first_output
+                    )
+                    return modelId, content
+            except TimeoutError:
+                print(f"\n({models[0]} did not answer in time)")
+                self.deadline.miss(MODEL)
+                raise DeadlineExceeded(MODEL)
+            except StreamInterrupted as e:
+                self.router.record_error(modelId, e.error)
+                models = [model for model in models if model != modelId]
+                if e.text_emitted or not models:
+                    raise e.error
+                print(
+                    f"\n({modelId} failed with {error_code(e.error)}, "
+                    f"switching to {models[0]})"
+                )
+                self.router.failovers += 1
+                response_stream = None
+            finally:
+                self.cancel_filler_timer()
+
+    async def open_stream(self, models):
+        """
+        Start converse_stream on the first model that answers.
 
-                        # Process the new response stream recursively
-                        if "stream" in new_response:
-                            return self.process_response_stream(
-                                new_response["stream"], modelId, ""
-                            )
+        A retryable error moves on to the next model. If the first model is
+        slow to answer, a hedge request is started on the next one and
+        whichever answers first is used; the other response is closed.
 
-                elif "messageStop" in event:
-                    if event["messageStop"]["stopReason"] == "end_turn":
-                        break
+        Args:
+            models (list): Model IDs, preferred first
 
-            except Exception as chunk_error:
-                print(f"\nError processing chunk: {chunk_error}")
-                continue
+        Returns:
+            tuple: (model ID, event stream, monotonic time the request started)
+        """
+        queue = list(models)
+        pending = {}
+        hedges = 0
+        last_error = None
+
+        def launch():
+            modelId = queue.pop(0)
+            self.timeline.mark(BEDROCK_REQUEST, model=modelId)
+            task = asyncio.create_task(
+                run_blocking(
+                    self.bedrock_runtime.converse_stream,
+                    **self.converse_request(modelId, self.conversation_history),
+                )
+            )
+            pending[task] = (modelId, time.monotonic())
+
+        def discard(task):
+            if not task.cancelled() and task.exception() is None:
+                stream = task.result().get("stream")
+                if stream is not None:
+                    stream.close()
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if queue and hedges < MAX_HEDGES:
+                    first_model = next(iter(pending.values()))[0]
+                    timeout = self.router.hedge_delay(first_model)
+                done, _ = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # Slow to answer: race the next model against it
+                    hedges += 1
+                    self.router.hedges += 1
+                    launch()
+                    continue
+
+                for task in done:
+                    modelId, started = pending.pop(task)
+                    try:
+                        response = task.result()
+                    except Exception as e:
+                        if not is_retryable(e):
+                            raise
+                        self.router.record_error(modelId, e)
+                        last_error = e
+                        print(f"\n({modelId} failed with {error_code(e)})")
+                        continue
+                    if "stream" not in response:
+                        continue
+                    for other in pending:
+                        other.add_done_callback(discard)
+                    pending.clear()
+                    return modelId, response["stream"], started
+
+                if not pending and queue:
+                    self.router.failovers += 1
+                    launch()
+        finally:
+            for task in pending:
+                task.add_done_callback(discard)
+
+        raise last_error or RuntimeError("No model returned a response stream")
+
+    async def read_assistant_message(
+        self, response_stream, modelId=None, request_started=None, first_output=None
+    ):
+        """
+        Read one streamed assistant message, printing and speaking its text.
+
+        Args:
+            response_stream: converse_stream event stream (sync or async)
+            modelId (str, optional): Model producing the stream, for latency stats
+            request_started (float, optional): Monotonic time the request was sent
+            first_output (asyncio.Timeout, optional): Deadline for the first
+                output, lifted once it arrives
+
+        Returns:
+            list: Converse content blocks (text and toolUse) in block order
 
-        return full_response
+        Raises:
+            StreamInterrupted: The stream failed with a retryable error
+        """
+        blocks = {}
+        text_emitted = False
+
+        # Speculative replays are already async; Bedrock streams are read on a thread
+        if not hasattr(response_stream, "__aiter__"):
+            response_stream = iterate_in_thread(response_stream)
 
-    def speak_response(self, text):
         try:
-            if self.language_code == "zh-CN":
-                voice_id = "Zhiyu"
-                engine = "neural"
-            elif self.language_code == "es-ES":
-                voice_id = "Lucia"
-                engine = "neural"
+            async with aclosing(response_stream) as events:
+                async for event in events:
+                    error = next(
+                        (key for key in event if key.endswith("Exception")), None
+                    )
+                    if error:
+                        raise StreamError(error, event[error].get("message", ""))
+                    if first_output is not None and (
+                        "contentBlockDelta" in event or "contentBlockStart" in event
+                    ):
+                        first_output.reschedule(None)
+                        first_output = None
+                        self.cancel_filler_timer()
+                    if request_started is not None and (
+                        "contentBlockDelta" in event or "contentBlockStart" in event
+                    ):
+                        self.router.record_ttft(
+                            modelId, time.monotonic() - request_started
+                        )
+                        request_started = None
+                    if self.read_event(event, blocks):
+                        text_emitted = True
+        except Exception as e:
+            if is_retryable(e):
+                raise StreamInterrupted(e, text_emitted) from e
+            raise
+
+        content = []
+        for index in sorted(blocks):
+            block = blocks[index]
+            if "text" in block:
+                text = "".join(block["text"])
+                # Bedrock rejects blank text blocks in the history
+                if text.strip():
+                    content.append({"text": text})
             else:
-                voice_id = "Joanna"
-                engine = "generative"
+                tool_use = block["toolUse"]
+                tool_input = "".join(block["input"])
+                try:
+                    tool_use["input"] = json.loads(tool_input) if tool_input else {}
+                except json.JSONDecodeError as e:
+                    print(f"\nError parsing input for {tool_use['name']}: {e}")
+                    tool_use["input"] = {}
+                content.append({"toolUse": tool_use})
+        return content
+
+    def read_event(self, event, blocks):
+        """
+        Apply one converse_stream event to the message being built.
 
-            response = self.polly_client.synthesize_speech(
-                Text=text, OutputFormat="pcm", VoiceId=voice_id, Engine=engine
-            )
+        Args:
+            event (dict): converse_stream event
+            blocks (dict): Content blocks so far, by contentBlockIndex
+
+        Returns:
+            bool: Whether the event carried text that was printed and spoken
+        """
+        try:
+            if "contentBlockStart" in event:
+                block = event["contentBlockStart"]
+                start = block.get("start", {})
+                if "toolUse" in start:
+                    tool_block = {"toolUse": dict(start["toolUse"]), "input": []}
+                    if self.early_tools and start["toolUse"]["name"] in (
+                        EARLY_DISPATCH_TOOLS
+                    ):
+                        tool_block["parser"] = IncrementalObjectParser()
+                    blocks[block.get("contentBlockIndex", len(blocks))] = tool_block
+
+            elif "contentBlockDelta" in event:
+                block = event["contentBlockDelta"]
+                index = block.get("contentBlockIndex", 0)
+                delta = block["delta"]
+                if "text" in delta:
+                    text = delta["text"]
+                    self.timeline.mark_once(FIRST_TOKEN)
+                    blocks.setdefault(index, {"text": []})["text"].append(text)
+                    print(text, end="", flush=True)
+                    if self.speech:
+                        self.speech.feed(text)
+                    return True
+                elif "toolUse" in delta and "toolUse" in blocks.get(index, {}):
+                    tool_block = blocks[index]
+                    tool_block["input"].append(delta["toolUse"]["input"])
+                    if "parser" in tool_block:
+                        self.feed_tool_input(tool_block, delta["toolUse"]["input"])
+
+            elif "messageStop" in event:
+                self.timeline.mark(LAST_TOKEN)
+
+            elif "metadata" in event:
+                # Usage arrives after messageStop, so read to the end
+                usage = event["metadata"].get("usage")
+                if usage:
+                    self.turn_usage.add(usage)
+
+        except Exception as chunk_error:
+            print(f"\nError processing chunk: {chunk_error}")
+        return False
+
+    def feed_tool_input(self, tool_block, fragment):
+        """
+        Parse streamed tool input and start the tool once its required fields
+        are complete.
 
-            if "AudioStream" in response:
-                import pyaudio
+        Only tools in EARLY_DISPATCH_TOOLS get here. The call starts with the
+        fields seen so far; run_tool checks it against the final input.
+        """
+        parser = tool_block["parser"]
+        if not parser.feed(fragment):
+            return
+        tool_use = tool_block["toolUse"]
+        schema = TOOL_SCHEMAS.get(tool_use["name"], {})
+        if any(field not in parser.fields for field in schema.get("required", [])):
+            return
+        # One early call per block
+        del tool_block["parser"]
+        early_tool_use = dict(tool_use, input=dict(parser.fields))
+        self.early_calls[tool_use["toolUseId"]] = EarlyToolCall(
+            early_tool_use, schema, self.call_tool
+        )
+        self.early_tool_stats.started += 1
+
+    def discard_early_tools(self, keep=()):
+        """
+        Cancel early calls for tool uses that will not run.
 
-                # Initialize PyAudio
-                p = pyaudio.PyAudio()
+        Args:
+            keep (set): toolUseIds whose early calls stay for run_tool
+        """
+        for tool_use_id in [key for key in self.early_calls if key not in keep]:
+            self.early_calls.pop(tool_use_id).cancel()
+            self.compacted_tool_results.pop(tool_use_id, None)
+            self.early_tool_stats.discarded += 1
 
-                # Open stream
-                stream = p.open(
-                    format=p.get_format_from_width(2),  # 16-bit PCM
-                    channels=CHANNELS,
-                    rate=RATE,  # Sample rate
-                    output=True,
-                )
+    async def run_tools(self, tool_uses):
+        """
+        Run tool calls concurrently on the tool pool.
 
-                print("\nPress Enter to stop the voice playback...")
-                should_stop = threading.Event()
+        Args:
+            tool_uses (list): toolUse dicts from one assistant message
 
-                def wait_for_input():
-                    try:
-                        input()
-                        should_stop.set()
-                    except Exception as e:
-                        print(f"\nError stopping playback: {e}")
+        Returns:
+            list: toolResult dicts in the same order
+        """
+        return await asyncio.gather(
+            *(self.run_tool(tool_use) for tool_use in tool_uses)
+        )
+
+    async def run_tool(self, tool_use):
+        limit = TOOL_TIMEOUTS.get(tool_use["name"], DEFAULT_TOOL_TIMEOUT)
+        # Tools leave part of the turn budget for the answer
+        timeout = self.deadline.slice(limit, reserve=ANSWER_RESERVE_SECONDS)
+        if timeout is None:
+            timeout = limit
+        self.turn_tools.add(tool_use["name"])
+        early = self.take_early_tool(tool_use)
+        self.timeline.mark(
+            TOOL_START,
+            id=tool_use["toolUseId"],
+            tool=tool_use["name"],
+            early=early is not None,
+        )
+        try:
+            if early:
+                # Already running since its required fields streamed in
+                remaining = limit - (time.monotonic() - early.started_at)
+                return await asyncio.wait_for(
+                    early.task, max(0.0, min(remaining, timeout))
+                )
+            # A timed-out call keeps its worker until it returns; the answer
+            # goes ahead without it
+            return await asyncio.wait_for(self.call_tool(tool_use), timeout)
+        except asyncio.TimeoutError:
+            if timeout < limit:
+                self.deadline.miss(TOOLS)
+                print(
+                    f"\nTool {tool_use['name']} ran out of turn time "
+                    f"after {timeout:.1f}s"
+                )
+                text = f"{tool_use['name']} ran out of time. Answer from what you know."
+            else:
+                print(f"\nTool {tool_use['name']} timed out after {timeout}s")
+                text = f"{tool_use['name']} timed out"
+            return {
+                "toolUseId": tool_use["toolUseId"],
+                "content": [{"text": text}],
+                "status": "error",
+            }
+        finally:
+            self.timeline.mark(TOOL_END, id=tool_use["toolUseId"])
 
-                input_thread = threading.Thread(target=wait_for_input)
-                input_thread.daemon = True
-                input_thread.start()
+    def take_early_tool(self, tool_use):
+        """
+        Claim the early call for a tool use if it asked for the same thing.
 
-                # Stream the audio data
-                audio_stream = response["AudioStream"]
-                chunk_size = CHUNK
-                while not should_stop.is_set():
-                    data = audio_stream.read(chunk_size)
-                    if not data:
-                        break
-                    stream.write(data)
+        Returns:
+            EarlyToolCall: Call to await, or None to run the tool now
+        """
+        early = self.early_calls.pop(tool_use["toolUseId"], None)
+        if early is None:
+            return None
+        if early.matches(tool_use["input"]):
+            saved = early.saved(time.monotonic())
+            self.early_tool_stats.record_reuse(saved)
+            self.turn_tool_saved += saved
+            return early
+        # The input changed after the required fields; start over with it
+        early.cancel()
+        self.compacted_tool_results.pop(tool_use["toolUseId"], None)
+        self.early_tool_stats.rerun += 1
+        return None
+
+    async def call_tool(self, tool_use):
+        if tool_use["name"] == "web_search":
+            # Searches back off on the event loop instead of holding a pool thread
+            return await self.search_web(tool_use)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.tool_pool, self.handle_tool_use, tool_use
+        )
+
+    async def search_web(self, tool_use):
+        try:
+            input_data = tool_use["input"]
+            search_results = await async_web_search(
+                input_data["query"], input_data.get("max_results", 5)
+            )
+            return self.search_tool_result(tool_use, search_results)
+        except Exception as e:
+            print(f"Error executing tool {tool_use['name']}: {e}")
+            return {
+                "toolUseId": tool_use["toolUseId"],
+                "content": [{"text": f"Error executing {tool_use['name']}"}],
+            }
 
-                if should_stop.is_set():
-                    print("\nVoice playback stopped.")
+    def search_tool_result(self, tool_use, search_results, query=None, ref=None):
+        """
+        Build a compact toolResult for a search and keep the full results aside.
+
+        The model gets deduplicated, ranked results trimmed to the search token
+        budget. Once the turn is over, the history keeps only a short
+        reference to the full results in the search store, which the
+        search_results tool reads back the same way.
+
+        Args:
+            tool_use (dict): The toolUse block
+            search_results (list): Full results
+            query (str, optional): Query of a stored search; the tool input's
+                query by default
+            ref (str, optional): Reference of a stored search; a new search is
+                stored when omitted
+        """
+        if query is None:
+            query = tool_use["input"]["query"]
+        if ref is None:
+            ref = self.search_store.put(query, search_results)
+        self.compacted_tool_results[tool_use["toolUseId"]] = [
+            {"text": self.search_store.reference(ref, query, search_results)}
+        ]
+        content = compact_results(query, search_results, self.search_token_budget)
+        return {
+            "toolUseId": tool_use["toolUseId"],
+            "content": content or [{"text": "No results found."}],
+        }
+
+    def synthesize_speech(self, text):
+        voice_id, engine = voice_for_language(self.language_code)
+
+        # Repeated phrases play straight from the cache with no Polly call;
+        # compressed output is cached decoded, so the key is always PCM
+        cache_key = self.tts_cache.key(text, voice_id, engine, PCM, RATE)
+        pcm = self.tts_cache.get(cache_key)
+        if pcm is not None:
+            return pcm
+
+        timeline = self.timeline
+        timeline.mark_once(POLLY_REQUEST)
+        response = self.polly_client.synthesize_speech(
+            Text=text,
+            OutputFormat=self.polly_format,
+            VoiceId=voice_id,
+            Engine=engine,
+            SampleRate=str(RATE),
+        )
+        timeline.mark_once(POLLY_FIRST_BYTE)
+        if "AudioStream" not in response:
+            return b""
+        pcm = decode_to_pcm(
+            response["AudioStream"], self.polly_format, RATE, self.decode_stats
+        )
+        self.tts_cache.put(cache_key, pcm)
+        return pcm
+
+    def play_audio(self, pcm, text=None):
+        with self.filler_lock:
+            # Real speech is ready: a filler still playing fades out first
+            self.cut_filler()
+            # Hand the clip to the player and return once it starts, so the
+            # next segment is already queued when this one ends
+            clip = self.audio_player.enqueue(pcm, label=text)
+        self.turn_clips.append(clip)
+        clip.started.wait()
+        if clip.stopped:
+            return False
+        self.timeline.mark_once(PLAYBACK_START)
+        return True
+
+    def play_filler(self, kind):
+        """
+        Play a pre-synthesized filler phrase while the answer is pending.
 
-                # Clean up
-                stream.stop_stream()
-                stream.close()
-                p.terminate()
+        Nothing is played when fillers are off, something is already
+        playing, or the answer has been stopped.
 
+        Args:
+            kind (str): filler.TOOL or filler.THINKING
+        """
+        self.filler_timer = None
+        if not self.fillers or not self.speech or self.speech.stopped:
+            return
+        # Checked and queued under the lock, so a filler never lands behind
+        # a segment play_audio has just queued
+        with self.filler_lock:
+            if self.audio_player.is_playing:
+                return
+            filler = self.fillers.pick(self.language_code, kind)
+            if filler is None:
+                return
+            text, pcm = filler
+            self.filler_clip = self.audio_player.enqueue(pcm, label=text, filler=True)
+            self.turn_fillers.append(self.filler_clip)
+
+    def cut_filler(self):
+        with self.filler_lock:
+            clip, self.filler_clip = self.filler_clip, None
+        if clip is not None and not clip.finished.is_set():
+            self.audio_player.cut(clip)
+            self.fillers.record_cut()
+
+    def cancel_filler_timer(self):
+        if self.filler_timer is not None:
+            self.filler_timer.cancel()
+            self.filler_timer = None
+
+    def start_speech(self):
+        self.audio_player.begin_utterance()
+        deadline = self.deadline
+        return SpeechPipeline(
+            self.synthesize_speech,
+            self.play_audio,
+            segment_timeout=SPEECH_SEGMENT_SECONDS if deadline.enabled else None,
+            on_timeout=lambda text: deadline.miss(SPEECH),
+        )
+
+    async def finish_speech(self, speech):
+        try:
+            await speech.finish()
+            await run_blocking(self.audio_player.wait_idle)
+            self.timeline.mark(PLAYBACK_END)
         except Exception as e:
             print(f"Error in text-to-speech: {e}")
         finally:
+            self.cancel_filler_timer()
+            self.cut_filler()
+            self.audio_player.end_utterance()
+            if speech.stopped:
+                print("\nVoice playback stopped.")
             self.polly_finished.set()
 
+    async def speak_response(self, text):
+        print(f"\n{self.stop_hint}")
+        speech = self.start_speech()
+        speech.feed(text)
+        await self.finish_speech(speech)
+
+    def start(self):
+        self.stall_monitor.start()
+
+    def close(self):
+        self.stall_monitor.stop()
+        self.cancel_speculation()
+        self.conversation_history.cancel()
+        self.tool_pool.shutdown(wait=False)
+        if self.turn_task and not self.turn_task.done():
+            self.turn_task.cancel()
+
+    async def consume(self, transcript_result_stream):
+        # One handler can be fed by several streams in turn (see TranscribeSession)
+        async for event in transcript_result_stream:
+            if isinstance(event, TranscriptEvent):
+                await self.handle_transcript_event(event)
+
+    async def handle_events(self):
+        self.start()
+        try:
+            await self.consume(self._transcript_result_stream)
+        finally:
+            self.close()
+
     async def handle_transcript_event(self, transcript_event: TranscriptEvent):
         results = transcript_event.transcript.results
 
         for result in results:
+            if (
+                self.endpointed_result_id
+                and result.result_id == self.endpointed_result_id
+            ):
+                # A local end-of-utterance already started the turn for this result
+                continue
+            if result.alternatives and not self.listening and self.barge_in:
+                transcript = result.alternatives[0].transcript
+                if not transcript.strip():
+                    continue
+                if is_echo(transcript, self.turn_clips + self.turn_fillers):
+                    # The mic is hearing the answer itself, not the user
+                    self.barge_in_stats.echoes_ignored += 1
+                    continue
+                # The user is talking over the answer; what they say is the next turn
+                self.interrupt_turn(TRANSCRIPT)
             if result.alternatives and self.listening:
                 transcript = result.alternatives[0].transcript
                 if result.is_partial:
                     print(f"\rUser: {transcript}", end="", flush=True)
+                    self.last_partial = (result.result_id, transcript)
+                    if self.speculative:
+                        self.speculate(result)
                 else:
                     print(f"\rUser: {transcript}")
+                    self.start_turn(transcript)
+                    return
+
+    def handle_vad_event(self, event):
+        if event == SPEECH_START and not self.listening and self.barge_in:
+            self.interrupt_turn(VAD)
+            return
+        if event != END_OF_UTTERANCE or not self.listening or not self.last_partial:
+            return
+
+        # The mic has gone quiet; answer the latest partial instead of waiting
+        # for Transcribe's own endpointing to finalize it
+        result_id, transcript = self.last_partial
+        if not transcript.strip():
+            return
+        print()
+        self.endpointed_result_id = result_id
+        self.start_turn(transcript)
+
+    def start_turn(self, transcript):
+        # Run the turn as its own task so transcript events keep flowing
+        self.listening = False
+        self.last_partial = None
+        self.timeline = self.metrics.new_turn()
+        self.timeline.mark(TRANSCRIPT_FINAL)
+        self.deadline = TurnDeadline(self.turn_budget, self.deadline_stats)
+        cached = self.find_cached_answer(transcript)
+        if cached:
+            # The answer is already known; a speculative request is wasted
+            self.cancel_speculation()
+            speculation = None
+        else:
+            speculation = self.take_speculation(transcript)
+        # Kept so a barge-in can close it like any other Bedrock stream
+        self.turn_speculation = speculation
+        self.turn_history_start = None
+        # An interrupted turn may still be unwinding; the new one waits for it
+        previous = self.turn_task
+        self.turn_task = asyncio.create_task(
+            self.run_turn(transcript, speculation, previous, cached)
+        )
+
+    def find_cached_answer(self, transcript):
+        """
+        Returns:
+            CachedAnswer: Answer to replay instead of asking the model, or None
+        """
+        self.last_cache_hit = None
+        if self.answer_cache is None:
+            return None
+        entry, similarity = self.answer_cache.get(self.language_code, transcript)
+        if entry is not None:
+            self.last_cache_hit = (entry, similarity)
+        return entry
+
+    def cache_answer(self, transcript, text):
+        """
+        Keep a completed, fully played answer for the next time it is asked.
 
-                    try:
-                        self.listening = False
-                        self.polly_finished.clear()
+        Answers that used tools with side effects, that were cut short, or
+        that missed the turn deadline (a spoken fallback, or an answer given
+        without its tools) are not kept.
 
-                        self.conversation_history.append(
-                            {"role": "user", "content": [{"text": transcript}]}
-                        )
+        Returns:
+            bool: Whether the answer was stored
+        """
+        if self.answer_cache is None or not self.turn_tools <= CACHEABLE_TOOLS:
+            return False
+        if self.deadline.missed or self.deadline.fallback_spoken:
+            return False
+        if any(clip.stopped or not clip.label for clip in self.turn_clips):
+            return False
+        ttl = TOOL_ANSWER_TTL if self.turn_tools else STATIC_ANSWER_TTL
+        return self.answer_cache.put(
+            self.language_code,
+            transcript,
+            text,
+            [(clip.label, clip.pcm) for clip in self.turn_clips],
+            ttl,
+        )
+
+    async def replay_answer(self, cached):
+        """
+        Print and play a cached answer in place of a model response.
+
+        Returns:
+            str: Text of the answer, for the caller to store
+        """
+        self.timeline.mark_once(FIRST_TOKEN)
+        print(cached.text, end="", flush=True)
+        for text, pcm in cached.segments:
+            if not await run_blocking(self.play_audio, pcm, text):
+                break
+        return cached.text
+
+    def interrupt_turn(self, source):
+        """
+        Stop the current answer because the user started speaking.
 
-                        modelId = random.choice(MODELS)
-                        # print(f"\n\r(calling {modelId})")
-                        print("\nAssistant: ", end="", flush=True)
+        Playback is cut and queued clips dropped, pending synthesis is
+        cancelled, and the turn task is cancelled, which closes the Bedrock
+        stream. The turn then commits what was heard (see finish_interruption).
 
-                        response = self.bedrock_runtime.converse_stream(
-                            modelId=modelId,
-                            inferenceConfig=INFERENCE_CONFIG,
-                            system=SYSTEM,
-                            messages=self.conversation_history,
-                            toolConfig=TOOL_CONFIG,
-                        )
+        Args:
+            source (str): VAD or TRANSCRIPT
+        """
+        task = self.turn_task
+        if task is None or task.done() or task in self.interruptions:
+            return
+        interruption = Interruption(source, self.timeline, self.turn_history_start)
+        interruption.timeline.mark(BARGE_IN, source=source)
+        self.interruptions[task] = interruption
+        self.audio_player.stop()
+        if self.speech:
+            self.speech.cancel()
+        if self.turn_speculation:
+            self.turn_speculation.cancel()
+            self.turn_speculation = None
+        task.cancel()
+        self.listening = True
+        print("\n(interrupted)")
+
+    def speculate(self, result):
+        transcript = stable_transcript(result)
+        if transcript is None:
+            return
+        if self.speculation and self.speculation.matches(transcript):
+            return
+
+        # Stable text moved on; the old request answers the wrong question
+        self.cancel_speculation()
+
+        modelId = self.router.choose(
+            transcript, self.conversation_history, record=False
+        ).model_id
+        messages = self.conversation_history + [
+            {"role": "user", "content": [{"text": transcript}]}
+        ]
+        self.speculation = SpeculativeRequest(
+            transcript,
+            modelId,
+            functools.partial(
+                self.bedrock_runtime.converse_stream,
+                **self.converse_request(modelId, messages),
+            ),
+        )
+        self.speculation_stats.started += 1
+
+    def take_speculation(self, transcript):
+        speculation, self.speculation = self.speculation, None
+        if speculation is None:
+            return None
+        if speculation.matches(transcript):
+            self.speculation_stats.record_hit(speculation)
+            return speculation
+        speculation.cancel()
+        self.speculation_stats.record_miss()
+        return None
+
+    def cancel_speculation(self):
+        if self.speculation:
+            self.speculation.cancel()
+            self.speculation_stats.record_miss()
+            self.speculation = None
+
+    async def run_turn(self, transcript, speculation=None, previous=None, cached=None):
+        if previous and not previous.done():
+            await asyncio.wait({previous})
+        self.stall_monitor.reset()
+        self.turn_usage = TokenUsage()
+        self.turn_clips = []
+        self.turn_fillers = []
+        self.turn_tools = set()
+        self.turn_tool_saved = 0.0
+        turn_started = time.monotonic()
+        try:
+            self.polly_finished.clear()
+
+            # Fold in any summary of old turns that finished in the background
+            self.conversation_history.apply_summary()
+            self.last_decision = None
+            self.turn_history_start = len(self.conversation_history)
+            if cached:
+                self.conversation_history.append(
+                    {"role": "user", "content": [{"text": transcript}]}
+                )
+                print("\nAssistant: ", end="", flush=True)
+                self.speech = self.start_speech()
+                full_response = await self.replay_answer(cached)
+            else:
+                full_response = await self.ask_model(transcript, speculation)
 
-                        if "stream" in response:
-                            full_response = self.process_response_stream(
-                                response["stream"], modelId
-                            )
-
-                            if full_response:
-                                self.conversation_history.append(
-                                    {
-                                        "role": "assistant",
-                                        "content": [{"text": full_response}],
-                                    }
-                                )
-
-                                print("\n")
-                                self.speak_response(full_response)
-
-                        print("-" * 50 + "\n")
-                        self.listening = True
-                        print(
-                            "Listening... You can start speaking now! (Press Ctrl+C to stop)\n"
-                        )
-                        return True
+            if full_response:
+                self.conversation_history.append(
+                    {
+                        "role": "assistant",
+                        "content": [{"text": full_response}],
+                    }
+                )
 
-                    except Exception as e:
-                        print(f"\n{e}")
-                        self.listening = True
-                        print(
-                            "Listening... You can start speaking now! (Press Ctrl+C to stop)\n"
-                        )
-                        return False
+                print("\n")
+                print(self.stop_hint)
+
+            speech, self.speech = self.speech, None
+            await self.finish_speech(speech)
+            if full_response and not cached and not speech.stopped:
+                self.cache_answer(transcript, full_response)
+            self.report_turn(turn_started)
+            self.metrics.finish_turn(self.timeline)
+            print("-" * 50 + "\n")
+            self.conversation_history.schedule_summary()
+            return True
+
+        except asyncio.CancelledError:
+            interruption = self.interruptions.pop(asyncio.current_task(), None)
+            if interruption is None:
+                raise
+            await self.finish_interruption(interruption)
+            return False
+
+        except Exception as e:
+            print(f"\n{e}")
+            return False
+
+        finally:
+            self.discard_early_tools()
+            if self.speech:
+                # Turn failed or was cancelled mid-answer
+                self.speech.cancel()
+                self.speech = None
+                self.audio_player.stop()
+            self.audio_player.end_utterance()
+            if self.compacted_tool_results:
+                # Search results have been used; later turns carry references
+                self.conversation_history.replace_tool_results(
+                    self.compacted_tool_results
+                )
+                self.compacted_tool_results = {}
+            # After a barge-in the next turn may already have started
+            if self.turn_task is asyncio.current_task():
+                self.timeline = NULL_TIMELINE
+                self.listening = True
+                print(
+                    "Listening... You can start speaking now! (Press Ctrl+C to stop)\n"
+                )
+
+    async def ask_model(self, transcript, speculation=None):
+        """
+        Route the question, then speak the model's answer as it streams in.
+
+        Returns:
+            str: Text of the final assistant message
+        """
+        decision = self.router.choose(transcript, self.conversation_history)
+        self.last_decision = decision
+        self.conversation_history.append(
+            {"role": "user", "content": [{"text": transcript}]}
+        )
+
+        models = decision.models
+        if speculation:
+            # The speculative request already runs on its model; keep the
+            # routed models as fallbacks
+            models = [speculation.model_id] + [
+                model for model in models if model != speculation.model_id
+            ]
+        # print(f"\n\r(calling {models[0]})")
+        print("\nAssistant: ", end="", flush=True)
+
+        # Speech starts as soon as the first sentence has streamed in
+        self.speech = self.start_speech()
+
+        response_stream = None
+        if speculation:
+            # Commit the buffered speculative answer and follow it live
+            self.timeline.mark(
+                BEDROCK_REQUEST, model=speculation.model_id, speculative=True
+            )
+            response_stream = speculation.replay()
+
+        return await self.process_response_stream(models, response_stream)
+
+    async def finish_interruption(self, interruption):
+        """
+        Wait for playback to go quiet, then keep what was heard in the history.
+
+        The reaction time runs from the detected speech onset until the
+        Bedrock stream is closed and the last clip has stopped playing.
+        """
+        clips = list(self.turn_clips)
+        for clip in clips:
+            if not clip.finished.is_set():
+                await run_blocking(clip.finished.wait, 1.0)
+        reaction = time.monotonic() - interruption.detected_at
+        interruption.timeline.mark(SPEECH_STOPPED)
+
+        spoken_text = heard_text(clips)
+        if interruption.history_start is not None:
+            self.conversation_history.end_interrupted_turn(
+                interruption.history_start, spoken_text
+            )
+        self.barge_in_stats.record(reaction)
+        self.metrics.finish_turn(interruption.timeline)
+        print(
+            f"(barge-in from {interruption.source}: answer stopped in "
+            f"{reaction * 1000:.0f} ms, kept {len(spoken_text)} characters that were spoken)"
+        )
+        if reaction * 1000 > BARGE_IN_TARGET_MS:
+            print(f"Warning: barge-in took longer than {BARGE_IN_TARGET_MS} ms")
+
+    def report_turn(self, turn_started):
+        max_stall_ms = self.stall_monitor.reset()
+        self.last_turn_stats = {
+            "turn_seconds": time.monotonic() - turn_started,
+            "max_loop_stall_ms": max_stall_ms,
+        }
+        print(
+            f"(turn {self.last_turn_stats['turn_seconds']:.2f}s, "
+            f"max event-loop stall {max_stall_ms:.1f} ms)"
+        )
+        if self.timeline.enabled:
+            spans = self.timeline.spans()
+            print(
+                "(timeline: "
+                + ", ".join(f"{name} {value:.3f}s" for name, value in spans.items())
+                + ")"
+            )
+        self.usage.merge(self.turn_usage)
+        if self.turn_usage.requests:
+            totals = self.turn_usage.totals
+            print(
+                f"(tokens in {totals['inputTokens']}, "
+                f"out {totals['outputTokens']}, "
+                f"cache read {totals['cacheReadInputTokens']}, "
+                f"cache write {totals['cacheWriteInputTokens']})"
+            )
+        if self.last_decision:
+            print(
+                f"(routed to {self.last_decision.model_id}: "
+                f"{self.last_decision.kind}, {self.last_decision.reason})"
+            )
+        if self.deadline.missed:
+            print(
+                f"(deadline missed by {', '.join(self.deadline.missed)}; "
+                f"{self.deadline.remaining():.1f}s of the "
+                f"{self.deadline.budget:g}s budget left)"
+            )
+        if self.last_cache_hit:
+            entry, similarity = self.last_cache_hit
+            print(
+                f"(answered from cache: similarity {similarity:.2f} to "
+                f"'{entry.question}', {time.time() - entry.created_at:.0f}s old)"
+            )
+        if self.speculative:
+            print(f"(speculation: {self.speculation_stats.summary()})")
+        if self.early_tools and self.early_tool_stats.started:
+            self.last_turn_stats["tool_latency_saved_seconds"] = self.turn_tool_saved
+            print(
+                f"(early tools: {self.turn_tool_saved:.3f}s of tool latency saved "
+                f"this turn, {self.early_tool_stats.summary()})"
+            )
+        if max_stall_ms > MAX_LOOP_STALL_MS:
+            print(
+                f"Warning: event loop stalled longer than {MAX_LOOP_STALL_MS} ms this turn"
+            )
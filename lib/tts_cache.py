@@ -0,0 +1,184 @@
+import hashlib
+import mmap
+import os
+import threading
+from collections import OrderedDict
+
+# Where synthesized clips are kept between sessions
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "audio-chatbot", "tts")
+
+# Size limits for the two cache tiers (bytes)
+MEMORY_CACHE_BYTES = 32 * 1024 * 1024
+DISK_CACHE_BYTES = 256 * 1024 * 1024
+
+
+class SynthesisCache:
+    """
+    Content-addressed cache of synthesized speech.
+
+    Clips are keyed on a hash of everything that affects the audio. Recent
+    clips live in a bounded in-memory LRU; every clip is also written as a raw
+    PCM file and read back through mmap, so a disk hit does not copy the audio
+    into the heap. Both tiers evict least recently used entries by size.
+    """
+
+    def __init__(
+        self,
+        cache_dir=CACHE_DIR,
+        memory_bytes=MEMORY_CACHE_BYTES,
+        disk_bytes=DISK_CACHE_BYTES,
+    ):
+        """
+        Args:
+            cache_dir (str): Directory for the disk tier; None disables it
+            memory_bytes (int): Maximum bytes held in memory
+            disk_bytes (int): Maximum bytes kept on disk
+        """
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk = OrderedDict()
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        if cache_dir:
+            self._load_disk_index()
+
+    @staticmethod
+    def key(text, voice_id, engine, output_format, sample_rate):
+        """
+        Build the cache key for a synthesis request.
+
+        Returns:
+            str: Hex digest identifying the clip
+        """
+        request = "\0".join([text, voice_id, engine, output_format, str(sample_rate)])
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Look up a clip.
+
+        Args:
+            key (str): Key from SynthesisCache.key()
+
+        Returns:
+            bytes-like: PCM audio (bytes or an mmap), or None on a miss
+        """
+        with self._lock:
+            pcm = self._memory.get(key)
+            if pcm is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return pcm
+
+            if key in self._disk:
+                pcm = self._read_disk(key)
+                if pcm is not None:
+                    self._disk.move_to_end(key)
+                    self._remember(key, pcm)
+                    self.disk_hits += 1
+                    return pcm
+
+            self.misses += 1
+            return None
+
+    def put(self, key, pcm):
+        """
+        Store a clip in both tiers.
+
+        Args:
+            key (str): Key from SynthesisCache.key()
+            pcm (bytes): Synthesized audio
+        """
+        if not pcm:
+            return
+        with self._lock:
+            self._remember(key, pcm)
+            if self.cache_dir and key not in self._disk:
+                self._write_disk(key, pcm)
+
+    def stats(self):
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "memory_bytes": self._memory_size,
+            "disk_bytes": self._disk_size,
+        }
+
+    def _remember(self, key, pcm):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        if len(pcm) > self.memory_bytes:
+            return
+        self._memory[key] = pcm
+        self._memory_size += len(pcm)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+            self.evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pcm")
+
+    def _load_disk_index(self):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(".pcm"):
+                    continue
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, name[: -len(".pcm")], stat.st_size))
+        except OSError as e:
+            print(f"Speech cache disabled: {e}")
+            self.cache_dir = None
+            return
+
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_size += size
+
+    def _read_disk(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                pcm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # Refresh the mtime so disk eviction order survives restarts
+            os.utime(self._path(key))
+            return pcm
+        except (OSError, ValueError):
+            self._disk_size -= self._disk.pop(key, 0)
+            return None
+
+    def _write_disk(self, key, pcm):
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(pcm)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing speech cache: {e}")
+            return
+
+        self._disk[key] = len(pcm)
+        self._disk_size += len(pcm)
+        while self._disk_size > self.disk_bytes and len(self._disk) > 1:
+            evicted, size = self._disk.popitem(last=False)
+            self._disk_size -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(evicted))
+            except OSError:
+                pass
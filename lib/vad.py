@@ -0,0 +1,174 @@
+import collections
+
+# Audio input format the detector expects (16-bit mono PCM)
+RATE = 16000
+FRAME_MS = 10
+
+# Endpointing defaults
+THRESHOLD_DB = -45.0  # Speech energy threshold in dBFS
+NOISE_MARGIN_DB = 10.0  # Required margin above the tracked noise floor
+ZCR_THRESHOLD = 0.25  # Zero-crossing rate that marks unvoiced speech (s, f, sh)
+ZCR_ENERGY_MARGIN_DB = 8.0  # How far below the threshold unvoiced speech may be
+SPEECH_RATIO = 0.3  # Fraction of 10 ms frames in a chunk that must be speech
+START_MS = 60  # Continuous speech before the gate opens
+END_OF_UTTERANCE_MS = 600  # Silence before a local end-of-utterance signal
+HANGOVER_MS = 1200  # Silence still sent after speech so Transcribe can finalize
+PRE_ROLL_MS = 300  # Audio kept from before the onset so it is not clipped
+
+# Events returned by VoiceActivityDetector.process()
+SPEECH_START = "speech_start"
+END_OF_UTTERANCE = "end_of_utterance"
+
+
+class VoiceActivityDetector:
+    """
+    Energy and zero-crossing voice activity detector with endpointing.
+
+    Each chunk is split into 10 ms frames and scored in one vectorized pass.
+    Silent audio is held back instead of being streamed; a short pre-roll
+    ring buffer is released when speech starts so onsets are not clipped.
+    """
+
+    def __init__(
+        self,
+        rate=RATE,
+        threshold_db=THRESHOLD_DB,
+        start_ms=START_MS,
+        end_of_utterance_ms=END_OF_UTTERANCE_MS,
+        hangover_ms=HANGOVER_MS,
+        pre_roll_ms=PRE_ROLL_MS,
+    ):
+        """
+        Args:
+            rate (int): Sample rate in Hz
+            threshold_db (float): Minimum speech energy in dBFS
+            start_ms (int): Speech needed before the gate opens
+            end_of_utterance_ms (int): Silence before END_OF_UTTERANCE is emitted
+            hangover_ms (int): Silence streamed after speech before the gate closes
+            pre_roll_ms (int): Audio replayed from before the onset
+        """
+        self.rate = rate
+        self.frame_samples = rate * FRAME_MS // 1000
+        self.threshold_db = threshold_db
+        self.start_ms = start_ms
+        self.end_of_utterance_ms = end_of_utterance_ms
+        self.hangover_ms = max(hangover_ms, end_of_utterance_ms)
+        self.pre_roll_ms = pre_roll_ms
+        self.noise_floor_db = threshold_db - NOISE_MARGIN_DB
+        self.in_speech = False
+        self.gate_open = False
+        self.chunks_in = 0
+        self.chunks_sent = 0
+        self._pre_roll = collections.deque()
+        self._pre_roll_ms = 0.0
+        self._speech_ms = 0.0
+        self._silence_ms = 0.0
+        self._endpointed = False
+
+    def process(self, chunk):
+        """
+        Score one chunk of audio and decide what to send.
+
+        Args:
+            chunk (bytes): 16-bit mono PCM
+
+        Returns:
+            tuple: (list of chunks to send now, event or None)
+        """
+        self.chunks_in += 1
+        chunk_ms = len(chunk) / 2 / self.rate * 1000
+        is_speech = self.is_speech(chunk)
+        event = None
+
+        if not self.gate_open:
+            self._speech_ms = self._speech_ms + chunk_ms if is_speech else 0.0
+            if self._speech_ms >= self.start_ms:
+                self.gate_open = True
+                self.in_speech = True
+                self._silence_ms = 0.0
+                self._endpointed = False
+                frames = list(self._pre_roll) + [chunk]
+                self._pre_roll.clear()
+                self._pre_roll_ms = 0.0
+                self.chunks_sent += len(frames)
+                return frames, SPEECH_START
+            self._remember(chunk, chunk_ms)
+            return [], None
+
+        if is_speech:
+            if not self.in_speech:
+                event = SPEECH_START
+            self.in_speech = True
+            self._silence_ms = 0.0
+            self._endpointed = False
+        else:
+            self._silence_ms += chunk_ms
+            if self._silence_ms >= self.end_of_utterance_ms and not self._endpointed:
+                self.in_speech = False
+                self._endpointed = True
+                event = END_OF_UTTERANCE
+            if self._silence_ms >= self.hangover_ms:
+                self.gate_open = False
+                self.in_speech = False
+                self._speech_ms = 0.0
+                self._remember(chunk, chunk_ms)
+                return [], event
+
+        self.chunks_sent += 1
+        return [chunk], event
+
+    def is_speech(self, chunk):
+        """
+        Decide whether a chunk contains speech.
+
+        Args:
+            chunk (bytes): 16-bit mono PCM
+
+        Returns:
+            bool: True if enough of the chunk's 10 ms frames look like speech
+        """
+        # Imported on use so reading the defaults above stays cheap at startup
+        import numpy as np
+
+        samples = np.frombuffer(chunk, dtype=np.int16)
+        frame_count = len(samples) // self.frame_samples
+        if frame_count == 0:
+            return False
+        frames = samples[: frame_count * self.frame_samples].reshape(
+            frame_count, self.frame_samples
+        )
+        frames = frames.astype(np.float32) / 32768.0
+
+        energy_db = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+        signs = np.signbit(frames)
+        zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+        threshold = max(self.threshold_db, self.noise_floor_db + NOISE_MARGIN_DB)
+        voiced = energy_db > threshold
+        unvoiced = (energy_db > threshold - ZCR_ENERGY_MARGIN_DB) & (
+            zcr > ZCR_THRESHOLD
+        )
+        speech = np.mean(voiced | unvoiced) >= SPEECH_RATIO
+
+        if not speech:
+            # Track the background level slowly so a noisy room raises the bar
+            level_db = float(np.median(energy_db))
+            self.noise_floor_db += 0.05 * (level_db - self.noise_floor_db)
+        return bool(speech)
+
+    def stats(self):
+        return {
+            "chunks_in": self.chunks_in,
+            "chunks_sent": self.chunks_sent,
+            "gated_fraction": (
+                1 - self.chunks_sent / self.chunks_in if self.chunks_in else 0.0
+            ),
+            "noise_floor_db": self.noise_floor_db,
+        }
+
+    def _remember(self, chunk, chunk_ms):
+        self._pre_roll.append(chunk)
+        self._pre_roll_ms += chunk_ms
+        while self._pre_roll and self._pre_roll_ms - chunk_ms >= self.pre_roll_ms:
+            self._pre_roll.popleft()
+            self._pre_roll_ms -= chunk_ms
@@ -1,58 +1,385 @@
 from duckduckgo_search import DDGS
+import asyncio
+import concurrent.futures
+import json
+import os
+import threading
 import time
 import random
+from collections import OrderedDict
 
+from lib.event_loop import run_blocking
 
-def web_search(query, max_results=5, max_retries=5):
+# Where search results are kept between sessions
+SEARCH_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "audio-chatbot", "web_search.json"
+)
+
+# How long cached results stay fresh (seconds) and how many queries are kept
+SEARCH_CACHE_TTL = 6 * 60 * 60
+SEARCH_CACHE_ENTRIES = 256
+
+
+def normalize_query(query):
     """
-    Perform a web search with retry logic for rate limiting.
+    Normalize a search query for use as a cache key (case and spacing).
 
     Args:
         query (str): The search query
-        max_results (int): Maximum number of results to return
-        max_retries (int): Maximum number of retry attempts
 
     Returns:
-        list: List of search results
+        str: Normalized query
+    """
+    return " ".join(query.casefold().split())
+
+
+class SearchCache:
+    """
+    LRU cache of search results with a TTL, persisted as a JSON file.
     """
-    retry_count = 0
-    base_delay = 1  # Base delay in seconds
 
-    while retry_count < max_retries:
+    def __init__(
+        self,
+        path=SEARCH_CACHE_PATH,
+        ttl=SEARCH_CACHE_TTL,
+        max_entries=SEARCH_CACHE_ENTRIES,
+    ):
+        """
+        Args:
+            path (str): JSON file the cache is saved to; None keeps it in memory
+            ttl (float): Seconds before an entry expires
+            max_entries (int): Maximum number of cached queries
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    @staticmethod
+    def key(query, max_results):
+        return f"{max_results}:{normalize_query(query)}"
+
+    def get(self, key):
+        """
+        Returns:
+            list: Cached results, or None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, results):
+        """
+        Store results for a query. Empty results are not stored: they are as
+        likely to be a soft rate limit as a real answer, and caching them
+        would hide the query for the whole TTL, across restarts too.
+        """
+        if not results:
+            return
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if self.path:
+                self._save()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _load(self):
         try:
-            with DDGS() as ddgs:
-                results = list(ddgs.text(query, max_results=max_results))
-                if not results:
-                    return []
-
-                formatted_results = []
-                for result in results:
-                    formatted_results.append(
-                        {
-                            "title": result["title"],
-                            "link": result["href"],
-                            "body": result["body"],
-                        }
-                    )
-
-                print("\nCitations:")
-                for result in formatted_results:
-                    print(f"\t[{formatted_results.index(result)+1}]: {result['link']}")
-                return formatted_results
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Error loading search cache: {e}")
+            return
+
+        now = time.time()
+        for key, expires_at, results in entries[-self.max_entries :]:
+            if expires_at > now:
+                self._entries[key] = (expires_at, results)
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        entries = [
+            [key, expires_at, results]
+            for key, (expires_at, results) in self._entries.items()
+        ]
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error saving search cache: {e}")
+
+
+class RateLimited(Exception):
+    pass
 
+
+class WebSearcher:
+    """
+    Cached DuckDuckGo search with in-flight deduplication.
+
+    DDGS sessions are kept in a small pool and reused; each search checks one
+    out, so concurrent searches run side by side. Identical queries that
+    arrive while a search is running wait for that search instead of
+    starting their own.
+    search() is for worker threads; search_async() retries rate limits with
+    asyncio.sleep so it never holds a thread while backing off.
+    """
+
+    def __init__(self, cache=None, max_retries=5):
+        """
+        Args:
+            cache (SearchCache, optional): Result cache; a persisted one by default
+            max_retries (int): Maximum attempts per search
+        """
+        self.cache = cache or SearchCache()
+        self.max_retries = max_retries
+        self.searches = 0
+        self.deduplicated = 0
+        self._sessions = []
+        self._session_lock = threading.Lock()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def search(self, query, max_results=5, max_retries=None):
+        """
+        Search from a worker thread; rate limits are retried with time.sleep.
+
+        Args:
+            query (str): The search query
+            max_results (int): Maximum number of results to return
+            max_retries (int, optional): Overrides the searcher's retry limit
+
+        Returns:
+            list: List of search results
+        """
+        key = self.cache.key(query, max_results)
+        results = self.cache.get(key)
+        if results is None:
+            future, leader = self._join(key)
+            if leader:
+                results = self._complete(
+                    key, future, query, max_results, max_retries or self.max_retries
+                )
+            else:
+                try:
+                    results = future.result()
+                except Exception as e:
+                    print(f"Error performing web search: {e}")
+                    results = []
+        print_citations(results)
+        return results
+
+    async def search_async(self, query, max_results=5):
+        """
+        Search from the event loop; rate limits are retried with asyncio.sleep.
+
+        Args:
+            query (str): The search query
+            max_results (int): Maximum number of results to return
+
+        Returns:
+            list: List of search results
+        """
+        key = self.cache.key(query, max_results)
+        results = self.cache.get(key)
+        if results is None:
+            future, leader = self._join(key)
+            if not leader:
+                # Shielded so a cancelled follower does not cancel the search
+                try:
+                    results = await asyncio.shield(asyncio.wrap_future(future))
+                except Exception as e:
+                    print(f"Error performing web search: {e}")
+                    results = []
+            else:
+                try:
+                    results = await self._search_with_retries_async(query, max_results)
+                except asyncio.CancelledError:
+                    self._release(key)
+                    future.set_exception(RuntimeError("Web search cancelled"))
+                    raise
+                except Exception as e:
+                    self._release(key)
+                    future.set_exception(e)
+                    print(f"Error performing web search: {e}")
+                    results = []
+                else:
+                    self._release(key)
+                    future.set_result(results)
+                    await run_blocking(self.cache.put, key, results)
+        print_citations(results)
+        return results
+
+    def stats(self):
+        return dict(
+            self.cache.stats(),
+            searches=self.searches,
+            deduplicated=self.deduplicated,
+        )
+
+    def _join(self, key):
+        """
+        Returns:
+            tuple: (future for the search, whether this caller must run it)
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.deduplicated += 1
+                return future, False
+            future = concurrent.futures.Future()
+            self._in_flight[key] = future
+            return future, True
+
+    def _release(self, key):
+        with self._lock:
+            self._in_flight.pop(key, None)
+
+    def _complete(self, key, future, query, max_results, max_retries):
+        try:
+            results = self._search_with_retries(query, max_results, max_retries)
         except Exception as e:
-            error_str = str(e)
-            if "429" in error_str or "Ratelimit" in error_str:
-                retry_count += 1
+            self._release(key)
+            future.set_exception(e)
+            print(f"Error performing web search: {e}")
+            return []
+        self.cache.put(key, results)
+        self._release(key)
+        future.set_result(results)
+        return results
+
+    def _search_with_retries(self, query, max_results, max_retries):
+        base_delay = 1  # Base delay in seconds
+        for retry_count in range(1, max_retries + 1):
+            try:
+                return self._search_once(query, max_results)
+            except RateLimited:
                 if retry_count < max_retries:
-                    # Calculate exponential backoff with jitter
-                    delay = (base_delay * 2**retry_count) + (random.random() * 0.1)
+                    delay = _backoff(base_delay, retry_count)
                     print(f" Rate limited, retrying in {delay:.2f} seconds...")
                     time.sleep(delay)
-                    continue
+        raise RuntimeError("Max retries reached for web search")
+
+    async def _search_with_retries_async(self, query, max_results):
+        base_delay = 1  # Base delay in seconds
+        for retry_count in range(1, self.max_retries + 1):
+            try:
+                return await run_blocking(self._search_once, query, max_results)
+            except RateLimited:
+                if retry_count < self.max_retries:
+                    delay = _backoff(base_delay, retry_count)
+                    print(f" Rate limited, retrying in {delay:.2f} seconds...")
+                    await asyncio.sleep(delay)
+        raise RuntimeError("Max retries reached for web search")
+
+    def _checkout_session(self):
+        # A session is not safe to use from two threads at once; the lock
+        # only covers the pool, never a search
+        with self._session_lock:
+            self.searches += 1
+            if self._sessions:
+                return self._sessions.pop()
+        return DDGS()
+
+    def _checkin_session(self, ddgs):
+        with self._session_lock:
+            self._sessions.append(ddgs)
+
+    def _search_once(self, query, max_results):
+        ddgs = self._checkout_session()
+        try:
+            results = list(ddgs.text(query, max_results=max_results) or [])
+        except Exception as e:
+            error_str = str(e)
+            if "429" in error_str or "Ratelimit" in error_str:
+                raise RateLimited(error_str) from e
+            raise
+        finally:
+            self._checkin_session(ddgs)
+
+        return [
+            {
+                "title": result["title"],
+                "link": result["href"],
+                "body": result["body"],
+            }
+            for result in results
+        ]
 
-            print(f"Error performing web search: {error_str}")
-            return []
 
-    print("Max retries reached for web search")
-    return []
+def _backoff(base_delay, retry_count):
+    # Exponential backoff with jitter
+    return (base_delay * 2**retry_count) + (random.random() * 0.1)
+
+
+def print_citations(results):
+    if not results:
+        return
+    print("\nCitations:")
+    for index, result in enumerate(results):
+        print(f"\t[{index+1}]: {result['link']}")
+
+
+_searcher = None
+
+
+def default_searcher():
+    global _searcher
+    if _searcher is None:
+        _searcher = WebSearcher()
+    return _searcher
+
+
+def web_search(query, max_results=5, max_retries=5):
+    """
+    Perform a web search with caching and retry logic for rate limiting.
+
+    Args:
+        query (str): The search query
+        max_results (int): Maximum number of results to return
+        max_retries (int): Maximum number of retry attempts
+
+    Returns:
+        list: List of search results
+    """
+    return default_searcher().search(query, max_results, max_retries)
+
+
+async def async_web_search(query, max_results=5):
+    """
+    Perform a web search from the event loop without blocking it.
+
+    Args:
+        query (str): The search query
+        max_results (int): Maximum number of results to return
+
+    Returns:
+        list: List of search results
+    """
+    return await default_searcher().search_async(query, max_results)